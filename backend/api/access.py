@@ -0,0 +1,162 @@
+"""
+Materialized credential access sets.
+
+UserCredentialAccess and TeamCredentialAccess mirror Assignment so that the
+role-scoped credential querysets resolve through one indexed lookup instead
+of joining Assignment -> AppUser and de-duplicating. The sets are kept in
+step by the signal handlers in ``api.signals``; ``rebuild()`` and
+``find_drift()`` back the ``sync_credential_access`` management command.
+"""
+from django.db import transaction
+
+from .models import (
+    AppUser,
+    Assignment,
+    Credential,
+    TeamCredentialAccess,
+    UserCredentialAccess,
+)
+
+
+def visible_credentials(user):
+    """Credentials the given AppUser may see, scoped by role."""
+    if user.role == "super_admin":
+        return Credential.objects.all()
+    elif user.role == "admin":
+        return Credential.objects.filter(team_access__team=user.team)
+    else:  # normal user
+        return Credential.objects.filter(user_access__user=user)
+
+
+def assignments_added(rows):
+    """Record new access for ``rows`` of ``(user_id, team, credential_id)``."""
+    rows = set(rows)
+    if not rows:
+        return
+    with transaction.atomic():
+        UserCredentialAccess.objects.bulk_create(
+            [UserCredentialAccess(user_id=u, credential_id=c) for u, _, c in rows],
+            ignore_conflicts=True,
+        )
+        TeamCredentialAccess.objects.bulk_create(
+            [
+                TeamCredentialAccess(team=t, credential_id=c)
+                for t, c in {(t, c) for _, t, c in rows}
+            ],
+            ignore_conflicts=True,
+        )
+
+
+def assignments_removed(pairs):
+    """Drop access for ``(user_id, credential_id)`` pairs no longer assigned."""
+    pairs = set(pairs)
+    if not pairs:
+        return
+    user_ids = {u for u, _ in pairs}
+    credential_ids = {c for _, c in pairs}
+    with transaction.atomic():
+        still_assigned = set(
+            Assignment.objects.filter(
+                user_id__in=user_ids, credential_id__in=credential_ids
+            ).values_list("user_id", "credential_id")
+        )
+        gone = pairs - still_assigned
+        if gone:
+            stale_ids = [
+                pk
+                for pk, u, c in UserCredentialAccess.objects.filter(
+                    user_id__in=user_ids, credential_id__in=credential_ids
+                ).values_list("id", "user_id", "credential_id")
+                if (u, c) in gone
+            ]
+            UserCredentialAccess.objects.filter(id__in=stale_ids).delete()
+        _sync_team_access(credential_ids)
+
+
+def user_team_changed(user_id, team):
+    """Move the team-level access of a user's credentials to their new team."""
+    credential_ids = set(
+        Assignment.objects.filter(user_id=user_id).values_list(
+            "credential_id", flat=True
+        )
+    )
+    if not credential_ids:
+        return
+    with transaction.atomic():
+        TeamCredentialAccess.objects.bulk_create(
+            [TeamCredentialAccess(team=team, credential_id=c) for c in credential_ids],
+            ignore_conflicts=True,
+        )
+        _sync_team_access(credential_ids)
+
+
+def _sync_team_access(credential_ids):
+    """Delete team rows for ``credential_ids`` that no Assignment backs anymore."""
+    expected = set(
+        Assignment.objects.filter(credential_id__in=credential_ids)
+        .values_list("user__team", "credential_id")
+        .distinct()
+    )
+    stale_ids = [
+        pk
+        for pk, t, c in TeamCredentialAccess.objects.filter(
+            credential_id__in=credential_ids
+        ).values_list("id", "team", "credential_id")
+        if (t, c) not in expected
+    ]
+    if stale_ids:
+        TeamCredentialAccess.objects.filter(id__in=stale_ids).delete()
+
+
+def _expected_user_pairs():
+    return Assignment.objects.values_list("user_id", "credential_id").distinct()
+
+
+def _expected_team_pairs():
+    return Assignment.objects.values_list("user__team", "credential_id").distinct()
+
+
+def rebuild(batch_size=1000):
+    """Recreate both access tables from Assignment."""
+    with transaction.atomic():
+        UserCredentialAccess.objects.all().delete()
+        TeamCredentialAccess.objects.all().delete()
+        UserCredentialAccess.objects.bulk_create(
+            (
+                UserCredentialAccess(user_id=u, credential_id=c)
+                for u, c in _expected_user_pairs().iterator(chunk_size=batch_size)
+            ),
+            batch_size=batch_size,
+        )
+        TeamCredentialAccess.objects.bulk_create(
+            (
+                TeamCredentialAccess(team=t, credential_id=c)
+                for t, c in _expected_team_pairs().iterator(chunk_size=batch_size)
+            ),
+            batch_size=batch_size,
+        )
+
+
+def find_drift():
+    """
+    Compare the access tables against Assignment.
+
+    Returns a dict of ``missing_user``, ``extra_user``, ``missing_team`` and
+    ``extra_team`` sets of pairs; all empty when the tables are in sync.
+    """
+    expected_user = set(_expected_user_pairs())
+    actual_user = set(
+        UserCredentialAccess.objects.values_list("user_id", "credential_id")
+    )
+    expected_team = set(_expected_team_pairs())
+    actual_team = set(TeamCredentialAccess.objects.values_list("team", "credential_id"))
+    return {
+        "missing_user": expected_user - actual_user,
+        "extra_user": actual_user - expected_user,
+        "missing_team": expected_team - actual_team,
+        "extra_team": actual_team - expected_team,
+    }
+
+
+def team_of(user_id):
+    return AppUser.objects.filter(pk=user_id).values_list("team", flat=True).first()
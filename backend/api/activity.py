@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import UserActivity
+
+
+def touch_last_seen(user_id):
+    """
+    Record that a user was active, writing at most once per
+    ``LAST_SEEN_INTERVAL`` seconds per user (one upsert, no AppUser write).
+    """
+    interval = getattr(settings, "LAST_SEEN_INTERVAL", 300)
+    if not cache.add(f"last_seen:{user_id}", 1, interval):
+        return
+    UserActivity.objects.bulk_create(
+        [UserActivity(user_id=user_id, last_seen=timezone.now())],
+        update_conflicts=True,
+        unique_fields=["user"],
+        update_fields=["last_seen"],
+    )
+
+
+async def atouch_last_seen(user_id):
+    """Async twin of touch_last_seen(), on the async cache and ORM APIs."""
+    interval = getattr(settings, "LAST_SEEN_INTERVAL", 300)
+    if not await cache.aadd(f"last_seen:{user_id}", 1, interval):
+        return
+    await UserActivity.objects.abulk_create(
+        [UserActivity(user_id=user_id, last_seen=timezone.now())],
+        update_conflicts=True,
+        unique_fields=["user"],
+        update_fields=["last_seen"],
+    )
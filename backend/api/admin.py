@@ -1,7 +1,36 @@
+from django import forms
 from django.contrib import admin
 from .models import AppUser, Credential, Assignment
 
 # Register your models here.
 admin.site.register(AppUser)
-admin.site.register(Credential)
-admin.site.register(Assignment)
+
+
+class CredentialAdminForm(forms.ModelForm):
+    # The stored columns are ciphertext; edit the plaintext via the property
+    password = forms.CharField(max_length=200)
+
+    class Meta:
+        model = Credential
+        fields = ["website", "email", "password"]
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.pk:
+            self.initial["password"] = self.instance.password
+
+    def save(self, commit=True):
+        self.instance.password = self.cleaned_data["password"]
+        return super().save(commit)
+
+
+@admin.register(Credential)
+class CredentialAdmin(admin.ModelAdmin):
+    form = CredentialAdminForm
+
+
+@admin.register(Assignment)
+class AssignmentAdmin(admin.ModelAdmin):
+    # __str__ reads user.email and credential.email; JOIN them up front
+    list_select_related = ("user", "credential")
+    raw_id_fields = ("user", "credential")
@@ -0,0 +1,130 @@
+"""
+Bulk grant / revoke of credential access.
+
+Both operations resolve users, credentials and existing assignments with a
+fixed number of queries and apply the result in one transaction, so the
+query count does not grow with the size of the batch. Because bulk writes
+bypass model signals, the access sets, change log, list change counters and
+change events are updated here explicitly, exactly as the Assignment
+receivers in api.signals do for one row; BulkAssignmentTests compares the
+two paths. A change to those receivers needs the same change here.
+"""
+from django.db import transaction
+from django.db.models import Q
+
+from . import access, changes, generations
+from .models import AppUser, Assignment
+
+
+def resolve_targets(actor, user_ids=(), teams=(), credential_ids=()):
+    """
+    Load the users (by id or whole team) and credentials a bulk request
+    names, restricted to what ``actor`` may manage. Returns
+    ``(users, credentials, missing)`` where ``missing`` lists per-item
+    outcomes for ids that could not be resolved.
+    """
+    user_ids = {int(u) for u in user_ids}
+    credential_ids = {int(c) for c in credential_ids}
+    teams = set(teams)
+
+    users = AppUser.objects.filter(Q(id__in=user_ids) | Q(team__in=teams))
+    if actor.role == "admin":
+        users = users.filter(team=actor.team, role="user")
+    users = {u.id: u for u in users.only("id", "team")}
+
+    credentials = set(
+        access.visible_credentials(actor)
+        .filter(id__in=credential_ids)
+        .values_list("id", flat=True)
+    )
+
+    missing = [
+        {"user_id": u, "status": "user_not_found"} for u in sorted(user_ids - set(users))
+    ] + [
+        {"credential_id": c, "status": "credential_not_found"}
+        for c in sorted(credential_ids - credentials)
+    ]
+    return users, credentials, missing
+
+
+def _existing_pairs(user_ids, credential_ids):
+    return {
+        (u, c): pk
+        for pk, u, c in Assignment.objects.filter(
+            user_id__in=user_ids, credential_id__in=credential_ids
+        ).values_list("id", "user_id", "credential_id")
+    }
+
+
+def grant_pairs(pairs, teams, batch_size=500):
+    """
+    Create assignments for ``(user_id, credential_id)`` pairs; ``teams`` maps
+    user id -> team. Returns the set of pairs that already existed.
+    """
+    pairs = list(dict.fromkeys(pairs))
+    if not pairs:
+        return set()
+    with transaction.atomic():
+        existing = _existing_pairs({u for u, _ in pairs}, {c for _, c in pairs})
+        new_pairs = [pair for pair in pairs if pair not in existing]
+        Assignment.objects.bulk_create(
+            [Assignment(user_id=u, credential_id=c) for u, c in new_pairs],
+            batch_size=batch_size,
+            ignore_conflicts=True,
+        )
+        rows = [(u, teams[u], c) for u, c in new_pairs]
+        access.assignments_added(rows)
+        changes.record_assignments(rows, "upsert")
+    if new_pairs:
+        generations.bump_scoped(
+            "assignment", {team for _, team, _ in rows}, {u for u, _, _ in rows}
+        )
+    return set(existing)
+
+
+def bulk_grant(users, credential_ids, batch_size=500):
+    """Assign every credential to every user; returns per-pair outcomes."""
+    pairs = [(u, c) for u in sorted(users) for c in sorted(credential_ids)]
+    teams = {u: user.team for u, user in users.items()}
+    existing = grant_pairs(pairs, teams, batch_size)
+    return [
+        {
+            "user_id": u,
+            "credential_id": c,
+            "status": "already_granted" if (u, c) in existing else "granted",
+        }
+        for u, c in pairs
+    ]
+
+
+def bulk_revoke(users, credential_ids):
+    """Remove every user's access to every credential; returns per-pair outcomes."""
+    pairs = [(u, c) for u in sorted(users) for c in sorted(credential_ids)]
+    if not pairs:
+        return []
+    with transaction.atomic():
+        existing = _existing_pairs(set(users), set(credential_ids))
+        if existing:
+            # No model depends on Assignment, so skip the per-row delete
+            # collector (and its signals) and mirror the effects below.
+            # _raw_delete() is private API (stable since Django 1.9): the
+            # public .delete() would run every post_delete receiver per row.
+            Assignment.objects.filter(id__in=existing.values())._raw_delete(
+                Assignment.objects.db
+            )
+            access.assignments_removed(existing.keys())
+            changes.record_assignments(
+                [(u, users[u].team, c) for u, c in existing], "delete"
+            )
+    if existing:
+        generations.bump_scoped(
+            "assignment", {users[u].team for u, _ in existing}, {u for u, _ in existing}
+        )
+    return [
+        {
+            "user_id": u,
+            "credential_id": c,
+            "status": "revoked" if (u, c) in existing else "not_assigned",
+        }
+        for u, c in pairs
+    ]
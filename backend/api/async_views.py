@@ -0,0 +1,285 @@
+"""
+Native async variants of the read-heavy endpoints.
+
+Served under ``/api/async/`` and meant for an ASGI server (uvicorn), where
+they run on the event loop with the async ORM and cache APIs instead of
+hopping through ``sync_to_async`` threads. Responses carry the same data
+as the DRF views they mirror; the credential list also supports ETag /
+304, ``?fields=``, ``?page_size=`` keyset pages (fetched in a thread, as
+DRF's paginator is sync-only) and ``?ordering=most_used``, which match
+supports too. ``events`` is
+the server-sent events stream of changes, which only works under ASGI.
+"""
+import asyncio
+import json
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models.functions import Length
+from django.http import HttpResponse, HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import APIException, Throttled
+from rest_framework.request import Request
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
+
+from . import audit, events, generations, usage
+from .access import visible_credentials
+from .activity import atouch_last_seen
+from .authentication import AppUserJWTAuthentication, check_token_version, user_cache
+from .conditional import ascoped_etag, etag_matches
+from .domains import host_suffixes
+from .fastpath import plan_for
+from .models import AppUser
+from .pagination import KeysetPagination
+from .serializers import AppUserSerializer, CredentialSerializer
+from .throttling import athrottle_wait
+from .tokens import AppUserRefreshToken
+
+CREDENTIAL_SCOPES = ("credential", "assignment", "appuser")
+
+
+def _error(exc):
+    return JsonResponse(
+        exc.detail if isinstance(exc.detail, dict) else {"detail": exc.detail},
+        status=exc.status_code,
+    )
+
+
+async def _throttled(request, scope):
+    """429 response when the client's bucket for ``scope`` is empty, else None."""
+    wait = await athrottle_wait(request, scope)
+    if not wait:
+        return None
+    response = _error(Throttled(wait))
+    response["Retry-After"] = str(int(wait) + 1)
+    return response
+
+
+async def _authenticate(request, throttle_scope=None, query_token=False):
+    """
+    Returns ``(user, None)`` or ``(None, error_response)``. With
+    ``query_token``, ``?access_token=`` is accepted in place of the
+    Authorization header, which EventSource cannot send.
+    """
+    authentication = AppUserJWTAuthentication()
+    raw_token = request.GET.get("access_token") if query_token else None
+    try:
+        if raw_token and authentication.get_header(request) is None:
+            token = authentication.get_validated_token(raw_token.encode())
+            result = await authentication.aget_user(token), token
+        else:
+            result = await authentication.aauthenticate(request)
+    except APIException as exc:
+        return None, _error(exc)
+    if result is None or not isinstance(result[0], AppUser):
+        return None, JsonResponse(
+            {"detail": "Authentication credentials were not provided."}, status=401
+        )
+    request.user, request.auth = result
+    if throttle_scope:
+        throttled = await _throttled(request, throttle_scope)
+        if throttled:
+            return None, throttled
+    return result[0], None
+
+
+async def me(request):
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+    user, error = await _authenticate(request, "me")
+    if error:
+        return error
+    return JsonResponse(AppUserSerializer(user).data)
+
+
+me.replica_reads = True
+
+
+async def credential_list(request):
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+    user, error = await _authenticate(request, "credentials_list")
+    if error:
+        return error
+    # DRF's request wrapper gives the serializer and paginator query_params
+    drf_request = Request(request)
+    paginator = KeysetPagination()
+    paginated = paginator.get_page_size(drf_request) is not None
+    queryset = visible_credentials(user).order_by("id")
+    if request.GET.get("ordering") == "most_used":
+        if paginated:
+            return JsonResponse(
+                {"error": "ordering=most_used cannot be combined with page_size"}, status=400
+            )
+        queryset = usage.most_used_first(queryset, user)
+        etag = await ascoped_etag(
+            f"credentials:list:most_used:{user.pk}",
+            user,
+            CREDENTIAL_SCOPES,
+            request.GET,
+            extra_generations=[usage.generation_name(user.pk)],
+        )
+    else:
+        etag = await ascoped_etag("credentials:list", user, CREDENTIAL_SCOPES, request.GET)
+    if etag_matches(request, etag):
+        response = HttpResponse(status=304)
+        response["ETag"] = etag
+        return response
+
+    serializer = CredentialSerializer(context={"request": drf_request})
+    plan = plan_for(serializer)
+    if plan is not None:
+        queryset = plan.values(queryset)
+    if paginated:
+        page = await sync_to_async(paginator.paginate_queryset)(queryset, drf_request)
+    else:
+        page = [row async for row in queryset]
+    if plan is not None:
+        data = plan.rows(page)
+    else:
+        data = CredentialSerializer(page, many=True, context={"request": drf_request}).data
+    if paginated:
+        data = paginator.get_paginated_response(data).data
+    response = JsonResponse(data, safe=False)
+    audit.record(user, "credential.list")
+    response["ETag"] = etag
+    return response
+
+
+credential_list.replica_reads = True
+
+
+async def credential_match(request):
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+    user, error = await _authenticate(request, "credentials_match")
+    if error:
+        return error
+    suffixes = host_suffixes(request.GET.get("host"))
+    if not suffixes:
+        return JsonResponse({"error": "host is required"}, status=400)
+    credentials = visible_credentials(user).filter(domain__in=suffixes)
+    if request.GET.get("ordering") == "most_used":
+        credentials = usage.most_used_first(credentials, user, Length("domain").desc())
+    else:
+        # Most specific domain first, as in the sync view
+        credentials = credentials.order_by(Length("domain").desc(), "id")
+    credentials = [c async for c in credentials]
+    audit.record_reads(user, "credential.match", (c.pk for c in credentials))
+    return JsonResponse(CredentialSerializer(credentials, many=True).data, safe=False)
+
+
+credential_match.replica_reads = True
+
+
+@csrf_exempt
+async def token_refresh(request):
+    """AppUserTokenRefreshSerializer's checks, with the user from user_cache.aget()."""
+    if request.method != "POST":
+        return HttpResponseNotAllowed(["POST"])
+    throttled = await _throttled(request, "token_refresh")
+    if throttled:
+        return throttled
+    try:
+        data = json.loads(request.body or b"{}")
+    except ValueError:
+        return JsonResponse({"detail": "JSON parse error"}, status=400)
+    raw_token = data.get("refresh") if isinstance(data, dict) else None
+    if not isinstance(raw_token, str) or not raw_token:
+        return JsonResponse({"refresh": ["This field is required."]}, status=400)
+    try:
+        refresh = AppUserRefreshToken(raw_token)
+        user = await user_cache.aget(int(refresh[api_settings.USER_ID_CLAIM]))
+        check_token_version(refresh, user)
+    except TokenError as exc:
+        return _error(InvalidToken(exc.args[0]))
+    except (KeyError, TypeError, ValueError, AppUser.DoesNotExist):
+        return JsonResponse({"non_field_errors": ["User not found"]}, status=400)
+    except APIException as exc:
+        return _error(exc)
+    await atouch_last_seen(user.id)
+    return JsonResponse({"access": str(refresh.access_token_for(user))})
+
+
+def _sse(event, data, event_id):
+    return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _still_allowed(user, audience):
+    """Whether ``user``'s token and role scope are unchanged since the stream began."""
+    try:
+        current = await user_cache.aget(user.pk)
+    except AppUser.DoesNotExist:
+        return False
+    return (
+        current.token_version == user.token_version
+        and generations.audience(current) == audience
+    )
+
+
+async def _stream(subscription, expires, user):
+    heartbeat = events._options()["HEARTBEAT"]
+    events.hub.subscribe(subscription)
+    try:
+        events.broker().start()
+        yield "retry: 3000\n" + _sse(
+            "ready", {"audience": subscription.audience}, subscription.last_event_id()
+        )
+        while True:
+            timeout = min(heartbeat, expires - time.time())
+            if timeout <= 0:
+                # Reconnect with a fresh access token; Last-Event-ID carries over
+                yield _sse("expired", {}, subscription.last_event_id())
+                return
+            try:
+                await asyncio.wait_for(subscription.ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                # A password, role or team change must not leave the stream
+                # running on the old scope until the access token expires
+                if not await _still_allowed(user, subscription.audience):
+                    yield _sse("revoked", {}, subscription.last_event_id())
+                    return
+                yield ": ping\n\n"
+                continue
+            for kind in subscription.drain():
+                yield _sse("change", {"kind": kind}, subscription.last_event_id())
+    finally:
+        events.hub.unsubscribe(subscription)
+
+
+async def events_stream(request):
+    """
+    ``text/event-stream`` of ``change`` events (``{"kind": ...}``) for the
+    caller's role scope; refetch that kind on each. Resumes from
+    ``Last-Event-ID``: kinds changed while disconnected are sent first.
+    Authenticate with the Authorization header or ``?access_token=``.
+    """
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({"detail": "The event stream needs an ASGI server."}, status=501)
+    user, error = await _authenticate(request, "events", query_token=True)
+    if error:
+        return error
+    audience = generations.audience(user)
+    tokens = await sync_to_async(generations.current)(
+        *(f"{kind}@{audience}" for kind in events.KINDS)
+    )
+    subscription = events.Subscription(
+        audience, zip(events.KINDS, tokens), asyncio.get_running_loop()
+    )
+    last_event_id = request.headers.get("Last-Event-ID") or request.GET.get("last_event_id")
+    if last_event_id:
+        seen = last_event_id.split(".")
+        for kind, token, previous in zip(events.KINDS, tokens, seen + [""] * len(events.KINDS)):
+            if token != previous:
+                subscription.deliver(kind)
+    response = StreamingHttpResponse(
+        _stream(subscription, request.auth["exp"], user), content_type="text/event-stream"
+    )
+    response["Cache-Control"] = "no-cache"
+    # Stop nginx from buffering the stream
+    response["X-Accel-Buffering"] = "no"
+    return response
@@ -0,0 +1,99 @@
+"""
+Audit trail of credential reads and access changes (``AuditEvent``).
+
+``record()`` only appends to an in-memory buffer; a background thread
+writes the events with one ``bulk_create`` per batch (api.buffering), so
+auditing adds no query and no wait to the request. Event times are taken
+when the event happens, not when it is written.
+
+Under load reads are sampled: once the buffer is more than
+``SAMPLE_ABOVE`` full, only ``READ_SAMPLE_RATE`` of reads are kept (each
+stored with that rate, so counts can be scaled back up), and a full
+buffer drops them. Changes are never sampled or dropped; a full buffer
+makes the request wait for the writer instead.
+
+Match, search, changes and export record one event per credential they
+return (``record_reads()``), sampled per request rather than per event.
+The full listings, list and bootstrap, are one event per request without
+a credential: they return everything the actor could see at the time.
+"""
+import random
+
+from django.conf import settings
+from django.utils import timezone
+
+from .buffering import DEFAULTS, BufferedWriter
+from .metrics import BUFFERED_ITEMS
+from .models import AppUser, AuditEvent
+
+# High-volume reads, sampled under load. Exports are rare enough to always keep.
+READ_ACTIONS = frozenset(
+    {
+        "credential.list",
+        "credential.retrieve",
+        "credential.match",
+        "credential.search",
+        "credential.changes",
+        "credential.bootstrap",
+    }
+)
+
+
+def _options():
+    return {
+        **DEFAULTS,
+        "ENABLED": True,
+        "SAMPLE_ABOVE": 0.5,
+        "READ_SAMPLE_RATE": 0.1,
+        **getattr(settings, "AUDIT_LOG", {}),
+    }
+
+
+def _write(events):
+    AuditEvent.objects.bulk_create(events)
+
+
+writer = BufferedWriter("audit", _write, _options)
+
+
+def record(actor, action, credential_id=None, target_user_id=None):
+    """Queue one event by ``actor`` (the request user; only AppUsers are named)."""
+    _record(actor, action, [credential_id], target_user_id)
+
+
+def record_reads(actor, action, credential_ids):
+    """One ``action`` event per credential id, all kept or sampled out together."""
+    _record(actor, action, list(credential_ids))
+
+
+def _record(actor, action, credential_ids, target_user_id=None):
+    options = _options()
+    if not options["ENABLED"] or not credential_ids:
+        return
+    sample_rate = 1.0
+    is_read = action in READ_ACTIONS
+    if is_read and writer.load() > options["SAMPLE_ABOVE"]:
+        sample_rate = options["READ_SAMPLE_RATE"]
+        if random.random() >= sample_rate:
+            BUFFERED_ITEMS.inc(len(credential_ids), writer=writer.name, outcome="sampled_out")
+            return
+    created_at = timezone.now()
+    actor_id = actor.pk if isinstance(actor, AppUser) else None
+    for credential_id in credential_ids:
+        writer.add(
+            AuditEvent(
+                created_at=created_at,
+                actor_id=actor_id,
+                action=action,
+                credential_id=credential_id,
+                target_user_id=target_user_id,
+                sample_rate=sample_rate,
+            ),
+            droppable=is_read,
+        )
+
+
+def record_access(actor, action, pairs):
+    """``access.grant`` / ``access.revoke`` for ``(user_id, credential_id)`` pairs."""
+    for user_id, credential_id in pairs:
+        record(actor, action, credential_id=credential_id, target_user_id=user_id)
@@ -1,10 +1,137 @@
 # api/authentication.py
+import copy
+import threading
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework_simplejwt.exceptions import InvalidToken, AuthenticationFailed
 from rest_framework_simplejwt.settings import api_settings
 from .models import AppUser
 
 
+class _LocalLRU:
+    """Small thread-safe LRU map used as the process-local user cache tier."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                return None
+            return self._data[key]
+
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def discard_user(self, user_id):
+        with self._lock:
+            for key in [k for k in self._data if k[0] == user_id]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class AppUserCache:
+    """
+    Two-tier AppUser cache: a process-local LRU in front of a Django cache
+    backend (``settings.APPUSER_CACHE["ALIAS"]``).
+
+    Entries are keyed by user id plus a per-user version stamp kept in the
+    shared tier. ``invalidate()`` replaces the stamp, so every worker misses
+    on its next lookup and role or team changes apply on the next request.
+    """
+
+    def __init__(self):
+        options = getattr(settings, "APPUSER_CACHE", {})
+        self.alias = options.get("ALIAS", "default")
+        self.timeout = options.get("TIMEOUT", 300)
+        self.local = _LocalLRU(options.get("LOCAL_MAXSIZE", 1024))
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    @staticmethod
+    def _version_key(user_id):
+        return f"appuser:version:{user_id}"
+
+    @staticmethod
+    def _entry_key(user_id, version):
+        return f"appuser:{user_id}:{version}"
+
+    def _version(self, user_id):
+        version = self.shared.get(self._version_key(user_id))
+        if version is None:
+            version = uuid.uuid4().hex
+            if not self.shared.add(self._version_key(user_id), version, None):
+                version = self.shared.get(self._version_key(user_id), version)
+        return version
+
+    def get(self, user_id):
+        version = self._version(user_id)
+        user = self.local.get((user_id, version))
+        if user is None:
+            user = self.shared.get(self._entry_key(user_id, version))
+            if user is None:
+                user = AppUser.objects.get(pk=user_id)
+                self.shared.set(self._entry_key(user_id, version), user, self.timeout)
+            self.local.set((user_id, version), user)
+        # Hand out a copy so request-level mutations never leak into the cache
+        user = copy.copy(user)
+        if hasattr(user, "_loaded_values"):
+            user._loaded_values = dict(user._loaded_values)
+        return user
+
+    async def aget(self, user_id):
+        """Async twin of get() for the ASGI views; uses the async cache and ORM APIs."""
+        version_key = self._version_key(user_id)
+        version = await self.shared.aget(version_key)
+        if version is None:
+            version = uuid.uuid4().hex
+            if not await self.shared.aadd(version_key, version, None):
+                version = await self.shared.aget(version_key, version)
+        user = self.local.get((user_id, version))
+        if user is None:
+            user = await self.shared.aget(self._entry_key(user_id, version))
+            if user is None:
+                user = await AppUser.objects.aget(pk=user_id)
+                await self.shared.aset(self._entry_key(user_id, version), user, self.timeout)
+            self.local.set((user_id, version), user)
+        user = copy.copy(user)
+        if hasattr(user, "_loaded_values"):
+            user._loaded_values = dict(user._loaded_values)
+        return user
+
+    def invalidate(self, user_id):
+        self.local.discard_user(user_id)
+        self.shared.set(self._version_key(user_id), uuid.uuid4().hex, None)
+
+
+user_cache = AppUserCache()
+
+
+def check_token_version(token, user):
+    # Tokens issued before versioning carry no claim and count as version 0
+    if token.get("ver", 0) != user.token_version:
+        raise AuthenticationFailed("Token has been revoked", code="token_revoked")
+
+
 class AppUserJWTAuthentication(JWTAuthentication):
     def get_user(self, validated_token):
         try:
@@ -14,6 +141,35 @@ class AppUserJWTAuthentication(JWTAuthentication):
             raise InvalidToken("Token contained no recognizable user identification")
 
         try:
-            return AppUser.objects.get(**{api_settings.USER_ID_FIELD: user_id})
-        except AppUser.DoesNotExist:
+            user = user_cache.get(int(user_id))
+        except (AppUser.DoesNotExist, TypeError, ValueError):
+            raise AuthenticationFailed("AppUser not found", code="user_not_found")
+        check_token_version(validated_token, user)
+        return user
+
+    async def aauthenticate(self, request):
+        """
+        Async counterpart of authenticate() for plain Django async views.
+        Token parsing is pure CPU; only the user lookup awaits.
+        """
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken("Token contained no recognizable user identification")
+
+        try:
+            user = await user_cache.aget(int(user_id))
+        except (AppUser.DoesNotExist, TypeError, ValueError):
             raise AuthenticationFailed("AppUser not found", code="user_not_found")
+        check_token_version(validated_token, user)
+        return user
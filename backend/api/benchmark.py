@@ -0,0 +1,234 @@
+"""
+Seeded benchmark harness for the api app.
+
+``seed()`` fills the database with a realistic org (users spread over the
+TEAM_CHOICES teams, one admin per team, credentials and an assignment
+fan-out), ``run()`` measures latency and query counts of the hot endpoints
+through the Django test client, and ``compare()`` diffs a run against a
+JSON baseline. Used by the ``benchmark`` management command and the query
+budget tests.
+"""
+import random
+import statistics
+from time import perf_counter
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.cache import caches
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from . import access
+from .domains import credential_domain
+from .models import AppUser, Assignment, Credential
+from .tokens import AppUserRefreshToken
+
+BENCHMARK_PASSWORD = "benchmark-password"
+
+
+def seed(users=200, credentials=500, fanout=10, rng_seed=1234, batch_size=1000):
+    """Create the dataset; returns a dict of representative actors and ids."""
+    rng = random.Random(rng_seed)
+    teams = [value for value, _ in AppUser.TEAM_CHOICES]
+    # One hash for everyone: seeding cost stays flat, login cost stays real
+    encoded = make_password(BENCHMARK_PASSWORD)
+
+    app_users = [
+        AppUser(email="super@bench.test", password=encoded, role="super_admin", team=teams[0])
+    ]
+    app_users += [
+        AppUser(email=f"admin-{team}@bench.test", password=encoded, role="admin", team=team)
+        for team in teams
+    ]
+    app_users += [
+        AppUser(
+            email=f"user{i}@bench.test", password=encoded, role="user", team=teams[i % len(teams)]
+        )
+        for i in range(users)
+    ]
+    AppUser.objects.bulk_create(app_users, batch_size=batch_size)
+
+    credential_rows = []
+    for i in range(credentials):
+        website = f"https://app{i}.bench{i % 50}.test/login"
+        credential_rows.append(
+            Credential(
+                website=website,
+                email=f"shared{i}@bench.test",
+                password=f"secret-{i}",
+                domain=credential_domain(website),
+            )
+        )
+    Credential.objects.bulk_create(credential_rows, batch_size=batch_size)
+
+    user_ids = list(AppUser.objects.filter(role="user").values_list("id", flat=True))
+    credential_ids = list(Credential.objects.values_list("id", flat=True))
+    Assignment.objects.bulk_create(
+        (
+            Assignment(user_id=u, credential_id=c)
+            for u in user_ids
+            for c in rng.sample(credential_ids, min(fanout, len(credential_ids)))
+        ),
+        batch_size=batch_size,
+    )
+    access.rebuild(batch_size=batch_size)
+
+    sample_user = AppUser.objects.filter(role="user", assignments__isnull=False).first()
+    return {
+        "super_admin": AppUser.objects.get(role="super_admin"),
+        "admin": AppUser.objects.get(role="admin", team=sample_user.team),
+        "user": sample_user,
+        "credential_id": sample_user.assignments.values_list("credential_id", flat=True)[0],
+    }
+
+
+def _client(user=None):
+    client = Client()
+    if user is not None:
+        token = AppUserRefreshToken.for_user(user).access_token
+        client.defaults["HTTP_AUTHORIZATION"] = f"Bearer {token}"
+    return client
+
+
+def scenarios(actors):
+    """Named ``(client, method, path, data)`` requests to measure."""
+    user, admin, super_admin = actors["user"], actors["admin"], actors["super_admin"]
+    return {
+        "login": (
+            _client(),
+            "post",
+            "/api/login/",
+            {"email": user.email, "password": BENCHMARK_PASSWORD},
+        ),
+        "me": (_client(user), "get", "/api/me/", None),
+        "bootstrap_user": (_client(user), "get", "/api/bootstrap/", None),
+        "bootstrap_admin": (_client(admin), "get", "/api/bootstrap/", None),
+        "credentials_list_super_admin": (_client(super_admin), "get", "/api/credentials/", None),
+        "credentials_list_admin": (_client(admin), "get", "/api/credentials/", None),
+        "credentials_list_user": (_client(user), "get", "/api/credentials/", None),
+        "credentials_list_user_most_used": (
+            _client(user),
+            "get",
+            "/api/credentials/?ordering=most_used",
+            None,
+        ),
+        "credentials_list_admin_most_used": (
+            _client(admin),
+            "get",
+            "/api/credentials/?ordering=most_used",
+            None,
+        ),
+        "credentials_used": (
+            _client(user),
+            "post",
+            f"/api/credentials/{actors['credential_id']}/used/",
+            {},
+        ),
+        "credentials_search_super_admin": (
+            _client(super_admin),
+            "get",
+            "/api/credentials/search/?q=app1",
+            None,
+        ),
+        "export_users": (_client(super_admin), "get", "/api/users/export_users/", None),
+        "assignments_list_admin": (_client(admin), "get", "/api/assignments/", None),
+        "assignments_list_admin_flat": (
+            _client(admin),
+            "get",
+            "/api/assignments/?flat=1",
+            None,
+        ),
+        "credentials_for_user": (
+            _client(admin),
+            "get",
+            f"/api/assignments/{user.id}/credentials_for_user/",
+            None,
+        ),
+        "users_for_credential": (
+            _client(admin),
+            "get",
+            f"/api/assignments/{actors['credential_id']}/users_for_credential/",
+            None,
+        ),
+    }
+
+
+def _percentile(samples, fraction):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def measure(client, method, path, data=None, iterations=20):
+    """Warm once, then time ``iterations`` calls; query count is the max seen."""
+    def send():
+        if data is None:
+            return getattr(client, method)(path)
+        return getattr(client, method)(path, data, content_type="application/json")
+
+    send()
+    timings, queries, status = [], 0, None
+    for _ in range(iterations):
+        with CaptureQueriesContext(connection) as captured:
+            start = perf_counter()
+            response = send()
+            timings.append((perf_counter() - start) * 1000)
+        queries = max(queries, len(captured))
+        status = response.status_code
+    return {
+        "status": status,
+        "queries": queries,
+        "p50_ms": round(statistics.median(timings), 3),
+        "p99_ms": round(_percentile(timings, 0.99), 3),
+        "mean_ms": round(statistics.fmean(timings), 3),
+        "bytes": len(response.content),
+    }
+
+
+def run(actors, iterations=20, only=None, response_cache=False):
+    """
+    Measure every scenario. The list response cache is off unless
+    ``response_cache`` is set, so query counts reflect the uncached path;
+    throttle rates are raised out of reach.
+    """
+    for cache in caches.all():
+        cache.clear()
+    results = {}
+    options = {**getattr(settings, "RESPONSE_CACHE", {}), "ENABLED": response_cache}
+    # Keep the throttles in the measured path, but never let them trip
+    rest_framework = {
+        **settings.REST_FRAMEWORK,
+        "DEFAULT_THROTTLE_RATES": {
+            scope: "1000000/s" for scope in settings.REST_FRAMEWORK["DEFAULT_THROTTLE_RATES"]
+        },
+    }
+    with override_settings(RESPONSE_CACHE=options, REST_FRAMEWORK=rest_framework):
+        for name, (client, method, path, data) in scenarios(actors).items():
+            if only and name not in only:
+                continue
+            results[name] = measure(client, method, path, data, iterations)
+    return results
+
+
+def compare(results, baseline, latency_tolerance=None):
+    """
+    Failures of ``results`` against ``baseline["endpoints"]``: any endpoint
+    issuing more queries than its baseline, and, when ``latency_tolerance``
+    is set, any p99 above ``baseline p99 * latency_tolerance``.
+    """
+    failures = []
+    for name, expected in baseline.get("endpoints", {}).items():
+        actual = results.get(name)
+        if actual is None:
+            failures.append(f"{name}: missing from results")
+            continue
+        if actual["queries"] > expected["queries"]:
+            failures.append(
+                f"{name}: {actual['queries']} queries (baseline {expected['queries']})"
+            )
+        if latency_tolerance and actual["p99_ms"] > expected["p99_ms"] * latency_tolerance:
+            failures.append(
+                f"{name}: p99 {actual['p99_ms']} ms (baseline {expected['p99_ms']} ms)"
+            )
+    return failures
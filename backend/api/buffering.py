@@ -0,0 +1,146 @@
+"""
+Write-behind buffers for high-volume rows nobody reads back right away.
+
+A ``BufferedWriter`` keeps items in memory and hands them to its ``write``
+callable in batches from a daemon thread, as soon as ``BATCH_SIZE`` items
+wait or every ``FLUSH_INTERVAL`` seconds. Adding an item only appends to a
+list, so the request path does no I/O.
+
+When ``MAX_PENDING`` items are waiting (the database is slow or down)
+``add()`` applies backpressure: a ``droppable`` item is dropped and
+counted, any other item waits up to ``BLOCK_TIMEOUT`` seconds for the
+flusher to catch up and then writes the backlog on the caller's thread.
+Droppable items never make the caller wait or write, so async views can
+add them from the event loop.
+
+``FLUSH_INTERVAL = 0`` runs no thread: items wait for ``flush()`` (tests,
+scripts), apart from the backpressure above. Pending items are flushed
+when the process exits normally; a killed process loses at most one
+interval's worth.
+"""
+import atexit
+import logging
+import threading
+
+from django.db import close_old_connections
+
+from .metrics import BUFFERED_ITEMS
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "BATCH_SIZE": 500,
+    "FLUSH_INTERVAL": 1.0,
+    "MAX_PENDING": 20000,
+    "BLOCK_TIMEOUT": 2.0,
+}
+
+_writers = []
+
+
+def flush_all():
+    """Write every writer's pending items (before a database goes away)."""
+    for writer in _writers:
+        writer.flush()
+
+
+class BufferedWriter:
+    def __init__(self, name, write, options):
+        """
+        ``write(items)`` stores one batch; ``options()`` returns the
+        ``DEFAULTS`` keys, read on every call so settings can change.
+        """
+        self.name = name
+        self.write = write
+        self.options = options
+        self._pending = []
+        self._lock = threading.Lock()
+        # Signalled when a batch is ready (wakes the flusher) or room frees up
+        self._changed = threading.Condition(self._lock)
+        self._thread = None
+        _writers.append(self)
+
+    def __len__(self):
+        return len(self._pending)
+
+    def load(self):
+        """Fraction of ``MAX_PENDING`` in use."""
+        return len(self._pending) / self.options()["MAX_PENDING"]
+
+    def add(self, item, droppable=False):
+        """Buffer ``item``; returns False if it was dropped under load."""
+        options = self.options()
+        with self._lock:
+            if len(self._pending) >= options["MAX_PENDING"]:
+                if droppable:
+                    BUFFERED_ITEMS.inc(writer=self.name, outcome="dropped")
+                    return False
+                self._changed.wait_for(
+                    lambda: len(self._pending) < options["MAX_PENDING"],
+                    options["BLOCK_TIMEOUT"],
+                )
+            self._pending.append(item)
+            full = len(self._pending) >= options["MAX_PENDING"]
+            if len(self._pending) >= options["BATCH_SIZE"]:
+                self._changed.notify_all()
+        if options["FLUSH_INTERVAL"] > 0:
+            self._start()
+        if full and not droppable:
+            # The flusher is not keeping up; write this backlog ourselves
+            self.flush()
+        return True
+
+    def drain(self):
+        """Remove and return every pending item without writing it."""
+        with self._lock:
+            items, self._pending = self._pending, []
+            self._changed.notify_all()
+        return items
+
+    def flush(self):
+        """Write everything pending now, in ``BATCH_SIZE`` batches."""
+        batch_size = self.options()["BATCH_SIZE"]
+        items = self.drain()
+        for start in range(0, len(items), batch_size):
+            batch = items[start : start + batch_size]
+            try:
+                self.write(batch)
+            except Exception:
+                logger.exception("Could not write %d buffered %s items", len(batch), self.name)
+                self._requeue(batch)
+            else:
+                BUFFERED_ITEMS.inc(len(batch), writer=self.name, outcome="written")
+
+    def _requeue(self, batch):
+        # Retried with the next flush, as long as that leaves room for new items
+        with self._lock:
+            room = max(0, self.options()["MAX_PENDING"] - len(self._pending))
+            self._pending[:0] = batch[:room]
+        if len(batch) > room:
+            BUFFERED_ITEMS.inc(len(batch) - room, writer=self.name, outcome="dropped")
+
+    def _start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            # Also restarts the thread in a process forked from this one
+            if self._thread is None or not self._thread.is_alive():
+                if self._thread is None:
+                    atexit.register(self.flush)
+                self._thread = threading.Thread(
+                    target=self._run, name=f"buffered-{self.name}", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            options = self.options()
+            with self._lock:
+                self._changed.wait_for(
+                    lambda: len(self._pending) >= options["BATCH_SIZE"],
+                    max(options["FLUSH_INTERVAL"], 0.01),
+                )
+            if self._pending:
+                self.flush()
+                # This thread's connection outlives any request; honour CONN_MAX_AGE
+                close_old_connections()
@@ -0,0 +1,112 @@
+"""
+Delta sync over ChangeLogEntry.
+
+Writers call ``record_credentials`` / ``record_assignments``; readers call
+``changes_since`` with the token from their previous sync and get back the
+credentials to upsert and the ids to drop from their local cache.
+
+Entry ids are assigned at insert time, not at commit time: while a
+transaction is open, a later one can commit a higher id first. A token
+equal to the highest id seen would then skip the lower id once it commits.
+Tokens therefore trail the log by ``SYNC_SAFETY_WINDOW`` seconds (entries
+that recent may still have lower ids in flight) and the entries inside the
+window are delivered again on the next sync. Applying an upsert or removal
+twice is harmless; this assumes no write transaction stays open longer
+than the window.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .access import visible_credentials
+from .models import ChangeLogEntry
+
+
+def record_credentials(credential_ids, action):
+    ChangeLogEntry.objects.bulk_create(
+        [
+            ChangeLogEntry(kind="credential", action=action, credential_id=c)
+            for c in credential_ids
+        ]
+    )
+
+
+def record_assignments(rows, action):
+    """Log ``rows`` of ``(user_id, team, credential_id)``."""
+    ChangeLogEntry.objects.bulk_create(
+        [
+            ChangeLogEntry(
+                kind="assignment",
+                action=action,
+                user_id=u,
+                team=t or "",
+                credential_id=c,
+            )
+            for u, t, c in rows
+        ]
+    )
+
+
+def safe_token():
+    """The highest id logged before the safety window; every lower id is committed."""
+    cutoff = timezone.now() - timedelta(seconds=getattr(settings, "SYNC_SAFETY_WINDOW", 10))
+    return (
+        ChangeLogEntry.objects.filter(created_at__lt=cutoff)
+        .order_by("-id")
+        .values_list("id", flat=True)
+        .first()
+        or 0
+    )
+
+
+def _relevant_entries(user, since):
+    entries = ChangeLogEntry.objects.filter(id__gt=since)
+    if user.role == "super_admin":
+        return entries.filter(kind="credential")
+    elif user.role == "admin":
+        return entries.filter(Q(kind="credential") | Q(kind="assignment", team=user.team))
+    else:  # normal user
+        return entries.filter(Q(kind="credential") | Q(kind="assignment", user_id=user.id))
+
+
+def changes_since(user, since):
+    """
+    Returns ``(upserts, removals, token, has_more)`` for the entries after
+    ``since`` that touch the caller's role scope. ``upserts`` lists the
+    changed credentials still visible to the caller, ``removals`` the ids the caller has
+    lost access to (deleted, revoked or moved out of their team).
+    ``token`` never passes the safety window, so entries inside it come
+    back on the next call.
+    """
+    limit = getattr(settings, "SYNC_MAX_ENTRIES", 1000)
+    # Before reading the entries, so no id below it can still be in flight
+    safe = safe_token()
+    entries = list(
+        _relevant_entries(user, since)
+        .order_by("id")
+        .values_list("id", "kind", "credential_id")[: limit + 1]
+    )
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    if has_more and entries[-1][0] <= safe:
+        token = entries[-1][0]
+    else:
+        # Everything up to ``safe`` is delivered; what follows is re-sent next time
+        has_more = False
+        token = max(since, safe)
+
+    changed = {c for _, kind, c in entries if kind == "credential"}
+    reassigned = {c for _, kind, c in entries if kind == "assignment"}
+    upserts = list(
+        visible_credentials(user).filter(id__in=changed | reassigned).order_by("id")
+    )
+    visible_ids = {credential.id for credential in upserts}
+    if user.role == "super_admin":
+        # Only deletions take a credential out of a super admin's scope
+        removals = changed - visible_ids
+    else:
+        # Credential edits alone never revoke access; assignment entries do
+        removals = reassigned - visible_ids
+    return upserts, sorted(removals), token, has_more
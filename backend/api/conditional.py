@@ -0,0 +1,80 @@
+import hashlib
+
+from rest_framework import status
+from rest_framework.response import Response
+
+from . import generations, response_cache
+
+
+def _etag(name, user, tokens, params):
+    parts = [
+        name,
+        getattr(user, "role", ""),
+        generations.audience(user),
+        *tokens,
+        *(f"{k}={v}" for k, v in sorted(params.lists())),
+    ]
+    digest = hashlib.sha1("|".join(map(str, parts)).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def scoped_etag(name, user, scopes, params, extra_generations=()):
+    """
+    Strong ETag for a role-scoped list built from the change counters of
+    the user's audience, so admins of one team (or all super_admins) share it.
+    ``extra_generations`` names further counters the list depends on.
+    """
+    tokens = generations.current(*generations.names_for(user, scopes), *extra_generations)
+    return _etag(name, user, tokens, params)
+
+
+async def ascoped_etag(name, user, scopes, params, extra_generations=()):
+    """scoped_etag() for async views: reads the counters with the async cache API."""
+    tokens = await generations.acurrent(
+        *generations.names_for(user, scopes), *extra_generations
+    )
+    return _etag(name, user, tokens, params)
+
+
+def list_etag(request, view, scopes):
+    name = f"{view.basename or view.__class__.__name__}:{view.action or ''}"
+    return scoped_etag(name, request.user, scopes, request.query_params)
+
+
+def etag_matches(request, etag):
+    header = request.headers.get("If-None-Match")
+    if not header:
+        return False
+    candidates = {tag.strip() for tag in header.split(",")}
+    return "*" in candidates or etag in candidates
+
+
+class ConditionalListMixin:
+    """
+    Answers ``list`` with 304 Not Modified when the client's If-None-Match
+    still matches, before any query or serialization work is done. Views
+    with ``cache_list_responses`` also serve other clients of the same
+    audience from the response cache (see api.response_cache);
+    ``private_responses`` keeps those entries in this process.
+    """
+
+    etag_scopes = ()
+    cache_list_responses = False
+    private_responses = False
+
+    def get_list_etag(self, request):
+        return list_etag(request, self, self.etag_scopes)
+
+    def list(self, request, *args, **kwargs):
+        etag = self.get_list_etag(request)
+        if etag_matches(request, etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+        cache = self.cache_list_responses and response_cache.enabled(request)
+        private = self.private_responses
+        response = response_cache.get(request, etag, private) if cache else None
+        if response is None:
+            response = super().list(request, *args, **kwargs)
+            if cache:
+                response_cache.store(request, self, response, etag, private)
+        response["ETag"] = etag
+        return response
@@ -0,0 +1,91 @@
+import ipaddress
+from urllib.parse import urlsplit
+
+# Multi-label public suffixes (from publicsuffix.org) common enough to show up
+# in stored websites. Every single label (com, uk, io, ...) is a public suffix
+# too. Sites under one of these belong to unrelated owners, so a credential
+# stored for ``co.uk`` or ``github.io`` must never fill in on their subdomains.
+PUBLIC_SUFFIXES = frozenset(
+    {
+        # ICANN second-level registries
+        "ac.uk", "co.uk", "gov.uk", "ltd.uk", "me.uk", "net.uk", "nhs.uk", "org.uk",
+        "plc.uk", "sch.uk",
+        "asn.au", "com.au", "edu.au", "gov.au", "id.au", "net.au", "org.au",
+        "ac.nz", "co.nz", "geek.nz", "gen.nz", "govt.nz", "net.nz", "org.nz", "school.nz",
+        "ac.jp", "co.jp", "go.jp", "ne.jp", "or.jp",
+        "ac.kr", "co.kr", "go.kr", "ne.kr", "or.kr",
+        "ac.in", "co.in", "firm.in", "gen.in", "gov.in", "ind.in", "net.in", "org.in",
+        "ac.za", "co.za", "gov.za", "net.za", "org.za",
+        "com.br", "gov.br", "net.br", "org.br",
+        "com.cn", "edu.cn", "gov.cn", "net.cn", "org.cn",
+        "com.hk", "com.tw", "com.sg", "com.my", "com.ph", "com.vn", "com.pk",
+        "com.mx", "com.ar", "com.co", "com.pe", "com.tr", "com.ua", "com.eg",
+        "com.sa", "com.ng", "co.id", "co.il", "co.th", "in.th", "or.id", "or.th",
+        # Shared hosting, where every subdomain is a different customer
+        "appspot.com", "azurewebsites.net", "blogspot.com", "bitbucket.io",
+        "cloudfront.net", "firebaseapp.com", "fly.dev", "github.io", "gitlab.io",
+        "glitch.me", "herokuapp.com", "netlify.app", "ngrok.io", "onrender.com",
+        "pages.dev", "readthedocs.io", "vercel.app", "web.app", "workers.dev",
+    }
+)
+
+
+def normalize_host(value):
+    """Lower-cased hostname of a URL or bare host, without port or leading www."""
+    if not value:
+        return ""
+    value = value.strip()
+    if "//" not in value:
+        value = "//" + value
+    try:
+        host = urlsplit(value).hostname or ""
+    except ValueError:
+        return ""
+    host = host.rstrip(".")
+    if host.startswith("www."):
+        host = host[4:]
+    return host
+
+
+def credential_domain(website):
+    """Domain stored on Credential.domain and used for autofill lookups."""
+    return normalize_host(website)
+
+
+def is_public_suffix(domain):
+    return "." not in domain or domain in PUBLIC_SUFFIXES
+
+
+def registrable_domain(host):
+    """
+    The public suffix plus one label (``login.example.co.uk`` ->
+    ``example.co.uk``); a host that is itself a public suffix is returned as is.
+    """
+    host = normalize_host(host)
+    labels = host.split(".")
+    for i in range(1, len(labels)):
+        if is_public_suffix(".".join(labels[i:])):
+            return ".".join(labels[i - 1 :])
+    return host
+
+
+def host_suffixes(host):
+    """
+    Every domain a credential may be stored under to match ``host``:
+    the host itself plus its parent domains down to the registrable domain,
+    e.g. ``login.example.com`` -> ``["login.example.com", "example.com"]``.
+    Public suffixes (``com``, ``co.uk``, ``github.io``) are never returned
+    unless ``host`` is one, and IP addresses only match themselves.
+    """
+    host = normalize_host(host)
+    if not host:
+        return []
+    try:
+        ipaddress.ip_address(host)
+    except ValueError:
+        pass
+    else:
+        return [host]
+    labels = host.split(".")
+    depth = len(registrable_domain(host).split("."))
+    return [".".join(labels[i:]) for i in range(len(labels) - depth + 1)]
@@ -0,0 +1,218 @@
+"""
+Envelope encryption for Credential.password.
+
+Every credential gets its own random AES-256-GCM data key. The data key is
+stored wrapped (RFC 3394 AES key wrap) under a master key, with the master
+key's id next to it, so rotating the master key only re-wraps 40-byte data
+keys and never touches the ciphertext. Master keys come from
+``settings.CREDENTIAL_ENCRYPTION``:
+
+* ``KEYFILE``: JSON ``{"current": "<id>", "keys": {"<id>": "<base64>"}}``,
+  which can hold old keys while ``rotate_credential_keys`` runs;
+* ``MASTER_KEY`` / ``MASTER_KEY_ID``: a single base64 key, e.g. from env.
+
+With neither, the first encrypt or decrypt raises ImproperlyConfigured;
+there is no fallback key.
+
+Unwrapped data keys are kept in a bounded in-process cache with a TTL, so
+re-reading a credential costs one AES-GCM decrypt and no unwrap.
+"""
+import base64
+import json
+import os
+import threading
+from collections import OrderedDict
+from itertools import islice
+from time import monotonic
+
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.keywrap import aes_key_unwrap, aes_key_wrap
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+NONCE_SIZE = 12
+
+
+def _options():
+    return {
+        "KEYFILE": None,
+        "MASTER_KEY": None,
+        "MASTER_KEY_ID": "k1",
+        "CACHE_SIZE": 4096,
+        "CACHE_TTL": 300,
+        **getattr(settings, "CREDENTIAL_ENCRYPTION", {}),
+    }
+
+
+def _b64(data):
+    return base64.b64encode(data).decode("ascii")
+
+
+class _TTLCache:
+    """Thread-safe LRU map whose entries also expire ``ttl`` seconds after insert."""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set_many(self, items):
+        if self.maxsize <= 0:
+            return
+        expires = monotonic() + self.ttl
+        with self._lock:
+            for key, value in items:
+                self._data[key] = (value, expires)
+                self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_keys = None
+_cache = None
+_state_lock = threading.Lock()
+
+
+def _load_keys():
+    options = _options()
+    if options["KEYFILE"]:
+        with open(options["KEYFILE"]) as keyfile:
+            config = json.load(keyfile)
+        keys = {key_id: base64.b64decode(key) for key_id, key in config["keys"].items()}
+        current = config["current"]
+    elif options["MASTER_KEY"]:
+        current = options["MASTER_KEY_ID"]
+        keys = {current: base64.b64decode(options["MASTER_KEY"])}
+    else:
+        raise ImproperlyConfigured(
+            "Set CREDENTIAL_ENCRYPTION['KEYFILE'] or ['MASTER_KEY'] "
+            "(CREDENTIAL_KEYFILE / CREDENTIAL_MASTER_KEY)"
+        )
+    if current not in keys or any(len(key) != 32 for key in keys.values()):
+        raise ImproperlyConfigured(
+            "CREDENTIAL_ENCRYPTION needs 32-byte master keys and a current key id among them"
+        )
+    return current, keys
+
+
+def _state():
+    global _keys, _cache
+    with _state_lock:
+        if _keys is None:
+            _keys = _load_keys()
+            options = _options()
+            _cache = _TTLCache(options["CACHE_SIZE"], options["CACHE_TTL"])
+        return _keys, _cache
+
+
+@receiver(setting_changed)
+def _reset(setting, **kwargs):
+    global _keys, _cache
+    if setting == "CREDENTIAL_ENCRYPTION":
+        with _state_lock:
+            _keys = _cache = None
+
+
+def _master(keys, key_id):
+    try:
+        return keys[key_id]
+    except KeyError:
+        raise ImproperlyConfigured(
+            f"Master key {key_id!r} is not configured; keep it in the keyfile until "
+            "rotate_credential_keys has moved every credential off it"
+        ) from None
+
+
+def current_key_id():
+    (current, _), _ = _state()
+    return current
+
+
+def encrypt(plaintext):
+    """Encrypt ``plaintext`` under a new data key: ``(ciphertext, data_key, key_id)``."""
+    (current, keys), cache = _state()
+    data_key = AESGCM.generate_key(bit_length=256)
+    nonce = os.urandom(NONCE_SIZE)
+    ciphertext = nonce + AESGCM(data_key).encrypt(nonce, plaintext.encode(), None)
+    wrapped = _b64(aes_key_wrap(keys[current], data_key))
+    cache.set_many([((current, wrapped), AESGCM(data_key))])
+    return _b64(ciphertext), wrapped, current
+
+
+def unwrap_many(pairs):
+    """
+    Ciphers for ``(key_id, data_key)`` pairs, unwrapping only those not
+    already cached and caching them in one pass.
+    """
+    (_, keys), cache = _state()
+    found, unwrapped = {}, []
+    for pair in set(pairs):
+        cipher = cache.get(pair)
+        if cipher is None:
+            key_id, wrapped = pair
+            cipher = AESGCM(aes_key_unwrap(_master(keys, key_id), base64.b64decode(wrapped)))
+            unwrapped.append((pair, cipher))
+        found[pair] = cipher
+    cache.set_many(unwrapped)
+    return found
+
+
+def decrypt(ciphertext, data_key, key_id, cipher=None):
+    if cipher is None:
+        cipher = unwrap_many([(key_id, data_key)])[(key_id, data_key)]
+    raw = base64.b64decode(ciphertext)
+    return cipher.decrypt(raw[:NONCE_SIZE], raw[NONCE_SIZE:], None).decode()
+
+
+def decrypt_many(rows):
+    """Plaintexts for ``(ciphertext, data_key, key_id)`` rows, in order."""
+    rows = list(rows)
+    ciphers = unwrap_many((key_id, data_key) for _, data_key, key_id in rows)
+    return [
+        decrypt(ciphertext, data_key, key_id, ciphers[(key_id, data_key)])
+        for ciphertext, data_key, key_id in rows
+    ]
+
+
+def rewrap(data_key, key_id):
+    """Re-wrap a data key under the current master key: ``(data_key, key_id)``."""
+    (current, keys), _ = _state()
+    if key_id == current:
+        return data_key, key_id
+    raw = aes_key_unwrap(_master(keys, key_id), base64.b64decode(data_key))
+    return _b64(aes_key_wrap(keys[current], raw)), current
+
+
+def decrypt_rows(rows, batch_size=2000):
+    """
+    Yield values() dicts of Credential with the encrypted columns replaced
+    by ``"password"``, decrypting in batches of ``batch_size``.
+    """
+    rows = iter(rows)
+    while batch := list(islice(rows, batch_size)):
+        plaintexts = decrypt_many(
+            (row.pop("password_ciphertext"), row.pop("data_key"), row.pop("key_id"))
+            for row in batch
+        )
+        for row, plaintext in zip(batch, plaintexts):
+            row["password"] = plaintext
+            yield row
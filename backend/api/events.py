@@ -0,0 +1,206 @@
+"""
+Change notifications for the server-sent events stream (``/api/async/events/``).
+
+Every ``generations.bump_scoped`` call is published once its transaction
+commits: the kind that changed ("credential", "assignment", "appuser")
+and the new generation token of each audience that can see it (``all``,
+``team:<team>``, ``user:<id>``). The broker carries events to every
+worker; each worker's ``hub`` wakes the streams of those audiences.
+A stream keeps only the kinds it has not sent yet, so a burst of writes
+(a bulk import) costs one event per kind and a slow client never builds
+up a backlog.
+
+Brokers, chosen by ``settings.EVENTS["BROKER"]``:
+
+* ``LocalBroker``: in-process fan-out; single-worker servers and tests;
+* ``RedisBroker``: Redis pub/sub on ``EVENTS["CHANNEL"]`` with one
+  listener thread per worker (needs the ``redis`` package).
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+KINDS = ("credential", "assignment", "appuser")
+
+
+def _options():
+    return {
+        "BROKER": "api.events.LocalBroker",
+        "REDIS_URL": None,
+        "CHANNEL": "api:events",
+        "HEARTBEAT": 15,
+        **getattr(settings, "EVENTS", {}),
+    }
+
+
+class Subscription:
+    """One stream's unsent changes. Only touched on the stream's event loop."""
+
+    def __init__(self, audience, tokens, loop):
+        self.audience = audience
+        self.tokens = dict(tokens)
+        self.loop = loop
+        self.pending = []
+        self.ready = asyncio.Event()
+
+    def deliver(self, kind, token=None):
+        if token is not None:
+            self.tokens[kind] = token
+        if kind not in self.pending:
+            self.pending.append(kind)
+        self.ready.set()
+
+    def drain(self):
+        kinds, self.pending = self.pending, []
+        self.ready.clear()
+        return kinds
+
+    def last_event_id(self):
+        return ".".join(self.tokens[kind] for kind in KINDS)
+
+
+class Hub:
+    """This worker's subscriptions by audience; ``dispatch`` is thread-safe."""
+
+    def __init__(self):
+        self._subscriptions = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.setdefault(subscription.audience, set()).add(subscription)
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.audience, set())
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                self._subscriptions.pop(subscription.audience, None)
+
+    def dispatch(self, event):
+        with self._lock:
+            targets = [
+                (subscription, token)
+                for audience, token in event["tokens"].items()
+                for subscription in self._subscriptions.get(audience, ())
+            ]
+        for subscription, token in targets:
+            _call_soon(subscription, event["kind"], token)
+
+    def resync(self):
+        """Tell every stream that all kinds may have changed (events were lost)."""
+        with self._lock:
+            subscriptions = [s for group in self._subscriptions.values() for s in group]
+        for subscription in subscriptions:
+            for kind in KINDS:
+                _call_soon(subscription, kind)
+
+
+def _call_soon(subscription, kind, token=None):
+    try:
+        subscription.loop.call_soon_threadsafe(subscription.deliver, kind, token)
+    except RuntimeError:
+        # The stream's loop is closed; it unsubscribes on its way out
+        pass
+
+
+hub = Hub()
+
+
+class LocalBroker:
+    def __init__(self, options):
+        pass
+
+    def publish(self, event):
+        hub.dispatch(event)
+
+    def start(self):
+        pass
+
+
+class RedisBroker:
+    def __init__(self, options):
+        try:
+            import redis
+        except ImportError:
+            raise ImproperlyConfigured("RedisBroker needs the redis package") from None
+        if not options["REDIS_URL"]:
+            raise ImproperlyConfigured("RedisBroker needs EVENTS['REDIS_URL']")
+        self.redis = redis
+        self.client = redis.Redis.from_url(options["REDIS_URL"])
+        self.channel = options["CHANNEL"]
+        self._listener = None
+        self._lock = threading.Lock()
+
+    def publish(self, event):
+        self.client.publish(self.channel, json.dumps(event))
+
+    def start(self):
+        """Start this worker's listener thread on the first subscription."""
+        with self._lock:
+            if self._listener is None or not self._listener.is_alive():
+                self._listener = threading.Thread(
+                    target=self._listen, name="api-events", daemon=True
+                )
+                self._listener.start()
+
+    def _listen(self):
+        connected_before = False
+        while True:
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                if connected_before:
+                    hub.resync()
+                connected_before = True
+                for message in pubsub.listen():
+                    hub.dispatch(json.loads(message["data"]))
+            except self.redis.RedisError:
+                logger.warning("Event broker connection lost; reconnecting", exc_info=True)
+                time.sleep(1)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def broker():
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            options = _options()
+            _broker = import_string(options["BROKER"])(options)
+        return _broker
+
+
+@receiver(setting_changed)
+def _reset(setting, **kwargs):
+    global _broker
+    if setting == "EVENTS":
+        with _broker_lock:
+            _broker = None
+
+
+def _send(event):
+    try:
+        broker().publish(event)
+    except Exception:
+        # A lost notification only delays clients; never fail the write for it
+        logger.exception("Could not publish %s change event", event["kind"])
+
+
+def publish(kind, tokens):
+    """Publish ``{audience: token}`` for ``kind`` once the current transaction commits."""
+    event = {"kind": kind, "tokens": tokens}
+    transaction.on_commit(lambda: _send(event))
@@ -0,0 +1,127 @@
+"""
+Read-only fast path for serializing lists.
+
+``ModelSerializer(many=True).data`` resolves every field of every row
+through DRF's field machinery. For serializers whose readable fields are
+plain model columns, ``plan_for()`` compiles the field set once into a
+``Plan`` that fetches exactly those columns with ``.values()`` and emits
+the same dicts, in the same key order, without touching a model instance.
+
+A serializer can also map a field to other columns, computed per batch:
+``fast_path_columns = {"password": (...)}`` plus a ``fast_path_prepare``
+callable that turns the fetched rows into rows carrying that field.
+
+Anything a plan cannot reproduce exactly (nested or method fields, custom
+sources, relations, an overridden ``to_representation``) returns no plan
+and the caller falls back to the serializer. Writes never use this.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from rest_framework import serializers
+from rest_framework.response import Response
+
+# DRF field representations that return a column's value unchanged, and
+# the model fields they are exact for
+_PLAIN = {
+    serializers.CharField.to_representation: (models.CharField, models.TextField),
+    serializers.IntegerField.to_representation: (models.IntegerField,),
+    serializers.BooleanField.to_representation: (models.BooleanField,),
+    serializers.ChoiceField.to_representation: (models.CharField, models.IntegerField),
+}
+
+_plans = {}
+
+
+class Plan:
+    def __init__(self, names, columns, prepare=None):
+        self.names = names
+        self.columns = columns
+        self.prepare = prepare
+        # values() already yields the output dicts when nothing is added
+        self.passthrough = prepare is None and columns == names
+
+    def values(self, queryset):
+        return queryset.values(*self.columns)
+
+    def rows(self, values):
+        """Serializer output for rows of ``self.values()``."""
+        if self.passthrough:
+            return list(values)
+        if self.prepare is not None:
+            values = self.prepare(values)
+        names = self.names
+        return [{name: row[name] for name in names} for row in values]
+
+
+def _is_plain(model, field):
+    if field.source != field.field_name:
+        return False
+    try:
+        model_field = model._meta.get_field(field.source)
+    except FieldDoesNotExist:
+        return False
+    if model_field.is_relation or not model_field.concrete:
+        return False
+    return isinstance(model_field, _PLAIN.get(type(field).to_representation, ()))
+
+
+def _compile(serializer, readable):
+    if type(serializer).to_representation is not serializers.Serializer.to_representation:
+        return None
+    model = serializer.Meta.model
+    derived = getattr(serializer, "fast_path_columns", {})
+    names, columns, prepare = [], [], None
+    for field in readable:
+        if field.field_name in derived:
+            columns.extend(derived[field.field_name])
+            prepare = serializer.fast_path_prepare
+        elif _is_plain(model, field):
+            columns.append(field.field_name)
+        else:
+            return None
+        names.append(field.field_name)
+    # Keyset pagination reads the cursor position from the row
+    if model._meta.pk.attname not in columns:
+        columns.append(model._meta.pk.attname)
+    return Plan(names, columns, prepare)
+
+
+def plan_for(serializer):
+    """
+    The Plan for ``serializer`` (a ModelSerializer instance, whose context
+    decides sparse fields), or None when it needs the full serializer.
+    """
+    readable = [field for field in serializer.fields.values() if not field.write_only]
+    key = (type(serializer), tuple(field.field_name for field in readable))
+    if key not in _plans:
+        _plans[key] = _compile(serializer, readable)
+    return _plans[key]
+
+
+def serialize(serializer_class, queryset, context=None):
+    """``serializer_class(queryset, many=True, context=context).data``, fast when possible."""
+    context = {} if context is None else context
+    plan = plan_for(serializer_class(context=context))
+    if plan is None:
+        return serializer_class(queryset, many=True, context=context).data
+    return plan.rows(plan.values(queryset))
+
+
+class FastListMixin:
+    """
+    Serves ``list`` through the view serializer's Plan, with the view's
+    filtering and pagination; falls back to the stock ``list`` otherwise.
+    """
+
+    def serialize_list(self, queryset):
+        return serialize(self.get_serializer_class(), queryset, self.get_serializer_context())
+
+    def list(self, request, *args, **kwargs):
+        plan = plan_for(self.get_serializer())
+        if plan is None:
+            return super().list(request, *args, **kwargs)
+        queryset = plan.values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(plan.rows(page))
+        return Response(plan.rows(queryset))
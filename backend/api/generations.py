@@ -0,0 +1,101 @@
+"""
+Change counters for the list endpoints.
+
+Each name ("credential", "assignment", "appuser") maps to an opaque token in
+the cache that is replaced whenever a row of that kind changes. Tokens are
+random rather than incrementing so an evicted key can never come back with
+a value an old ETag was built from.
+
+Besides the plain name, every kind has one token per audience: ``all``
+(what super_admins see), ``team:<team>`` (admins of that team) and
+``user:<id>`` (one user). ``bump_scoped`` replaces only the audiences a
+change is visible to, so other teams' and users' lists stay valid; the
+plain ``bump`` still invalidates the kind for everyone. Scoped bumps are
+also published to the change event stream (api.events).
+
+Scoped bumps wait for the surrounding transaction to commit: bumped any
+earlier, a concurrent read could still see the old rows and cache them
+under the new token, where they would stay until the next change.
+"""
+import uuid
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from . import events
+
+
+def _cache():
+    return caches[getattr(settings, "GENERATION_CACHE_ALIAS", "default")]
+
+
+def _key(name):
+    return f"generation:{name}"
+
+
+def bump(*names):
+    """Replace the tokens of ``names``; returns ``{name: new token}``."""
+    tokens = {name: uuid.uuid4().hex for name in names}
+    if tokens:
+        _cache().set_many({_key(name): token for name, token in tokens.items()}, None)
+    return tokens
+
+
+def current(*names):
+    cache = _cache()
+    keys = [_key(name) for name in names]
+    found = cache.get_many(keys)
+    missing = {key: uuid.uuid4().hex for key in keys if key not in found}
+    for key, token in missing.items():
+        if not cache.add(key, token, None):
+            token = cache.get(key, token)
+        found[key] = token
+    return tuple(found[key] for key in keys)
+
+
+async def acurrent(*names):
+    """current() through the async cache API, for the ASGI views."""
+    cache = _cache()
+    keys = [_key(name) for name in names]
+    found = await cache.aget_many(keys)
+    missing = {key: uuid.uuid4().hex for key in keys if key not in found}
+    for key, token in missing.items():
+        if not await cache.aadd(key, token, None):
+            token = await cache.aget(key, token)
+        found[key] = token
+    return tuple(found[key] for key in keys)
+
+
+def bump_scoped(kind, teams=(), users=()):
+    """
+    A ``kind`` change visible to super_admins plus the given teams and
+    users, applied once the current transaction commits.
+    """
+    transaction.on_commit(partial(_bump_scoped, kind, set(teams), set(users)))
+
+
+def _bump_scoped(kind, teams, users):
+    tokens = bump(
+        f"{kind}@all",
+        *(f"{kind}@team:{team}" for team in teams if team),
+        *(f"{kind}@user:{user}" for user in users if user is not None),
+    )
+    events.publish(kind, {name.split("@", 1)[1]: token for name, token in tokens.items()})
+
+
+def audience(user):
+    """Who ``user``'s role-scoped lists are shared with."""
+    role = getattr(user, "role", None)
+    if role == "admin":
+        return f"team:{user.team}"
+    if role == "user":
+        return f"user:{user.pk}"
+    return "all"
+
+
+def names_for(user, kinds):
+    """Generation names that ``user``'s view of ``kinds`` depends on."""
+    scope = audience(user)
+    return [*kinds, *(f"{kind}@{scope}" for kind in kinds)]
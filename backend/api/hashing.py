@@ -0,0 +1,169 @@
+"""
+Password hashing for the login path.
+
+Verification runs on a bounded process pool (``PASSWORD_HASHING["WORKERS"]``;
+0 keeps it inline) behind a concurrency limiter, so a login burst can hold
+at most ``MAX_CONCURRENT`` workers busy on key stretching and the rest of
+the API keeps serving. Hashes made with an outdated hasher or parameters
+are flagged so the caller can re-hash on a successful login.
+"""
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import (
+    PBKDF2PasswordHasher,
+    check_password,
+    get_hasher,
+    identify_hasher,
+    make_password,
+)
+from django.utils.crypto import get_random_string
+
+
+class ConfigurablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """PBKDF2-SHA256 with the iteration count taken from settings."""
+
+    @property
+    def iterations(self):
+        return getattr(
+            settings, "PASSWORD_PBKDF2_ITERATIONS", PBKDF2PasswordHasher.iterations
+        )
+
+
+class HashingBusy(Exception):
+    """Raised when no verification slot frees up within the timeout."""
+
+
+def _options():
+    return {
+        "WORKERS": 0,
+        "MAX_CONCURRENT": 8,
+        "ACQUIRE_TIMEOUT": 5,
+        **getattr(settings, "PASSWORD_HASHING", {}),
+    }
+
+
+def is_hashed(value):
+    """True if ``value`` is an encoded hash any configured hasher recognizes."""
+    try:
+        identify_hasher(value)
+    except ValueError:
+        return False
+    return True
+
+
+def must_update(encoded):
+    """True if ``encoded`` was made with a non-preferred hasher or old parameters."""
+    preferred = get_hasher()
+    hasher = identify_hasher(encoded)
+    return hasher.algorithm != preferred.algorithm or preferred.must_update(encoded)
+
+
+def _verify(password, encoded):
+    ok = check_password(password, encoded)
+    return ok, ok and must_update(encoded)
+
+
+def _init_worker():
+    import django
+
+    django.setup()
+
+
+def make_pool(workers):
+    """Process pool whose workers have Django set up for the hashers."""
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+    )
+
+
+_pool = None
+_pool_lock = threading.Lock()
+_slots = None
+
+
+def shared_pool():
+    """The process pool logins verify on, or None when ``WORKERS`` is 0."""
+    global _pool
+    workers = _options()["WORKERS"]
+    if not workers:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = make_pool(workers)
+    return _pool
+
+
+def _get_slots():
+    global _slots
+    with _pool_lock:
+        if _slots is None:
+            _slots = threading.BoundedSemaphore(_options()["MAX_CONCURRENT"])
+    return _slots
+
+
+def _run(func, *args):
+    pool = shared_pool()
+    if pool is None:
+        return func(*args)
+    return pool.submit(func, *args).result()
+
+
+def _run_limited(func, *args):
+    """_run() in a limiter slot; raises HashingBusy when none frees up in time."""
+    slots = _get_slots()
+    if not slots.acquire(timeout=_options()["ACQUIRE_TIMEOUT"]):
+        raise HashingBusy()
+    try:
+        return _run(func, *args)
+    finally:
+        slots.release()
+
+
+def verify_password(password, encoded):
+    """
+    Check ``password`` against ``encoded``. Returns ``(ok, needs_rehash)``;
+    raises HashingBusy when the limiter has no free slot.
+    """
+    return _run_limited(_verify, password or "", encoded)
+
+
+_dummy_hashes = {}
+
+
+def dummy_hash():
+    """
+    A hash made with the current preferred hasher and parameters. Verifying
+    against it costs the same as a real user's hash, so unknown emails are
+    not faster to reject than wrong passwords.
+    """
+    hasher = get_hasher()
+    key = (hasher.algorithm, getattr(hasher, "iterations", None))
+    if key not in _dummy_hashes:
+        _dummy_hashes[key] = make_password(get_random_string(32))
+    return _dummy_hashes[key]
+
+
+def hash_password(password):
+    """
+    make_password() on the hashing pool, using the preferred hasher. Takes a
+    limiter slot like verify_password(), so re-hashing on login counts
+    toward ``MAX_CONCURRENT``; raises HashingBusy when none is free.
+    """
+    return _run_limited(make_password, password)
+
+
+def hash_passwords(passwords, pool=None):
+    """
+    Hash many passwords in parallel on ``pool``, preserving order: the
+    shared_pool(), or a dedicated one from make_pool(), as the import
+    command uses. Without a pool hashing runs inline.
+    """
+    passwords = list(passwords)
+    if pool is None:
+        return [make_password(p) for p in passwords]
+    return list(pool.map(make_password, passwords, chunksize=16))
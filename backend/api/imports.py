@@ -0,0 +1,201 @@
+"""
+Bulk import of users, credentials and assignments from CSV or NDJSON.
+
+Rows are read lazily and processed in chunks. Each chunk is validated in
+memory, checked against the database with one query per lookup kind
+(never per row), and written with ``bulk_create`` in its own transaction.
+User passwords are hashed in parallel on the hashing pool. The result is
+a summary plus a per-row error report; invalid rows are skipped, valid
+rows in the same chunk still import.
+"""
+import csv
+import json
+from itertools import islice
+
+from django.db import transaction
+from django.db.models.functions import Lower
+from rest_framework import serializers
+
+from . import assignments, changes, generations
+from .domains import credential_domain
+from .hashing import hash_passwords
+from .models import AppUser, Credential
+
+IMPORT_FORMATS = ("csv", "ndjson")
+
+
+class UserImportSerializer(serializers.Serializer):
+    email = serializers.EmailField()
+    password = serializers.CharField(max_length=128)
+    role = serializers.ChoiceField(choices=AppUser.ROLE_CHOICES)
+    team = serializers.ChoiceField(choices=AppUser.TEAM_CHOICES)
+
+
+class CredentialImportSerializer(serializers.Serializer):
+    website = serializers.URLField(required=False, allow_blank=True, allow_null=True)
+    email = serializers.EmailField()
+    password = serializers.CharField(max_length=200)
+
+
+class AssignmentImportSerializer(serializers.Serializer):
+    user_email = serializers.EmailField()
+    website = serializers.CharField()
+    credential_email = serializers.EmailField()
+
+
+def read_rows(lines, fmt):
+    """Yield ``(row_number, dict)`` from an iterable of text lines."""
+    if fmt == "csv":
+        for number, row in enumerate(csv.DictReader(lines), start=1):
+            yield number, row
+        return
+    for number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield number, row if isinstance(row, dict) else {"__invalid__": line}
+
+
+def _chunks(rows, size):
+    rows = iter(rows)
+    while chunk := list(islice(rows, size)):
+        yield chunk
+
+
+def _validate(chunk, serializer_class, errors):
+    valid = []
+    for number, row in chunk:
+        if "__invalid__" in row:
+            errors.append({"row": number, "errors": {"row": ["Invalid JSON object"]}})
+            continue
+        serializer = serializer_class(data=row)
+        if serializer.is_valid():
+            valid.append((number, serializer.validated_data))
+        else:
+            errors.append({"row": number, "errors": serializer.errors})
+    return valid
+
+
+def _taken(emails):
+    """Which of the lowercased ``emails`` already belong to a user."""
+    return {
+        email.lower()
+        for email in AppUser.objects.filter(email__lower__in=emails).values_list(
+            "email", flat=True
+        )
+    }
+
+
+def _import_users(chunk, errors, seen, pool):
+    rows = _validate(chunk, UserImportSerializer, errors)
+    taken = _taken({data["email"].lower() for _, data in rows})
+    accepted = []
+    for number, data in rows:
+        email = data["email"].lower()
+        if email in taken or email in seen:
+            errors.append({"row": number, "errors": {"email": ["Email already exists"]}})
+            continue
+        seen.add(email)
+        accepted.append((number, data))
+    hashes = hash_passwords([data["password"] for _, data in accepted], pool=pool)
+    with transaction.atomic():
+        # A signup can take an email after the check; such rows are skipped,
+        # not the whole chunk. Salted hashes tell which rows went in.
+        AppUser.objects.bulk_create(
+            [
+                AppUser(**{**data, "password": encoded})
+                for (_, data), encoded in zip(accepted, hashes)
+            ],
+            ignore_conflicts=True,
+        )
+        inserted = set(
+            AppUser.objects.filter(password__in=hashes).values_list("password", flat=True)
+        )
+    teams = set()
+    for (number, data), encoded in zip(accepted, hashes):
+        if encoded in inserted:
+            teams.add(data["team"])
+        else:
+            errors.append({"row": number, "errors": {"email": ["Email already exists"]}})
+    if teams:
+        generations.bump_scoped("appuser", teams)
+    return len(inserted)
+
+
+def _import_credentials(chunk, errors, seen, pool):
+    rows = _validate(chunk, CredentialImportSerializer, errors)
+    with transaction.atomic():
+        created = Credential.objects.bulk_create(
+            [
+                Credential(**data, domain=credential_domain(data.get("website")))
+                for _, data in rows
+            ]
+        )
+        changes.record_credentials([c.pk for c in created if c.pk], "upsert")
+    if created:
+        generations.bump_scoped("credential")
+    return len(created)
+
+
+def _import_assignments(chunk, errors, seen, pool):
+    rows = _validate(chunk, AssignmentImportSerializer, errors)
+    user_emails = {data["user_email"].lower() for _, data in rows}
+    users = {
+        email.lower(): (pk, team)
+        for pk, team, email in AppUser.objects.filter(
+            email__lower__in=user_emails
+        ).values_list("id", "team", "email")
+    }
+    domains = {credential_domain(data["website"]) for _, data in rows}
+    credential_emails = {data["credential_email"].lower() for _, data in rows}
+    credentials = {}
+    for pk, domain, email in (
+        Credential.objects.annotate(email_lower=Lower("email"))
+        .filter(domain__in=domains, email_lower__in=credential_emails)
+        .values_list("id", "domain", "email_lower")
+    ):
+        credentials.setdefault((domain, email), []).append(pk)
+
+    pairs, teams = [], {}
+    for number, data in rows:
+        user = users.get(data["user_email"].lower())
+        matches = credentials.get(
+            (credential_domain(data["website"]), data["credential_email"].lower()), []
+        )
+        if user is None:
+            errors.append({"row": number, "errors": {"user_email": ["User not found"]}})
+        elif not matches:
+            errors.append({"row": number, "errors": {"website": ["Credential not found"]}})
+        elif len(matches) > 1:
+            errors.append(
+                {"row": number, "errors": {"website": ["Matches more than one credential"]}}
+            )
+        else:
+            pairs.append((user[0], matches[0]))
+            teams[user[0]] = user[1]
+    existing = assignments.grant_pairs(pairs, teams)
+    return len(set(pairs) - existing)
+
+
+IMPORTERS = {
+    "users": _import_users,
+    "credentials": _import_credentials,
+    "assignments": _import_assignments,
+}
+
+
+def run_import(kind, lines, fmt, chunk_size=500, pool=None):
+    """
+    Import ``kind`` ("users", "credentials" or "assignments") from text
+    ``lines`` in ``fmt``, hashing user passwords on ``pool`` (inline without
+    one). Returns ``{"created", "failed", "errors"}``.
+    """
+    importer = IMPORTERS[kind]
+    errors, seen, created = [], set(), 0
+    for chunk in _chunks(read_rows(lines, fmt), chunk_size):
+        created += importer(chunk, errors, seen, pool)
+    return {"created": created, "failed": len(errors), "errors": errors}
@@ -0,0 +1,107 @@
+import base64
+import json
+import os
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (
+    override_settings,
+    setup_test_environment,
+    teardown_test_environment,
+)
+
+from api import benchmark, buffering
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway test database and measure p50/p99 latency and query "
+        "counts of the hot api endpoints; optionally diff against a baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=200)
+        parser.add_argument("--credentials", type=int, default=500)
+        parser.add_argument("--fanout", type=int, default=10, help="Credentials per user.")
+        parser.add_argument("--iterations", type=int, default=20)
+        parser.add_argument("--seed", type=int, default=1234)
+        parser.add_argument(
+            "--pbkdf2-iterations",
+            type=int,
+            help="Override PASSWORD_PBKDF2_ITERATIONS (login cost) for the run.",
+        )
+        parser.add_argument(
+            "--response-cache",
+            action="store_true",
+            help="Keep the list response cache on (measures warm, cached lists).",
+        )
+        parser.add_argument("--output", help="Write results JSON to this path.")
+        parser.add_argument(
+            "--baseline",
+            help="Baseline JSON; exit 1 if any endpoint issues more queries.",
+        )
+        parser.add_argument(
+            "--latency-tolerance",
+            type=float,
+            help="Also fail when p99 exceeds baseline p99 times this factor.",
+        )
+
+    def handle(self, *args, **options):
+        overrides = {"REQUEST_LOG_SAMPLE_RATE": 0, "REQUEST_LOG_SLOW_MS": float("inf")}
+        if options["pbkdf2_iterations"]:
+            overrides["PASSWORD_PBKDF2_ITERATIONS"] = options["pbkdf2_iterations"]
+        encryption = settings.CREDENTIAL_ENCRYPTION
+        if not (encryption.get("KEYFILE") or encryption.get("MASTER_KEY")):
+            # The seeded data is thrown away with the database, so is its key
+            overrides["CREDENTIAL_ENCRYPTION"] = {
+                **encryption,
+                "MASTER_KEY": base64.b64encode(os.urandom(32)).decode(),
+                "MASTER_KEY_ID": "benchmark",
+            }
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            with override_settings(**overrides):
+                actors = benchmark.seed(
+                    users=options["users"],
+                    credentials=options["credentials"],
+                    fanout=options["fanout"],
+                    rng_seed=options["seed"],
+                )
+                results = benchmark.run(
+                    actors,
+                    iterations=options["iterations"],
+                    response_cache=options["response_cache"],
+                )
+        finally:
+            # Audit events and usage counts still buffered belong to this database
+            buffering.flush_all()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        report = {
+            "dataset": {
+                "users": options["users"],
+                "credentials": options["credentials"],
+                "fanout": options["fanout"],
+                "iterations": options["iterations"],
+            },
+            "endpoints": results,
+        }
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:32} {result['status']}  queries={result['queries']:<3} "
+                f"p50={result['p50_ms']:.2f}ms p99={result['p99_ms']:.2f}ms"
+            )
+        if options["output"]:
+            Path(options["output"]).write_text(json.dumps(report, indent=2) + "\n")
+
+        if options["baseline"]:
+            baseline = json.loads(Path(options["baseline"]).read_text())
+            failures = benchmark.compare(results, baseline, options["latency_tolerance"])
+            if failures:
+                raise CommandError("Benchmark regressions:\n  " + "\n  ".join(failures))
+            self.stdout.write(self.style.SUCCESS("No regressions against baseline"))
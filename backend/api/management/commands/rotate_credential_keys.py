@@ -0,0 +1,69 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api import encryption
+from api.models import Credential
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-wrap credential data keys under the current master key, or "
+        "re-encrypt every password under new data keys with --reencrypt."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument(
+            "--reencrypt",
+            action="store_true",
+            help="Also replace the data keys (rewrites every ciphertext).",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=0,
+            help="Seconds to pause between chunks to spread the write load.",
+        )
+
+    def handle(self, *args, **options):
+        current = encryption.current_key_id()
+        queryset = Credential.objects.only("id", *Credential.ENCRYPTED_FIELDS).order_by("id")
+        if not options["reencrypt"]:
+            queryset = queryset.exclude(key_id=current)
+
+        last_pk, updated = 0, 0
+        while True:
+            # Locked from read to write: a password saved in between would
+            # otherwise be overwritten with the old data key (or plaintext)
+            with transaction.atomic():
+                chunk = list(
+                    queryset.select_for_update().filter(pk__gt=last_pk)[: options["chunk_size"]]
+                )
+                if not chunk:
+                    break
+                last_pk = chunk[-1].pk
+                if options["reencrypt"]:
+                    Credential.decrypt_all(chunk)
+                    for credential in chunk:
+                        credential.password = credential.password
+                else:
+                    for credential in chunk:
+                        credential.data_key, credential.key_id = encryption.rewrap(
+                            credential.data_key, credential.key_id
+                        )
+                Credential.objects.bulk_update(
+                    chunk,
+                    Credential.ENCRYPTED_FIELDS if options["reencrypt"] else ["data_key", "key_id"],
+                )
+            updated += len(chunk)
+            if options["sleep"]:
+                time.sleep(options["sleep"])
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{'Re-encrypted' if options['reencrypt'] else 'Re-wrapped'} {updated} "
+                f"credentials under master key {current!r}"
+            )
+        )
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api import access
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the materialized credential access tables from Assignment, "
+        "or report drift with --check."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Only compare the access tables with Assignment; exit 1 on drift.",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if not options["check"]:
+            access.rebuild(batch_size=options["batch_size"])
+            self.stdout.write(self.style.SUCCESS("Credential access tables rebuilt"))
+            return
+
+        drift = access.find_drift()
+        total = sum(len(pairs) for pairs in drift.values())
+        for name, pairs in drift.items():
+            self.stdout.write(f"{name}: {len(pairs)}")
+            for pair in sorted(pairs, key=str)[:20]:
+                self.stdout.write(f"  {pair}")
+        if total:
+            raise CommandError(
+                f"{total} access rows drifted from Assignment; "
+                "run sync_credential_access to rebuild"
+            )
+        self.stdout.write(self.style.SUCCESS("Credential access tables in sync"))
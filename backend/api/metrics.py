@@ -0,0 +1,123 @@
+"""
+In-process request metrics with a Prometheus text exposition.
+
+Values live in this worker's memory; with several workers, scrape each one
+(or run a single-worker metrics sidecar). ``RequestMetricsMiddleware`` in
+``api.middleware`` feeds the registry.
+"""
+import threading
+from bisect import bisect_left
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    inner = ",".join(
+        '{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"'))
+        for k, v in labels
+    )
+    return "{" + inner + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0, 0.0]
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += 1
+            series[2] += value
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, value_sum) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    labels = _labels(key + (("le", repr(float(bound))),))
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                lines.append(f"{self.name}_bucket{_labels(key + (('le', '+Inf'),))} {total}")
+                lines.append(f"{self.name}_sum{_labels(key)} {value_sum}")
+                lines.append(f"{self.name}_count{_labels(key)} {total}")
+        return lines
+
+
+REQUEST_LATENCY = Histogram(
+    "api_request_duration_seconds", "Request latency by view.", LATENCY_BUCKETS
+)
+DB_QUERIES = Histogram(
+    "api_db_queries_per_request", "Database queries issued per request.", QUERY_COUNT_BUCKETS
+)
+DB_TIME = Histogram(
+    "api_db_duration_seconds", "Time spent in database queries per request.", LATENCY_BUCKETS
+)
+RENDER_TIME = Histogram(
+    "api_render_duration_seconds",
+    "Time spent rendering (serializing) the response body.",
+    LATENCY_BUCKETS,
+)
+RESPONSE_BYTES = Histogram(
+    "api_response_bytes", "Response body size.", BYTES_BUCKETS
+)
+N_PLUS_ONE = Counter(
+    "api_n_plus_one_total",
+    "Requests that repeated one query more than METRICS_N_PLUS_ONE_THRESHOLD times.",
+)
+
+BUFFERED_ITEMS = Counter(
+    "api_buffered_items_total",
+    "Items passed through write-behind buffers (api.buffering), by writer and outcome.",
+)
+
+REGISTRY = [
+    REQUEST_LATENCY,
+    DB_QUERIES,
+    DB_TIME,
+    RENDER_TIME,
+    RESPONSE_BYTES,
+    N_PLUS_ONE,
+    BUFFERED_ITEMS,
+]
+
+
+def render_prometheus():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.expose())
+    return "\n".join(lines) + "\n"
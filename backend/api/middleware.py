@@ -0,0 +1,239 @@
+import json
+import logging
+import random
+from collections import Counter
+from contextlib import ExitStack
+from time import perf_counter
+from urllib.parse import parse_qsl, urlencode
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+
+from . import metrics
+from .authentication import AppUserJWTAuthentication
+from .routers import replica_reads
+
+logger = logging.getLogger("api.requests")
+
+# Query-string keys whose values never reach the logs
+REDACTED_PARAMS = {"password", "token", "refresh", "access", "access_token", "secret", "key"}
+
+
+class QueryTracker:
+    """connection.execute_wrapper that counts and times queries per SQL text."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += perf_counter() - start
+            self.count += 1
+            self.statements[sql] += 1
+
+
+def _redacted_query(query_string):
+    pairs = [
+        (k, "[redacted]" if k.lower() in REDACTED_PARAMS else v)
+        for k, v in parse_qsl(query_string, keep_blank_values=True)
+    ]
+    return urlencode(pairs)
+
+
+class RequestMetricsMiddleware:
+    """
+    Records per-view latency, DB query count/time, render time and response
+    size into ``api.metrics``, flags likely N+1 patterns, and writes a
+    sampled, redacted JSON log line per request to the ``api.requests``
+    logger. Async requests are timed but their queries are not counted, as
+    they run on executor threads with their own connections.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        tracker = QueryTracker()
+        start = perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(tracker))
+            response = self.get_response(request)
+        self._record(request, response, perf_counter() - start, tracker)
+        return response
+
+    async def __acall__(self, request):
+        start = perf_counter()
+        response = await self.get_response(request)
+        self._record(request, response, perf_counter() - start, None)
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF responses render after the view returns; time that step
+        render = response.render
+
+        def timed_render():
+            started = perf_counter()
+            try:
+                return render()
+            finally:
+                request._metrics_render_time = perf_counter() - started
+
+        response.render = timed_render
+        return response
+
+    def _record(self, request, response, duration, tracker):
+        match = request.resolver_match
+        view = match.view_name if match else "unresolved"
+        labels = {"view": view, "method": request.method}
+        metrics.REQUEST_LATENCY.observe(duration, status=response.status_code, **labels)
+
+        render_time = getattr(request, "_metrics_render_time", None)
+        if render_time is not None:
+            metrics.RENDER_TIME.observe(render_time, **labels)
+
+        size = None
+        if not response.streaming:
+            size = len(response.content)
+            metrics.RESPONSE_BYTES.observe(size, **labels)
+
+        repeated = None
+        if tracker is not None:
+            metrics.DB_QUERIES.observe(tracker.count, **labels)
+            metrics.DB_TIME.observe(tracker.duration, **labels)
+            threshold = getattr(settings, "METRICS_N_PLUS_ONE_THRESHOLD", 10)
+            if tracker.statements:
+                sql, times = tracker.statements.most_common(1)[0]
+                if times > threshold:
+                    repeated = {"sql": sql[:300], "times": times}
+                    metrics.N_PLUS_ONE.inc(**labels)
+
+        slow = duration * 1000 >= getattr(settings, "REQUEST_LOG_SLOW_MS", 500)
+        sample_rate = getattr(settings, "REQUEST_LOG_SAMPLE_RATE", 0.1)
+        if not (repeated or slow or response.status_code >= 500 or random.random() < sample_rate):
+            return
+
+        user = getattr(request, "user", None)
+        entry = {
+            "method": request.method,
+            "path": request.path,
+            "query": _redacted_query(request.META.get("QUERY_STRING", "")),
+            "view": view,
+            "status": response.status_code,
+            "duration_ms": round(duration * 1000, 2),
+            "bytes": size,
+            "user_id": getattr(user, "pk", None),
+        }
+        if tracker is not None:
+            entry["queries"] = tracker.count
+            entry["db_ms"] = round(tracker.duration * 1000, 2)
+        if render_time is not None:
+            entry["render_ms"] = round(render_time * 1000, 2)
+        if repeated:
+            entry["n_plus_one"] = repeated
+            logger.warning(json.dumps(entry))
+        else:
+            logger.info(json.dumps(entry))
+
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+def _reads_from_replica(request, view_func):
+    """
+    True if the resolved view is marked read-only. Views opt in with a
+    ``replica_reads`` attribute: True for a whole view, or a collection of
+    action names on a DRF viewset.
+    """
+    if request.method not in SAFE_METHODS:
+        return False
+    view = getattr(view_func, "cls", view_func)
+    marked = getattr(view, "replica_reads", False)
+    if marked is True or not marked:
+        return bool(marked)
+    actions = getattr(view_func, "actions", None) or {}
+    return actions.get(request.method.lower()) in marked
+
+
+def _pin_key(request):
+    """
+    Pins follow the user id of a valid bearer token, so they hold across
+    token refreshes and the user's other clients; anonymous clients are
+    pinned by IP. The token is checked here because reads are routed before
+    the view authenticates.
+    """
+    authentication = AppUserJWTAuthentication()
+    header = authentication.get_header(request)
+    try:
+        raw_token = authentication.get_raw_token(header) if header else None
+        if raw_token is not None:
+            token = authentication.get_validated_token(raw_token)
+            return f"replica-pin:user:{token[api_settings.USER_ID_CLAIM]}"
+    except (AuthenticationFailed, KeyError):
+        pass
+    return "replica-pin:ip:" + request.META.get("REMOTE_ADDR", "")
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Sends the reads of views marked ``replica_reads`` to a replica (see
+    api.routers). A client that just made a successful write is pinned to
+    the primary for ``REPLICA_PIN_SECONDS`` so it reads its own writes.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = bool(getattr(settings, "DATABASE_REPLICAS", ()))
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = replica_reads.set(False)
+        try:
+            response = self.get_response(request)
+        finally:
+            replica_reads.reset(token)
+        self._pin_after_write(request, response)
+        return response
+
+    async def __acall__(self, request):
+        token = replica_reads.set(False)
+        try:
+            response = await self.get_response(request)
+        finally:
+            replica_reads.reset(token)
+        self._pin_after_write(request, response)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not self.enabled or not _reads_from_replica(request, view_func):
+            return None
+        if cache.get(_pin_key(request)):
+            return None
+        replica_reads.set(True)
+        return None
+
+    def _pin_after_write(self, request, response):
+        if self.enabled and request.method not in SAFE_METHODS and response.status_code < 400:
+            cache.set(_pin_key(request), True, getattr(settings, "REPLICA_PIN_SECONDS", 5))
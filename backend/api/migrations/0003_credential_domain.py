@@ -0,0 +1,34 @@
+# Generated by Django 5.2.6 on 2026-10-17 12:56
+
+from django.db import migrations, models
+
+from api.domains import credential_domain
+
+
+def populate_domain(apps, schema_editor):
+    Credential = apps.get_model('api', 'Credential')
+    batch = []
+    for credential in Credential.objects.only('id', 'website').iterator(chunk_size=1000):
+        credential.domain = credential_domain(credential.website)
+        batch.append(credential)
+        if len(batch) >= 1000:
+            Credential.objects.bulk_update(batch, ['domain'])
+            batch = []
+    if batch:
+        Credential.objects.bulk_update(batch, ['domain'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_rename_user_appuser'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='credential',
+            name='domain',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=253),
+        ),
+        migrations.RunPython(populate_domain, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.6 on 2026-10-17 12:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_access(apps, schema_editor):
+    Assignment = apps.get_model('api', 'Assignment')
+    UserCredentialAccess = apps.get_model('api', 'UserCredentialAccess')
+    TeamCredentialAccess = apps.get_model('api', 'TeamCredentialAccess')
+    user_pairs = Assignment.objects.values_list('user_id', 'credential_id').distinct()
+    UserCredentialAccess.objects.bulk_create(
+        [UserCredentialAccess(user_id=u, credential_id=c) for u, c in user_pairs.iterator()],
+        batch_size=1000,
+    )
+    team_pairs = Assignment.objects.values_list('user__team', 'credential_id').distinct()
+    TeamCredentialAccess.objects.bulk_create(
+        [TeamCredentialAccess(team=t, credential_id=c) for t, c in team_pairs.iterator()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_credential_domain'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TeamCredentialAccess',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('team', models.CharField(choices=[('designing', 'Designing'), ('marketing', 'Marketing'), ('php', 'PHP'), ('fullstack', 'Fullstack')], max_length=20)),
+                ('credential', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='team_access', to='api.credential')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('team', 'credential'), name='unique_team_credential_access')],
+            },
+        ),
+        migrations.CreateModel(
+            name='UserCredentialAccess',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('credential', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='user_access', to='api.credential')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='credential_access', to='api.appuser')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'credential'), name='unique_user_credential_access')],
+            },
+        ),
+        migrations.RunPython(populate_access, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-17 13:01
+
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def delete_duplicate_assignments(apps, schema_editor):
+    Assignment = apps.get_model('api', 'Assignment')
+    keep = (
+        Assignment.objects.values('user_id', 'credential_id')
+        .annotate(keep_id=Min('id'))
+        .values_list('keep_id', flat=True)
+    )
+    Assignment.objects.exclude(id__in=list(keep)).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_change_log'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicate_assignments, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='assignment',
+            constraint=models.UniqueConstraint(fields=('user', 'credential'), name='unique_assignment_user_credential'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.6 on 2026-10-17 13:14
+
+import django.db.models.functions.text
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import Lower
+
+
+def check_case_insensitive_duplicates(apps, schema_editor):
+    AppUser = apps.get_model('api', 'AppUser')
+    duplicates = list(
+        AppUser.objects.annotate(email_lower=Lower('email'))
+        .values('email_lower')
+        .annotate(n=Count('id'))
+        .filter(n__gt=1)
+        .values_list('email_lower', flat=True)
+    )
+    if duplicates:
+        raise RuntimeError(
+            'AppUser emails differing only in case must be merged before '
+            'adding appuser_email_lower_unique: ' + ', '.join(duplicates[:20])
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_token_version_user_activity'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appuser',
+            index=models.Index(fields=['team', 'role'], name='appuser_team_role_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appuser',
+            index=models.Index(fields=['role'], name='appuser_role_idx'),
+        ),
+        migrations.RunPython(check_case_insensitive_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='appuser',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('email'), name='appuser_email_lower_unique'),
+        ),
+    ]
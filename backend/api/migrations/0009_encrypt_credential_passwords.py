@@ -0,0 +1,85 @@
+# Generated by Django 5.2.6 on 2026-10-17 13:40
+
+from django.db import migrations, models
+
+
+def encrypt_passwords(apps, schema_editor):
+    from api import encryption
+
+    Credential = apps.get_model('api', 'Credential')
+    batch = []
+    for credential in Credential.objects.only('id', 'password').iterator(chunk_size=1000):
+        (
+            credential.password_ciphertext,
+            credential.data_key,
+            credential.key_id,
+        ) = encryption.encrypt(credential.password)
+        batch.append(credential)
+        if len(batch) >= 1000:
+            Credential.objects.bulk_update(batch, ['password_ciphertext', 'data_key', 'key_id'])
+            batch = []
+    if batch:
+        Credential.objects.bulk_update(batch, ['password_ciphertext', 'data_key', 'key_id'])
+
+
+def _decrypt_batch(Credential, batch):
+    from api import encryption
+
+    plaintexts = encryption.decrypt_many(
+        (c.password_ciphertext, c.data_key, c.key_id) for c in batch
+    )
+    for credential, plaintext in zip(batch, plaintexts):
+        credential.password = plaintext
+    Credential.objects.bulk_update(batch, ['password'])
+
+
+def decrypt_passwords(apps, schema_editor):
+    Credential = apps.get_model('api', 'Credential')
+    batch = []
+    queryset = Credential.objects.only('id', 'password_ciphertext', 'data_key', 'key_id')
+    for credential in queryset.iterator(chunk_size=1000):
+        batch.append(credential)
+        if len(batch) >= 1000:
+            _decrypt_batch(Credential, batch)
+            batch = []
+    if batch:
+        _decrypt_batch(Credential, batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_appuser_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='credential',
+            name='password_ciphertext',
+            field=models.TextField(default='', editable=False),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='credential',
+            name='data_key',
+            field=models.CharField(default='', editable=False, max_length=64),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='credential',
+            name='key_id',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=32),
+            preserve_default=False,
+        ),
+        migrations.RunPython(encrypt_passwords, decrypt_passwords),
+        # A default lets the column be re-added (then refilled) on reverse
+        migrations.AlterField(
+            model_name='credential',
+            name='password',
+            field=models.CharField(default='', max_length=200),
+        ),
+        migrations.RemoveField(
+            model_name='credential',
+            name='password',
+        ),
+    ]
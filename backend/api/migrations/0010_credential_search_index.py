@@ -0,0 +1,26 @@
+# Generated by Django 5.2.6 on 2026-10-17 15:10
+
+from django.db import migrations
+
+
+def install(apps, schema_editor):
+    from api import search
+
+    search.install(schema_editor.connection)
+
+
+def uninstall(apps, schema_editor):
+    from api import search
+
+    search.uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_encrypt_credential_passwords'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
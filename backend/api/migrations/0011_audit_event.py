@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-17 13:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_credential_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField()),
+                ('actor_id', models.BigIntegerField(blank=True, null=True)),
+                ('action', models.CharField(choices=[('credential.list', 'Listed credentials'), ('credential.retrieve', 'Read a credential'), ('credential.match', 'Looked up credentials for a host'), ('credential.search', 'Searched credentials'), ('credential.changes', 'Synced credential changes'), ('credential.export', 'Exported credentials'), ('credential.bootstrap', 'Loaded the popup'), ('credential.create', 'Created a credential'), ('credential.update', 'Updated a credential'), ('credential.delete', 'Deleted a credential'), ('access.grant', 'Granted a user access'), ('access.revoke', "Revoked a user's access"), ('user.password_reset', "Reset a user's password")], max_length=32)),
+                ('credential_id', models.BigIntegerField(blank=True, null=True)),
+                ('target_user_id', models.BigIntegerField(blank=True, null=True)),
+                ('sample_rate', models.FloatField(default=1.0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['actor_id', 'created_at'], name='audit_actor_time_idx'), models.Index(fields=['credential_id', 'created_at'], name='audit_credential_time_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.6 on 2026-10-17 13:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_audit_event'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CredentialUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('use_count', models.PositiveIntegerField(default=0)),
+                ('last_used_at', models.DateTimeField(blank=True, null=True)),
+                ('credential', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='usage_counts', to='api.credential')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='credential_usage', to='api.appuser')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'credential'), name='unique_credential_usage')],
+            },
+        ),
+    ]
@@ -1,5 +1,9 @@
 from django.db import models
+from django.db.models.functions import Lower
 from django.contrib.auth.hashers import make_password
+from . import encryption
+from .domains import credential_domain
+from .hashing import is_hashed
 
 
 class AppUser(models.Model):
@@ -24,6 +28,8 @@ class AppUser(models.Model):
     team = models.CharField(
         max_length=20, choices=TEAM_CHOICES, blank=False, null=False
     )
+    # Bumped on role/team/password changes; tokens carrying an older value are revoked
+    token_version = models.PositiveIntegerField(default=0, editable=False)
 
     # ✅ Add these so DRF/Django treats it like an auth user
     @property
@@ -34,20 +40,91 @@ class AppUser(models.Model):
     def is_anonymous(self):
         return False
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the persisted values so save() hooks can detect changes
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
     def save(self, *args, **kwargs):
-        # Hash password before saving if it's not already hashed
-        if self.password and not self.password.startswith('pbkdf2_sha256$'):
+        # Hash password before saving if it's not already hashed (any configured hasher)
+        if self.password and not is_hashed(self.password):
             self.password = make_password(self.password)
         super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.email} ({self.role})"
 
+    class Meta:
+        indexes = [
+            # team=... (admin lists, Assignment user__team joins) and team+role
+            models.Index(fields=["team", "role"], name="appuser_team_role_idx"),
+            models.Index(fields=["role"], name="appuser_role_idx"),
+        ]
+        constraints = [
+            models.UniqueConstraint(Lower("email"), name="appuser_email_lower_unique"),
+        ]
+
+
+# email__lower=... compiles to lower(email) = ..., which the functional
+# unique index above serves (iexact compiles to LIKE / UPPER()). Registered
+# on this field only, not on every EmailField in the project.
+AppUser._meta.get_field("email").register_lookup(Lower)
+
 
 class Credential(models.Model):
     website = models.URLField(blank=True, null=True)
     email = models.EmailField(blank=False, null=False)
-    password = models.CharField(max_length=200, blank=False, null=False)
+    # `password` is a property: AES-GCM ciphertext under a per-row data key,
+    # itself wrapped by master key `key_id` (see api.encryption)
+    password_ciphertext = models.TextField(editable=False)
+    data_key = models.CharField(max_length=64, editable=False)
+    key_id = models.CharField(max_length=32, db_index=True, editable=False)
+    # Normalized host of `website`, indexed for the autofill match lookup
+    domain = models.CharField(
+        max_length=253, blank=True, default="", db_index=True, editable=False
+    )
+
+    ENCRYPTED_FIELDS = ("password_ciphertext", "data_key", "key_id")
+
+    @property
+    def password(self):
+        # Decrypted on first access only, so rows never serialized cost nothing
+        if "_password" not in self.__dict__:
+            self._password = encryption.decrypt(
+                self.password_ciphertext, self.data_key, self.key_id
+            )
+        return self._password
+
+    @password.setter
+    def password(self, value):
+        value = "" if value is None else str(value)
+        self.password_ciphertext, self.data_key, self.key_id = encryption.encrypt(value)
+        self._password = value
+
+    @classmethod
+    def decrypt_all(cls, credentials):
+        """Decrypt the passwords of many loaded credentials in one batch."""
+        pending = [c for c in credentials if "_password" not in c.__dict__]
+        plaintexts = encryption.decrypt_many(
+            (c.password_ciphertext, c.data_key, c.key_id) for c in pending
+        )
+        for credential, plaintext in zip(pending, plaintexts):
+            credential._password = plaintext
+
+    def save(self, *args, **kwargs):
+        self.domain = credential_domain(self.website)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and {"website", "password"} & set(update_fields):
+            update_fields = set(update_fields)
+            if "website" in update_fields:
+                update_fields.add("domain")
+            if "password" in update_fields:
+                update_fields.discard("password")
+                update_fields.update(self.ENCRYPTED_FIELDS)
+            kwargs["update_fields"] = update_fields
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.email} @ {self.website or 'N/A'}"
@@ -61,5 +138,168 @@ class Assignment(models.Model):
         Credential, on_delete=models.CASCADE, related_name="assignments"
     )
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "credential"], name="unique_assignment_user_credential"
+            )
+        ]
+
     def __str__(self):
         return f"{self.user.email} -> {self.credential.email}"
+
+
+class UserCredentialAccess(models.Model):
+    """Materialized user -> credential access set, derived from Assignment."""
+
+    user = models.ForeignKey(
+        AppUser, on_delete=models.CASCADE, related_name="credential_access"
+    )
+    credential = models.ForeignKey(
+        Credential, on_delete=models.CASCADE, related_name="user_access"
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "credential"], name="unique_user_credential_access"
+            )
+        ]
+
+    def __str__(self):
+        return f"user {self.user_id} -> credential {self.credential_id}"
+
+
+class CredentialUsage(models.Model):
+    """
+    Autofills of a credential by one user, written in batches by api.usage.
+    Kept apart from the access sets so every role is counted and counts
+    survive access rebuilds.
+    """
+
+    user = models.ForeignKey(
+        AppUser, on_delete=models.CASCADE, related_name="credential_usage"
+    )
+    credential = models.ForeignKey(
+        Credential, on_delete=models.CASCADE, related_name="usage_counts"
+    )
+    use_count = models.PositiveIntegerField(default=0)
+    last_used_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "credential"], name="unique_credential_usage"
+            )
+        ]
+
+    def __str__(self):
+        return f"user {self.user_id} -> credential {self.credential_id}: {self.use_count} uses"
+
+
+class TeamCredentialAccess(models.Model):
+    """Materialized team -> credential access set, derived from Assignment."""
+
+    team = models.CharField(max_length=20, choices=AppUser.TEAM_CHOICES)
+    credential = models.ForeignKey(
+        Credential, on_delete=models.CASCADE, related_name="team_access"
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["team", "credential"], name="unique_team_credential_access"
+            )
+        ]
+
+    def __str__(self):
+        return f"team {self.team} -> credential {self.credential_id}"
+
+
+class ChangeLogEntry(models.Model):
+    """
+    Append-only log of credential and assignment changes. The auto-increment
+    id doubles as the delta-sync token handed to clients (trailing the log by
+    a safety window, see api.changes). Ids are stored as
+    plain integers so tombstones outlive the rows they describe.
+    """
+
+    KIND_CHOICES = [
+        ("credential", "Credential"),
+        ("assignment", "Assignment"),
+    ]
+
+    ACTION_CHOICES = [
+        ("upsert", "Upsert"),
+        ("delete", "Delete"),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    credential_id = models.BigIntegerField()
+    user_id = models.BigIntegerField(blank=True, null=True)
+    team = models.CharField(max_length=20, blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user_id", "id"], name="changelog_user_idx"),
+            models.Index(fields=["team", "id"], name="changelog_team_idx"),
+        ]
+
+    def __str__(self):
+        return f"#{self.id} {self.kind} {self.action} credential {self.credential_id}"
+
+
+class UserActivity(models.Model):
+    """Throttled last-seen tracking, kept off the AppUser row."""
+
+    user = models.OneToOneField(
+        AppUser, on_delete=models.CASCADE, primary_key=True, related_name="activity"
+    )
+    last_seen = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.user_id} last seen {self.last_seen}"
+
+
+class AuditEvent(models.Model):
+    """
+    Who read or changed which credential, and when. Written in batches off
+    the request path (api.audit); ids are plain integers so the trail
+    outlives the users and credentials it names.
+    """
+
+    ACTION_CHOICES = [
+        ("credential.list", "Listed credentials"),
+        ("credential.retrieve", "Read a credential"),
+        ("credential.match", "Looked up credentials for a host"),
+        ("credential.search", "Searched credentials"),
+        ("credential.changes", "Synced credential changes"),
+        ("credential.export", "Exported credentials"),
+        ("credential.bootstrap", "Loaded the popup"),
+        ("credential.create", "Created a credential"),
+        ("credential.update", "Updated a credential"),
+        ("credential.delete", "Deleted a credential"),
+        ("access.grant", "Granted a user access"),
+        ("access.revoke", "Revoked a user's access"),
+        ("user.password_reset", "Reset a user's password"),
+    ]
+
+    created_at = models.DateTimeField()
+    actor_id = models.BigIntegerField(blank=True, null=True)
+    action = models.CharField(max_length=32, choices=ACTION_CHOICES)
+    credential_id = models.BigIntegerField(blank=True, null=True)
+    # The user whose access or password changed
+    target_user_id = models.BigIntegerField(blank=True, null=True)
+    # Below 1 when reads were sampled under load: each row stands for 1/rate reads
+    sample_rate = models.FloatField(default=1.0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["actor_id", "created_at"], name="audit_actor_time_idx"),
+            models.Index(fields=["credential_id", "created_at"], name="audit_credential_time_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.created_at:%Y-%m-%d %H:%M:%S} user {self.actor_id} {self.action}"
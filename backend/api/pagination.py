@@ -0,0 +1,65 @@
+from rest_framework.pagination import CursorPagination, LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Opt-in keyset pagination: lists stay unpaginated unless the client asks
+    for ``?page_size=``, then pages follow the opaque ``next`` cursor.
+    """
+
+    ordering = "id"
+    page_size = None
+    page_size_query_param = "page_size"
+    max_page_size = 500
+
+
+class AuditPagination(CursorPagination):
+    """
+    Audit events newest first. Filtered by actor or credential, pages walk
+    the matching ``(…, created_at)`` index; unfiltered, they walk the
+    primary key, since ids follow write order (within a flush interval of
+    event time).
+    """
+
+    page_size = 100
+    page_size_query_param = "page_size"
+    max_page_size = 1000
+
+    def get_ordering(self, request, queryset, view):
+        if "actor" in request.query_params or "credential" in request.query_params:
+            return ("-created_at",)
+        return ("-id",)
+
+
+class RankedPagination(LimitOffsetPagination):
+    """
+    ``?limit=&offset=`` pages for ranked results, which have no stable key
+    to page on. Fetches one row past the page to know whether another
+    follows, instead of counting every match.
+    """
+
+    default_limit = 25
+    max_limit = 100
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.limit = self.get_limit(request)
+        self.offset = self.get_offset(request)
+        rows = list(queryset[self.offset : self.offset + self.limit + 1])
+        self.has_next = len(rows) > self.limit
+        return rows[: self.limit]
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = replace_query_param(
+            self.request.build_absolute_uri(), self.limit_query_param, self.limit
+        )
+        return replace_query_param(url, self.offset_query_param, self.offset + self.limit)
+
+    def get_paginated_response(self, data):
+        return Response(
+            {"next": self.get_next_link(), "previous": self.get_previous_link(), "results": data}
+        )
@@ -35,3 +35,14 @@ class IsUser(BasePermission):
             return True
 
         return False
+
+
+class CanReadMetrics(BasePermission):
+    """Super admins, or anyone when settings.METRICS_PUBLIC is on (e.g. behind an internal scrape network)."""
+
+    def has_permission(self, request, view):
+        from django.conf import settings
+
+        if getattr(settings, "METRICS_PUBLIC", False):
+            return True
+        return IsSuperAdmin().has_permission(request, view)
@@ -0,0 +1,37 @@
+import orjson
+from rest_framework.renderers import JSONRenderer
+
+# orjson writes these raw; DRF escapes them to stay a strict JavaScript subset
+_LINE_SEPARATORS = ((b"\xe2\x80\xa8", b"\\u2028"), (b"\xe2\x80\xa9", b"\\u2029"))
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer that encodes with orjson and emits the same bytes as DRF's
+    compact UTF-8 output. Dates, times, decimals and lazy strings still go
+    through DRF's encoder. Indented output (the browsable API,
+    ``; indent=``), ASCII-only settings and anything orjson refuses fall
+    back to the stdlib renderer. Floats use orjson's formatting (the API
+    serves none).
+    """
+
+    options = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        if (
+            self.ensure_ascii
+            or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            content = orjson.dumps(data, default=self.encoder_class().default, option=self.options)
+        except orjson.JSONEncodeError:
+            # e.g. integers beyond 64 bits
+            return super().render(data, accepted_media_type, renderer_context)
+        if b"\xe2\x80" in content:
+            for raw, escaped in _LINE_SEPARATORS:
+                content = content.replace(raw, escaped)
+        return content
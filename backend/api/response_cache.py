@@ -0,0 +1,66 @@
+"""
+Cache of rendered JSON list responses.
+
+Entries are keyed by the list's scoped ETag, which already covers the
+endpoint, the viewer's role and audience (everyone for super_admin, the
+team for admins, the user id for users), the query parameters and the
+audience's change counters. Nothing is deleted on writes: bump_scoped()
+moves the affected audiences to new keys and stale entries age out, so
+one team's change never evicts another team's lists.
+
+Responses that carry decrypted credential passwords (``private=True``) go
+to ``PRIVATE_ALIAS``, a process-local cache, so plaintext never reaches a
+shared backend such as Redis. The change counters stay shared, so every
+worker's private entries still go stale together.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+
+
+def _options():
+    return {
+        "ENABLED": True,
+        "ALIAS": "responses",
+        "PRIVATE_ALIAS": "private_responses",
+        "TIMEOUT": 300,
+        **getattr(settings, "RESPONSE_CACHE", {}),
+    }
+
+
+def _cache(options, private):
+    return caches[options["PRIVATE_ALIAS" if private else "ALIAS"]]
+
+
+def _key(etag, media_type):
+    return f"response:{etag.strip(chr(34))}:{media_type}"
+
+
+def enabled(request):
+    renderer = getattr(request, "accepted_renderer", None)
+    return _options()["ENABLED"] and getattr(renderer, "format", None) == "json"
+
+
+def get(request, etag, private=False):
+    """The cached response for ``etag``, or None."""
+    entry = _cache(_options(), private).get(_key(etag, request.accepted_media_type))
+    if entry is None:
+        return None
+    content, content_type = entry
+    return HttpResponse(content, content_type=content_type)
+
+
+def store(request, view, response, etag, private=False):
+    """Render ``response`` now (normally done after the view) and cache it."""
+    if response.status_code != 200:
+        return
+    response.accepted_renderer = request.accepted_renderer
+    response.accepted_media_type = request.accepted_media_type
+    response.renderer_context = view.get_renderer_context()
+    response.render()
+    options = _options()
+    _cache(options, private).set(
+        _key(etag, request.accepted_media_type),
+        (response.content, response["Content-Type"]),
+        options["TIMEOUT"],
+    )
@@ -0,0 +1,47 @@
+"""
+Primary / replica database routing.
+
+Writes always go to ``default``. Reads go to a replica from
+``settings.DATABASE_REPLICAS`` only inside ``use_replica()``, which
+ReplicaRoutingMiddleware enters for views marked read-only, so everything
+else (including reads that feed a write) keeps seeing the primary.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+replica_reads = ContextVar("replica_reads", default=False)
+
+
+@contextmanager
+def use_replica(enabled=True):
+    """Route reads in this block (thread / task) to a replica when ``enabled``."""
+    token = replica_reads.set(enabled)
+    try:
+        yield
+    finally:
+        replica_reads.reset(token)
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = getattr(settings, "DATABASE_REPLICAS", ())
+        if not replicas or not replica_reads.get():
+            return DEFAULT_DB_ALIAS
+        # Inside a transaction on the primary, stay there for consistency
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas mirror the primary, so objects from any alias may relate
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
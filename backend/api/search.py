@@ -0,0 +1,172 @@
+"""
+Credential search over the website host (``domain``) and ``email``.
+
+Both backends match case-insensitive substrings through a trigram index
+and rank the best matches first:
+
+* SQLite: an FTS5 table with the trigram tokenizer (SQLite >= 3.34), kept
+  in sync with ``api_credential`` by triggers; host matches rank above
+  email matches, exact and prefix host matches first;
+* PostgreSQL: pg_trgm GIN indexes, which also match near misses
+  (``trigram_similar``) and rank by trigram similarity; ``icontains``
+  compiles to ``UPPER(column) LIKE``, so the substring indexes are on
+  ``UPPER(column)``.
+
+Other backends fall back to an unindexed ``icontains`` scan with the
+SQLite ranking. The password columns are ciphertext and never indexed.
+
+A broad query can match most of the table. On the indexed backends only
+the ``SEARCH_CANDIDATES`` most relevant index matches (FTS5 bm25 rank,
+trigram similarity) are ranked and paged through, so the cost of a
+query is bounded whatever it matches.
+"""
+from django.conf import settings
+from django.db import connections
+from django.db.models import Case, FloatField, Q, Value, When
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Greatest
+
+MIN_QUERY_LENGTH = 3
+SEARCH_CANDIDATES = 1000
+
+SQLITE_TABLE = "api_credential_search"
+_SQLITE_TRIGGERS = {
+    "api_credential_search_ai": """
+        CREATE TRIGGER IF NOT EXISTS api_credential_search_ai AFTER INSERT ON api_credential
+        BEGIN
+            INSERT INTO api_credential_search (rowid, domain, email)
+            VALUES (new.id, new.domain, new.email);
+        END""",
+    "api_credential_search_ad": """
+        CREATE TRIGGER IF NOT EXISTS api_credential_search_ad AFTER DELETE ON api_credential
+        BEGIN
+            INSERT INTO api_credential_search (api_credential_search, rowid, domain, email)
+            VALUES ('delete', old.id, old.domain, old.email);
+        END""",
+    "api_credential_search_au": """
+        CREATE TRIGGER IF NOT EXISTS api_credential_search_au
+        AFTER UPDATE OF domain, email ON api_credential
+        BEGIN
+            INSERT INTO api_credential_search (api_credential_search, rowid, domain, email)
+            VALUES ('delete', old.id, old.domain, old.email);
+            INSERT INTO api_credential_search (rowid, domain, email)
+            VALUES (new.id, new.domain, new.email);
+        END""",
+}
+_POSTGRES_INDEXES = {
+    "credential_domain_trgm_idx": "domain",
+    "credential_email_trgm_idx": "email",
+    "credential_domain_upper_trgm_idx": "UPPER(domain::text)",
+    "credential_email_upper_trgm_idx": "UPPER(email::text)",
+}
+
+
+def _sqlite_supported(connection):
+    return connection.Database.sqlite_version_info >= (3, 34)
+
+
+def install(connection):
+    """Create the search index on ``connection`` (whatever part of it is missing)."""
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            for name, column in _POSTGRES_INDEXES.items():
+                cursor.execute(
+                    f"CREATE INDEX IF NOT EXISTS {name} "
+                    f"ON api_credential USING gin (({column}) gin_trgm_ops)"
+                )
+            return
+        if connection.vendor != "sqlite" or not _sqlite_supported(connection):
+            return
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'api_credential'"
+        )
+        if set(_SQLITE_TRIGGERS) <= {name for name, in cursor.fetchall()}:
+            return
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {SQLITE_TABLE} USING fts5("
+            "domain, email, content='api_credential', content_rowid='id', "
+            "tokenize='trigram')"
+        )
+        for ddl in _SQLITE_TRIGGERS.values():
+            cursor.execute(ddl)
+        cursor.execute(f"INSERT INTO {SQLITE_TABLE} ({SQLITE_TABLE}) VALUES ('rebuild')")
+
+
+def repair(connection):
+    """
+    Restore the SQLite sync triggers, which are dropped whenever a
+    migration rebuilds api_credential, and re-index; on PostgreSQL add any
+    index missing from an older install. Runs after migrate.
+    """
+    if connection.vendor == "postgresql":
+        if "api_credential" in connection.introspection.table_names():
+            install(connection)
+        return
+    if connection.vendor != "sqlite" or SQLITE_TABLE not in connection.introspection.table_names():
+        return
+    install(connection)
+
+
+def uninstall(connection):
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            for name in _POSTGRES_INDEXES:
+                cursor.execute(f"DROP INDEX IF EXISTS {name}")
+        elif connection.vendor == "sqlite":
+            for name in _SQLITE_TRIGGERS:
+                cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+            cursor.execute(f"DROP TABLE IF EXISTS {SQLITE_TABLE}")
+
+
+def _host_rank(query):
+    # Exact host, then host prefix, then anywhere in the host, then email only
+    return Case(
+        When(domain__iexact=query, then=Value(4.0)),
+        When(domain__istartswith=query, then=Value(3.0)),
+        When(domain__icontains=query, then=Value(2.0)),
+        default=Value(1.0),
+        output_field=FloatField(),
+    )
+
+
+def _candidates():
+    return getattr(settings, "SEARCH_CANDIDATES", SEARCH_CANDIDATES)
+
+
+def search_credentials(queryset, query, use_index=True):
+    """
+    ``queryset`` (Credentials) narrowed to matches for ``query``, annotated
+    with ``rank`` and ordered best first, then by id. Pass
+    ``use_index=False`` when the queryset is already small (a user's own
+    credentials): scanning those rows beats walking every index match.
+    """
+    connection = connections[queryset.db]
+    if use_index and connection.vendor == "postgresql":
+        from django.contrib.postgres.search import TrigramSimilarity
+
+        rank = Greatest(TrigramSimilarity("domain", query), TrigramSimilarity("email", query))
+        matches = queryset.filter(
+            Q(domain__trigram_similar=query)
+            | Q(email__trigram_similar=query)
+            | Q(domain__icontains=query)
+            | Q(email__icontains=query)
+        )
+        candidates = matches.annotate(rank=rank).order_by("-rank").values("pk")
+        return (
+            queryset.filter(pk__in=candidates[: _candidates()])
+            .annotate(rank=rank)
+            .order_by("-rank", "id")
+        )
+    if use_index and connection.vendor == "sqlite" and _sqlite_supported(connection):
+        # A quoted FTS5 trigram phrase matches it as a substring
+        queryset = queryset.filter(
+            id__in=RawSQL(
+                f"SELECT rowid FROM {SQLITE_TABLE} WHERE {SQLITE_TABLE} MATCH %s "
+                "ORDER BY rank LIMIT %s",
+                ['"{}"'.format(query.replace('"', '""')), _candidates()],
+            )
+        )
+    else:
+        queryset = queryset.filter(Q(domain__icontains=query) | Q(email__icontains=query))
+    return queryset.annotate(rank=_host_rank(query)).order_by("-rank", "id")
@@ -1,14 +1,43 @@
+from django.db import models
 from rest_framework import serializers
 from django.contrib.auth.hashers import check_password, make_password
-from .models import AppUser, Credential, Assignment
+from .encryption import decrypt_rows
+from .models import AppUser, AuditEvent, Credential, Assignment
 
 
-class AppUserSerializer(serializers.ModelSerializer):
+class SparseFieldsMixin:
+    """
+    Lets GET requests trim top-level output with ``?fields=id,email``.
+    Nested serializers keep all of their fields.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get("request")
+        if request is None or request.method != "GET" or self.field_name not in (None, ""):
+            return fields
+        requested = request.query_params.get("fields")
+        if not requested:
+            return fields
+        wanted = {name.strip() for name in requested.split(",")}
+        return {name: field for name, field in fields.items() if name in wanted}
+
+
+class AppUserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = AppUser
         fields = ["id", "email", "password", "role", "team"]
         extra_kwargs = {"password": {"write_only": True}}
 
+    def validate_email(self, value):
+        # Emails are unique case-insensitively (appuser_email_lower_unique)
+        users = AppUser.objects.filter(email__lower=value.lower())
+        if self.instance is not None:
+            users = users.exclude(pk=self.instance.pk)
+        if users.exists():
+            raise serializers.ValidationError("app user with this email already exists.")
+        return value
+
     def create(self, validated_data):
         validated_data["password"] = make_password(validated_data["password"])
         return super().create(validated_data)
@@ -19,13 +48,38 @@ class AppUserSerializer(serializers.ModelSerializer):
         return super().update(instance, validated_data)
 
 
-class CredentialSerializer(serializers.ModelSerializer):
+class CredentialListSerializer(serializers.ListSerializer):
+    """Decrypts every password in one batch instead of row by row."""
+
+    def to_representation(self, data):
+        credentials = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        if "password" in self.child.fields:
+            Credential.decrypt_all(credentials)
+        return super().to_representation(credentials)
+
+
+class CredentialSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    # Model property backed by the encrypted columns, which are never exposed
+    password = serializers.CharField(max_length=200)
+    # List fast path (api.fastpath): decrypted in batches from the columns
+    fast_path_columns = {"password": Credential.ENCRYPTED_FIELDS}
+    fast_path_prepare = staticmethod(decrypt_rows)
+
     class Meta:
         model = Credential
-        fields = "__all__"
+        fields = ["id", "website", "email", "password", "domain"]
+        list_serializer_class = CredentialListSerializer
+
 
+class AssignmentListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        assignments = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        if "credential" in self.child.fields:
+            Credential.decrypt_all([a.credential for a in assignments])
+        return super().to_representation(assignments)
 
-class AssignmentSerializer(serializers.ModelSerializer):
+
+class AssignmentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     user = AppUserSerializer(read_only=True)
     credential = CredentialSerializer(read_only=True)
     user_id = serializers.PrimaryKeyRelatedField(
@@ -38,3 +92,70 @@ class AssignmentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Assignment
         fields = ["id", "user", "credential", "user_id", "credential_id"]
+        list_serializer_class = AssignmentListSerializer
+
+
+class BulkAssignmentSerializer(serializers.Serializer):
+    action = serializers.ChoiceField(choices=["grant", "revoke"])
+    user_ids = serializers.ListField(
+        child=serializers.IntegerField(), required=False, default=list
+    )
+    teams = serializers.ListField(
+        child=serializers.ChoiceField(choices=AppUser.TEAM_CHOICES),
+        required=False,
+        default=list,
+    )
+    credential_ids = serializers.ListField(
+        child=serializers.IntegerField(), allow_empty=False
+    )
+
+    def validate(self, attrs):
+        if not attrs["user_ids"] and not attrs["teams"]:
+            raise serializers.ValidationError("Provide user_ids and/or teams")
+        return attrs
+
+
+class FlatAssignmentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """Assignment as ids only; the users / credentials are side-loaded."""
+
+    user = serializers.IntegerField(source="user_id", read_only=True)
+    credential = serializers.IntegerField(source="credential_id", read_only=True)
+
+    class Meta:
+        model = Assignment
+        fields = ["id", "user", "credential"]
+
+
+class AuditEventSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = AuditEvent
+        fields = [
+            "id",
+            "created_at",
+            "actor_id",
+            "action",
+            "credential_id",
+            "target_user_id",
+            "sample_rate",
+        ]
+        read_only_fields = fields
+
+
+def side_loaded_assignments(assignments, context=None):
+    """
+    ``{"assignments": [...], "users": {id: ...}, "credentials": {id: ...}}``
+    for ``assignments`` loaded with select_related("user", "credential"):
+    each user and credential is serialized once however often it repeats.
+    """
+    assignments = list(assignments)
+    users, credentials = {}, {}
+    for assignment in assignments:
+        users.setdefault(assignment.user_id, assignment.user)
+        credentials.setdefault(assignment.credential_id, assignment.credential)
+    return {
+        "assignments": FlatAssignmentSerializer(assignments, many=True, context=context).data,
+        "users": dict(zip(users, AppUserSerializer(users.values(), many=True).data)),
+        "credentials": dict(
+            zip(credentials, CredentialSerializer(credentials.values(), many=True).data)
+        ),
+    }
@@ -0,0 +1,176 @@
+from functools import partial
+
+from django.db import connections, router, transaction
+from django.db.models.signals import post_delete, post_migrate, post_save, pre_save
+from django.dispatch import receiver
+
+from . import access, changes, generations, search
+from .authentication import user_cache
+from .models import (
+    AppUser,
+    Assignment,
+    Credential,
+    TeamCredentialAccess,
+    UserCredentialAccess,
+)
+
+
+# Fields whose change must invalidate cached users and team-level access
+TRACKED_USER_FIELDS = ("email", "password", "role", "team")
+TOKEN_VERSION_FIELDS = ("password", "role", "team")
+
+
+def _invalidate_user_on_commit(user_id):
+    # Not before: a request in between would cache the uncommitted old row again
+    transaction.on_commit(partial(user_cache.invalidate, user_id))
+
+
+@receiver(pre_save, sender=AppUser)
+def remember_previous_user_state(sender, instance, **kwargs):
+    if instance.pk is None:
+        instance._previous_state = None
+    elif hasattr(instance, "_loaded_values") and all(
+        f in instance._loaded_values for f in TRACKED_USER_FIELDS
+    ):
+        instance._previous_state = {
+            f: instance._loaded_values[f] for f in TRACKED_USER_FIELDS
+        }
+    else:
+        instance._previous_state = (
+            AppUser.objects.filter(pk=instance.pk).values(*TRACKED_USER_FIELDS).first()
+        )
+
+    # Role, team or password changes revoke outstanding tokens. Partial saves
+    # that don't list token_version (e.g. the login re-hash) leave them valid.
+    previous = instance._previous_state
+    update_fields = kwargs.get("update_fields")
+    if (
+        previous is not None
+        and any(previous[f] != getattr(instance, f) for f in TOKEN_VERSION_FIELDS)
+        and (update_fields is None or "token_version" in update_fields)
+    ):
+        instance.token_version += 1
+
+
+@receiver(post_save, sender=AppUser)
+def sync_on_user_save(sender, instance, created, **kwargs):
+    previous = getattr(instance, "_previous_state", None)
+    current = {f: getattr(instance, f) for f in TRACKED_USER_FIELDS}
+    if created or previous != current:
+        # Also on create: a recycled primary key must not hit a stale entry
+        _invalidate_user_on_commit(instance.pk)
+    if not created and previous is not None and previous["team"] != instance.team:
+        access.user_team_changed(instance.pk, instance.team)
+        credential_ids = list(
+            instance.assignments.values_list("credential_id", flat=True)
+        )
+        changes.record_assignments(
+            [(instance.pk, previous["team"], c) for c in credential_ids], "delete"
+        )
+        changes.record_assignments(
+            [(instance.pk, instance.team, c) for c in credential_ids], "upsert"
+        )
+    if hasattr(instance, "_loaded_values"):
+        instance._loaded_values.update(current)
+
+
+@receiver(post_delete, sender=AppUser)
+def invalidate_deleted_user(sender, instance, **kwargs):
+    _invalidate_user_on_commit(instance.pk)
+
+
+@receiver(pre_save, sender=Assignment)
+def remember_previous_assignment(sender, instance, **kwargs):
+    instance._previous_pair = None
+    if instance.pk is not None:
+        instance._previous_pair = (
+            Assignment.objects.filter(pk=instance.pk)
+            .values_list("user_id", "credential_id")
+            .first()
+        )
+
+
+def _team_for(assignment):
+    if Assignment.user.is_cached(assignment):
+        return assignment.user.team
+    return access.team_of(assignment.user_id)
+
+
+@receiver(post_save, sender=Assignment)
+def sync_access_on_assignment_save(sender, instance, created, **kwargs):
+    previous = getattr(instance, "_previous_pair", None)
+    current = (instance.user_id, instance.credential_id)
+    teams, users = set(), set()
+    if previous and previous != current:
+        access.assignments_removed([previous])
+        user_id, credential_id = previous
+        team = access.team_of(user_id)
+        changes.record_assignments([(user_id, team, credential_id)], "delete")
+        teams.add(team)
+        users.add(user_id)
+    if created or previous != current:
+        row = (instance.user_id, _team_for(instance), instance.credential_id)
+        access.assignments_added([row])
+        changes.record_assignments([row], "upsert")
+        teams.add(row[1])
+        users.add(row[0])
+    generations.bump_scoped("assignment", teams, users)
+
+
+@receiver(post_delete, sender=Assignment)
+def sync_access_on_assignment_delete(sender, instance, **kwargs):
+    team = _team_for(instance)
+    access.assignments_removed([(instance.user_id, instance.credential_id)])
+    changes.record_assignments(
+        [(instance.user_id, team, instance.credential_id)], "delete"
+    )
+    generations.bump_scoped("assignment", [team], [instance.user_id])
+
+
+@receiver(post_save, sender=Credential)
+def log_credential_save(sender, instance, **kwargs):
+    changes.record_credentials([instance.pk], "upsert")
+
+
+@receiver(post_delete, sender=Credential)
+def log_credential_delete(sender, instance, **kwargs):
+    changes.record_credentials([instance.pk], "delete")
+
+
+@receiver(post_save, sender=AppUser)
+@receiver(post_delete, sender=AppUser)
+def bump_appuser_generation(sender, instance, **kwargs):
+    # Both teams on a team change: the user leaves one admin list, joins another
+    previous = getattr(instance, "_previous_state", None) or {}
+    generations.bump_scoped(
+        "appuser", [instance.team, previous.get("team")], [instance.pk]
+    )
+
+
+@receiver(post_save, sender=Credential)
+def bump_credential_generation(sender, instance, created, **kwargs):
+    if created:
+        # Nobody but super_admins can see it until it is assigned
+        generations.bump_scoped("credential")
+        return
+    generations.bump_scoped(
+        "credential",
+        TeamCredentialAccess.objects.filter(credential=instance).values_list(
+            "team", flat=True
+        ),
+        UserCredentialAccess.objects.filter(credential=instance).values_list(
+            "user_id", flat=True
+        ),
+    )
+
+
+@receiver(post_delete, sender=Credential)
+def bump_deleted_credential_generation(sender, instance, **kwargs):
+    # Teams and users that had access are bumped by the cascaded Assignment deletes
+    generations.bump_scoped("credential")
+
+
+@receiver(post_migrate)
+def repair_search_index(sender, app_config, using, **kwargs):
+    if app_config.name == "api" and router.allow_migrate_model(using, Credential):
+        search.repair(connections[using])
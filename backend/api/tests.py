@@ -1,3 +1,1528 @@
-from django.test import TestCase
+import asyncio
+import base64
+import contextlib
+import copy
+import csv
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import FieldError, ImproperlyConfigured
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.test import (
+    AsyncClient,
+    Client,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.utils import timezone
+
+from . import (
+    access,
+    async_views,
+    audit,
+    benchmark,
+    encryption,
+    events,
+    generations,
+    hashing,
+    search,
+    throttling,
+    usage,
+)
+from .authentication import user_cache
+from .domains import host_suffixes
+from .models import (
+    AppUser,
+    Assignment,
+    AuditEvent,
+    ChangeLogEntry,
+    Credential,
+    CredentialUsage,
+    TeamCredentialAccess,
+    UserCredentialAccess,
+)
+from .routers import use_replica
+from .search import search_credentials
+from .tokens import AppUserRefreshToken
+
+# Upper bound on queries per request, measured with a warm user cache.
+# A growing count here usually means a new N+1 in the endpoint.
+QUERY_BUDGETS = {
+    "login": 1,
+    "me": 0,
+    "bootstrap_user": 1,
+    "bootstrap_admin": 3,
+    "credentials_list_super_admin": 1,
+    "credentials_list_admin": 1,
+    "credentials_list_user": 1,
+    "credentials_list_user_most_used": 1,
+    "credentials_list_admin_most_used": 1,
+    "credentials_search_super_admin": 1,
+    "export_users": 1,
+    "assignments_list_admin": 1,
+    "assignments_list_admin_flat": 1,
+    "credentials_for_user": 1,
+    "users_for_credential": 1,
+}
+
+# No background writer threads: their own connection cannot write while a
+# TestCase holds the test transaction. Tests flush explicitly.
+AUDIT_INLINE = {**settings.AUDIT_LOG, "FLUSH_INTERVAL": 0}
+USAGE_INLINE = {**settings.USAGE_COUNTERS, "FLUSH_INTERVAL": 0}
+
+# A fixed, test-only master key; settings require a real one
+TEST_ENCRYPTION = {
+    **settings.CREDENTIAL_ENCRYPTION,
+    "KEYFILE": None,
+    "MASTER_KEY": "dGVzdC1vbmx5LWNyZWRlbnRpYWwtbWFzdGVyLWtleSE=",
+    "MASTER_KEY_ID": "test",
+}
+
+# A second SQLite database standing in for a read replica (ReplicaRoutingTests).
+# Not a TEST MIRROR of the primary, so it can lag behind it.
+REPLICA = "test_replica"
+connections.settings.setdefault(
+    REPLICA,
+    {
+        **connections.settings["default"],
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": ":memory:",
+        "OPTIONS": {},
+        "TEST": {**connections.settings["default"]["TEST"], "NAME": None, "MIRROR": None},
+    },
+)
+
+
+@override_settings(
+    PASSWORD_PBKDF2_ITERATIONS=1000,
+    REQUEST_LOG_SAMPLE_RATE=0,
+    AUDIT_LOG=AUDIT_INLINE,
+    USAGE_COUNTERS=USAGE_INLINE,
+    CREDENTIAL_ENCRYPTION=TEST_ENCRYPTION,
+)
+class ApiTestCase(TestCase):
+    """
+    Cheap password hashing, the test master key, no sampled request logs,
+    and audit / usage buffers that only write on flush(). ``seed`` holds
+    benchmark.seed() arguments; the seeded org's representative users are
+    ``actors``.
+    """
+
+    seed = None
+
+    @classmethod
+    def setUpTestData(cls):
+        if cls.seed is not None:
+            cls.actors = benchmark.seed(**cls.seed)
+
+    def setUp(self):
+        # Users cached by another test outlive its rolled-back rows, and ids repeat
+        user_cache.local.clear()
+        user_cache.shared.clear()
+
+    def client_for(self, actor):
+        token = AppUserRefreshToken.for_user(self.actors[actor]).access_token
+        return Client(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+
+class QueryBudgetTests(ApiTestCase):
+    seed = {"users": 24, "credentials": 30, "fanout": 5}
+
+    def test_endpoints_stay_within_query_budget(self):
+        results = benchmark.run(self.actors, iterations=2)
+        for name, budget in QUERY_BUDGETS.items():
+            with self.subTest(endpoint=name):
+                self.assertEqual(results[name]["status"], 200)
+                self.assertLessEqual(results[name]["queries"], budget)
+        # Only the visibility check; the use itself is counted in memory
+        self.assertEqual(results["credentials_used"]["status"], 202)
+        self.assertEqual(results["credentials_used"]["queries"], 1)
+
+    def test_compare_flags_query_regressions(self):
+        baseline = {"endpoints": {"me": {"queries": 0, "p99_ms": 1.0}}}
+        results = {"me": {"queries": 3, "p99_ms": 1.0}}
+        self.assertEqual(
+            benchmark.compare(results, baseline), ["me: 3 queries (baseline 0)"]
+        )
+
+
+class DomainMatchTests(ApiTestCase):
+    def test_host_suffixes_stop_at_the_public_suffix(self):
+        cases = {
+            "https://www.Login.Example.com:8443/x": ["login.example.com", "example.com"],
+            "a.b.example.co.uk": ["a.b.example.co.uk", "b.example.co.uk", "example.co.uk"],
+            "a.co.uk": ["a.co.uk"],
+            "foo.github.io": ["foo.github.io"],
+            "github.io": ["github.io"],
+            "localhost": ["localhost"],
+            "127.0.0.1": ["127.0.0.1"],
+            "": [],
+        }
+        for host, expected in cases.items():
+            with self.subTest(host=host):
+                self.assertEqual(host_suffixes(host), expected)
+
+    def test_match_returns_most_specific_domain_first(self):
+        super_admin = AppUser.objects.create(
+            email="super@match.test", password="x", role="super_admin"
+        )
+        ids = {
+            website: Credential.objects.create(
+                website=website, email="e@match.test", password="p"
+            ).pk
+            for website in (
+                "https://example.co.uk",
+                "https://login.example.co.uk/signin",
+                "https://co.uk",
+                "https://other.co.uk",
+                "https://github.io",
+            )
+        }
+        token = AppUserRefreshToken.for_user(super_admin).access_token
+        client = Client(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+        def matches(host):
+            response = client.get("/api/credentials/match/", {"host": host})
+            self.assertEqual(response.status_code, 200)
+            return [row["id"] for row in response.json()]
+
+        self.assertEqual(
+            matches("a.login.example.co.uk"),
+            [ids["https://login.example.co.uk/signin"], ids["https://example.co.uk"]],
+        )
+        self.assertEqual(matches("foo.github.io"), [])
+        self.assertEqual(matches("github.io"), [ids["https://github.io"]])
+        self.assertEqual(client.get("/api/credentials/match/").status_code, 400)
+
+
+class AccessTableTests(ApiTestCase):
+    """The materialized access sets follow every assignment and team change."""
+
+    seed = {"users": 8, "credentials": 10, "fanout": 3}
+
+    def assertInSync(self):
+        drift = access.find_drift()
+        self.assertEqual(drift, {name: set() for name in drift})
+
+    def test_assignment_and_team_changes_update_access_tables(self):
+        user = self.actors["user"]
+        credential = Credential.objects.create(email="new@bench.test", password="p")
+        other_team = next(t for t, _ in AppUser.TEAM_CHOICES if t != user.team)
+
+        assignment = Assignment.objects.create(user=user, credential=credential)
+        self.assertTrue(
+            UserCredentialAccess.objects.filter(user=user, credential=credential).exists()
+        )
+        self.assertTrue(
+            TeamCredentialAccess.objects.filter(team=user.team, credential=credential).exists()
+        )
+        self.assertInSync()
+
+        user.team = other_team
+        user.save()
+        self.assertEqual(
+            set(
+                TeamCredentialAccess.objects.filter(credential=credential).values_list(
+                    "team", flat=True
+                )
+            ),
+            {other_team},
+        )
+        self.assertInSync()
+
+        assignment.delete()
+        self.assertFalse(credential.user_access.exists() or credential.team_access.exists())
+        self.assertInSync()
+
+
+class UserCacheTests(ApiTestCase):
+    seed = {"users": 4, "credentials": 4, "fanout": 2}
+
+    def me(self, user_or_token):
+        token = user_or_token
+        if isinstance(user_or_token, AppUser):
+            token = AppUserRefreshToken.for_user(user_or_token).access_token
+        return Client(HTTP_AUTHORIZATION=f"Bearer {token}").get("/api/me/")
+
+    def test_role_change_applies_to_the_next_request_after_commit(self):
+        user = AppUser.objects.get(pk=self.actors["user"].pk)
+        old_token_user = copy.copy(user)
+        self.assertEqual(self.me(user).json()["role"], "user")
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            user.role = "admin"
+            user.save()
+            # Uncommitted: other requests keep seeing the cached committed row
+            self.assertEqual(self.me(old_token_user).json()["role"], "user")
+        self.assertTrue(callbacks)
+
+        self.assertEqual(self.me(user).json()["role"], "admin")
+        # The role change also revoked tokens issued before it
+        self.assertEqual(self.me(old_token_user).status_code, 401)
+
+    def test_password_change_revokes_access_and_refresh_tokens(self):
+        user = AppUser.objects.get(pk=self.actors["user"].pk)
+        refresh = AppUserRefreshToken.for_user(user)
+        old_access = refresh.access_token
+        response = Client().post("/api/token/refresh/", {"refresh": str(refresh)})
+        self.assertEqual(response.status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            user.password = "a-new-password"
+            user.save()
+        self.assertEqual(self.me(old_access).status_code, 401)
+        response = Client().post("/api/token/refresh/", {"refresh": str(refresh)})
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(self.me(AppUserRefreshToken.for_user(user).access_token).status_code, 200)
+
+
+class ListEndpointTests(ApiTestCase):
+    seed = {"users": 8, "credentials": 10, "fanout": 3}
+
+    def setUp(self):
+        super().setUp()
+        self.client = self.client_for("super_admin")
+
+    def test_cursor_pages_walk_the_whole_list(self):
+        ids, url = [], "/api/users/?page_size=3&fields=id,email"
+        while url:
+            page = self.client.get(url).json()
+            self.assertLessEqual(len(page["results"]), 3)
+            self.assertTrue(all(row.keys() == {"id", "email"} for row in page["results"]))
+            ids += [row["id"] for row in page["results"]]
+            url = page["next"]
+        self.assertEqual(ids, list(AppUser.objects.order_by("id").values_list("id", flat=True)))
+
+    def test_etag_revalidates_until_the_list_changes(self):
+        response = self.client.get("/api/credentials/")
+        etag = response["ETag"]
+        response = self.client.get("/api/credentials/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        # Another representation of the same list has its own tag
+        self.assertNotEqual(self.client.get("/api/credentials/?fields=id")["ETag"], etag)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Credential.objects.create(email="new@bench.test", password="p")
+        response = self.client.get("/api/credentials/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    @override_settings(RESPONSE_CACHE={"ENABLED": True})
+    def test_decrypted_passwords_stay_out_of_the_shared_response_cache(self):
+        shared, private = caches["responses"], caches["private_responses"]
+        shared.clear()
+        private.clear()
+        for path in ("/api/credentials/", "/api/assignments/", "/api/bootstrap/", "/api/users/"):
+            self.assertEqual(self.client.get(path).status_code, 200)
+        # LocMemCache keeps pickled values; the seeded passwords are "secret-<n>"
+        self.assertEqual(len(shared._cache), 1)
+        self.assertNotIn(b"secret-", b"".join(shared._cache.values()))
+        self.assertEqual(len(private._cache), 3)
+        self.assertIn(b"secret-", b"".join(private._cache.values()))
+
+
+class ChangesFeedTests(ApiTestCase):
+    seed = {"users": 8, "credentials": 10, "fanout": 3}
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # The seed's own entries are long committed
+        ChangeLogEntry.objects.update(created_at=timezone.now() - timedelta(hours=1))
+
+    def setUp(self):
+        super().setUp()
+        self.user = self.actors["user"]
+        self.client = self.client_for("user")
+
+    def sync(self, since=None):
+        params = {} if since is None else {"since": since}
+        response = self.client.get("/api/credentials/changes/", params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    @override_settings(SYNC_SAFETY_WINDOW=0)
+    def test_deltas_follow_grants_edits_and_revokes(self):
+        snapshot = self.sync()
+        self.assertTrue(snapshot["full"])
+        self.assertEqual(
+            {row["id"] for row in snapshot["upserts"]},
+            set(self.user.assignments.values_list("credential_id", flat=True)),
+        )
+        credential = Credential.objects.create(email="new@bench.test", password="p")
+        assignment = Assignment.objects.create(user=self.user, credential=credential)
+        delta = self.sync(snapshot["token"])
+        self.assertEqual([row["id"] for row in delta["upserts"]], [credential.pk])
+        self.assertEqual(delta["removals"], [])
+
+        assignment.delete()
+        delta = self.sync(delta["token"])
+        self.assertEqual((delta["upserts"], delta["removals"]), ([], [credential.pk]))
+        self.assertEqual(self.sync(delta["token"])["upserts"], [])
+
+        with override_settings(SYNC_MAX_ENTRIES=1):
+            Assignment.objects.create(user=self.user, credential=credential)
+            credential.save()
+            delta = self.sync(delta["token"])
+            self.assertTrue(delta["has_more"])
+            delta = self.sync(delta["token"])
+            self.assertFalse(delta["has_more"])
+        self.assertEqual(self.sync(delta["token"])["upserts"], [])
+
+    def test_late_commit_of_a_lower_id_is_not_skipped(self):
+        snapshot = self.sync()
+        first, second = Credential.objects.filter(assignments__user=self.user)[:2]
+        first.save()
+        second.save()
+        # The first edit's transaction is still open: its entry is invisible
+        entry = ChangeLogEntry.objects.get(credential_id=first.pk, id__gt=snapshot["token"])
+        entry_id = entry.pk
+        entry.delete()
+
+        delta = self.sync(snapshot["token"])
+        self.assertEqual([row["id"] for row in delta["upserts"]], [second.pk])
+        # The token stays behind the window instead of moving past the gap
+        self.assertLess(int(delta["token"]), entry_id)
+
+        entry.pk = entry_id
+        entry.save(force_insert=True)  # commits with its original, lower id
+        delta = self.sync(delta["token"])
+        self.assertEqual({row["id"] for row in delta["upserts"]}, {first.pk, second.pk})
+
+
+class BulkAssignmentTests(ApiTestCase):
+    """Bulk grant / revoke bypass the Assignment signals but have the same effects."""
+
+    seed = {"users": 8, "credentials": 10, "fanout": 3}
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # In different teams, so neither keeps team access alive for the other
+        cls.single = AppUser.objects.filter(role="user").first()
+        cls.bulk = AppUser.objects.filter(role="user").exclude(team=cls.single.team).first()
+        cls.credential_ids = [
+            Credential.objects.create(email=f"bulk{i}@bench.test", password="p").pk
+            for i in range(2)
+        ]
+
+    def setUp(self):
+        super().setUp()
+        super_admin = AppUser.objects.get(role="super_admin")
+        token = AppUserRefreshToken.for_user(super_admin).access_token
+        self.client = Client(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def effects(self, user, request):
+        """What ``request`` changed for ``user``, with their id and team masked."""
+        last_entry = ChangeLogEntry.objects.order_by("-id").values_list("id", flat=True)[0]
+        with mock.patch("api.generations.bump", wraps=generations.bump) as bump, mock.patch(
+            "api.events.publish"
+        ) as publish, self.captureOnCommitCallbacks(execute=True):
+            request()
+
+        def mask(value):
+            return str(value).replace(f"user:{user.pk}", "user:<id>").replace(user.team, "<team>")
+
+        return {
+            "user_access": set(
+                UserCredentialAccess.objects.filter(
+                    user=user, credential_id__in=self.credential_ids
+                ).values_list("credential_id", flat=True)
+            ),
+            "team_access": set(
+                TeamCredentialAccess.objects.filter(
+                    team=user.team, credential_id__in=self.credential_ids
+                ).values_list("credential_id", flat=True)
+            ),
+            "changes": sorted(
+                (kind, action, mask(team), credential_id, user_id == user.pk)
+                for kind, action, team, credential_id, user_id in ChangeLogEntry.objects.filter(
+                    id__gt=last_entry
+                ).values_list("kind", "action", "team", "credential_id", "user_id")
+            ),
+            "generations": {mask(name) for call in bump.call_args_list for name in call.args},
+            "events": {
+                (call.args[0], mask(sorted(call.args[1]))) for call in publish.call_args_list
+            },
+        }
+
+    def single_path(self, user, view):
+        def request():
+            for credential_id in self.credential_ids:
+                response = self.client.post(
+                    f"/api/assignments/{credential_id}/{view}/", {"user_id": user.pk}
+                )
+                self.assertIn(response.status_code, (200, 201))
+
+        return request
+
+    def bulk_path(self, user, action):
+        def request():
+            response = self.client.post(
+                "/api/assignments/bulk/",
+                {"action": action, "user_ids": [user.pk], "credential_ids": self.credential_ids},
+                content_type="application/json",
+            )
+            self.assertEqual(response.status_code, 200)
+
+        return request
+
+    def test_bulk_paths_match_single_row_paths(self):
+        for action, view in (("grant", "add_user_access"), ("revoke", "remove_user_access")):
+            with self.subTest(action=action):
+                single = self.effects(self.single, self.single_path(self.single, view))
+                bulk = self.effects(self.bulk, self.bulk_path(self.bulk, action))
+                self.assertEqual(single, bulk)
+                self.assertTrue(single["changes"] and single["generations"] and single["events"])
+                drift = access.find_drift()
+                self.assertEqual(drift, {name: set() for name in drift})
+
+
+class PasswordHashingTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = AppUser.objects.create(email="hash@example.test", password="s3cret-pass")
+
+    def login(self, password="s3cret-pass"):
+        return Client().post("/api/login/", {"email": "HASH@example.test", "password": password})
+
+    def test_login_rehashes_outdated_hashes_without_revoking_tokens(self):
+        token = AppUserRefreshToken.for_user(self.user).access_token
+        with override_settings(PASSWORD_PBKDF2_ITERATIONS=1200):
+            self.assertEqual(self.login("wrong").status_code, 400)
+            self.user.refresh_from_db()
+            self.assertIn("$1000$", self.user.password)
+
+            self.assertEqual(self.login().status_code, 200)
+            self.user.refresh_from_db()
+            self.assertIn("$1200$", self.user.password)
+        response = Client(HTTP_AUTHORIZATION=f"Bearer {token}").get("/api/me/")
+        self.assertEqual(response.status_code, 200)
+
+    def test_rehash_waits_for_the_limiter_or_is_left_for_later(self):
+        verify = hashing.verify_password
+        with override_settings(
+            PASSWORD_PBKDF2_ITERATIONS=1200, PASSWORD_HASHING={"ACQUIRE_TIMEOUT": 0}
+        ), mock.patch("api.hashing._slots", threading.BoundedSemaphore(1)) as slots:
+
+            def verify_then_fill(*args):
+                # Another login takes the only slot before the re-hash
+                result = verify(*args)
+                slots.acquire()
+                return result
+
+            with mock.patch("api.views.verify_password", side_effect=verify_then_fill):
+                self.assertEqual(self.login().status_code, 200)
+            self.user.refresh_from_db()
+            self.assertIn("$1000$", self.user.password)
+
+            slots.release()
+            self.assertEqual(self.login().status_code, 200)
+            self.user.refresh_from_db()
+            self.assertIn("$1200$", self.user.password)
+
+    def test_verification_runs_on_the_pool_behind_a_limiter(self):
+        with override_settings(PASSWORD_HASHING={"WORKERS": 1, "ACQUIRE_TIMEOUT": 0}), mock.patch(
+            "api.hashing._pool", None
+        ), mock.patch("api.hashing._slots", threading.BoundedSemaphore(1)) as slots:
+            pool = hashing.shared_pool()
+            try:
+                ok, _ = hashing.verify_password("s3cret-pass", self.user.password)
+                self.assertTrue(ok)
+                self.assertEqual(len(pool._processes), 1)
+                # All slots busy: the login is turned away before hashing
+                slots.acquire()
+                # Server errors are always logged; keep the line out of the test output
+                with self.assertLogs("api.requests") as logs:
+                    response = self.login()
+                self.assertEqual(response.status_code, 503)
+                self.assertIn('"status": 503', logs.output[0])
+                self.assertEqual(response["Retry-After"], "1")
+            finally:
+                pool.shutdown()
+
+
+class AsyncViewTests(ApiTestCase):
+    seed = {"users": 8, "credentials": 12, "fanout": 4}
+
+    def clients(self, actor):
+        token = AppUserRefreshToken.for_user(self.actors[actor]).access_token
+        client = AsyncClient()
+
+        def get(path, **headers):
+            # AsyncClient only sends per-request headers as ASGI headers
+            return client.get(path, headers={"Authorization": f"Bearer {token}", **headers})
+
+        return Client(HTTP_AUTHORIZATION=f"Bearer {token}"), get
+
+    async def test_async_list_serves_the_sync_list_data(self):
+        for actor in ("super_admin", "user"):
+            sync_client, aget = self.clients(actor)
+            for query in ("", "?fields=id,email", "?ordering=most_used"):
+                with self.subTest(actor=actor, query=query):
+                    expected = await sync_to_async(sync_client.get)(f"/api/credentials/{query}")
+                    response = await aget(f"/api/async/credentials/{query}")
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(response.json(), expected.json())
+
+            ids, url = [], "/api/async/credentials/?page_size=5&fields=id"
+            while url:
+                page = (await aget(url)).json()
+                self.assertLessEqual(len(page["results"]), 5)
+                ids += [row["id"] for row in page["results"]]
+                url = page["next"]
+            expected = await sync_to_async(sync_client.get)("/api/credentials/?fields=id")
+            self.assertEqual(ids, [row["id"] for row in expected.json()])
+
+    async def test_async_match_orders_like_the_sync_match(self):
+        def create():
+            credentials = [
+                Credential.objects.create(
+                    website=f"https://{host}/", email="m@bench.test", password="p"
+                )
+                for host in ("shop.test", "login.shop.test", "shop.test")
+            ]
+            CredentialUsage.objects.create(
+                user=self.actors["super_admin"], credential=credentials[2], use_count=3
+            )
+
+        await sync_to_async(create)()
+        sync_client, aget = self.clients("super_admin")
+        for query in ("", "&ordering=most_used"):
+            with self.subTest(query=query):
+                path = f"credentials/match/?host=login.shop.test{query}"
+                expected = (await sync_to_async(sync_client.get)(f"/api/{path}")).json()
+                self.assertEqual(len(expected), 3)
+                self.assertEqual((await aget(f"/api/async/{path}")).json(), expected)
+
+    async def test_async_refresh_mints_fresh_claims_until_revoked(self):
+        user = self.actors["user"]
+        refresh = AppUserRefreshToken.for_user(user)
+        client = AsyncClient()
+        response = await client.post(
+            "/api/async/token/refresh/", {"refresh": str(refresh)}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 200)
+        headers = {"Authorization": f"Bearer {response.json()['access']}"}
+        me = await client.get("/api/async/me/", headers=headers)
+        self.assertEqual(me.json()["id"], user.pk)
+        response = await client.post(
+            "/api/async/token/refresh/", {}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 400)
+
+        def revoke():
+            with self.captureOnCommitCallbacks(execute=True):
+                AppUser.objects.filter(pk=user.pk).update(token_version=user.token_version + 1)
+                user_cache.invalidate(user.pk)
+
+        await sync_to_async(revoke)()
+        response = await client.post(
+            "/api/async/token/refresh/", {"refresh": str(refresh)}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 401)
+
+    async def test_async_list_revalidates_with_etag(self):
+        _, aget = self.clients("admin")
+        etag = (await aget("/api/async/credentials/"))["ETag"]
+        response = await aget("/api/async/credentials/", If_None_Match=f'"other", {etag}')
+        self.assertEqual(response.status_code, 304)
+
+        def change():
+            with self.captureOnCommitCallbacks(execute=True):
+                generations.bump_scoped("credential", [self.actors["admin"].team])
+
+        await sync_to_async(change)()
+        response = await aget("/api/async/credentials/", If_None_Match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+
+@override_settings(EVENTS={"BROKER": "api.events.LocalBroker", "HEARTBEAT": 0.01})
+class EventStreamTests(ApiTestCase):
+    seed = {"users": 4, "credentials": 4, "fanout": 2}
+
+    @contextlib.asynccontextmanager
+    async def stream(self, actor, expires_in=60):
+        """A started stream for ``actor``: ``(subscription, chunks)``."""
+        user = self.actors[actor]
+        subscription = events.Subscription(
+            generations.audience(user),
+            {kind: "t0" for kind in events.KINDS},
+            asyncio.get_running_loop(),
+        )
+        chunks = async_views._stream(subscription, time.time() + expires_in, user)
+        try:
+            self.assertIn("event: ready", await anext(chunks))
+            yield subscription, chunks
+        finally:
+            await chunks.aclose()
+
+    async def test_changes_reach_only_their_audiences_once_per_kind(self):
+        async with contextlib.AsyncExitStack() as stack:
+            streams = {
+                actor: await stack.enter_async_context(self.stream(actor))
+                for actor in ("super_admin", "admin", "user")
+            }
+            team = f"team:{self.actors['admin'].team}"
+            # A burst on the admin's team: two credential changes, one assignment
+            for kind in ("credential", "credential", "assignment"):
+                events.broker().publish({"kind": kind, "tokens": {"all": "t1", team: "t2"}})
+            await asyncio.sleep(0)
+            for actor in ("super_admin", "admin"):
+                _, chunks = streams[actor]
+                self.assertIn('data: {"kind": "credential"}', await anext(chunks))
+                self.assertIn('data: {"kind": "assignment"}', await anext(chunks))
+                self.assertEqual(await anext(chunks), ": ping\n\n")
+            self.assertEqual(streams["admin"][0].last_event_id(), "t2.t2.t0")
+            self.assertEqual(await anext(streams["user"][1]), ": ping\n\n")
+
+    async def test_expired_token_ends_the_stream(self):
+        async with self.stream("user", expires_in=0.05) as (_, chunks):
+            while (chunk := await anext(chunks)) == ": ping\n\n":
+                pass
+            self.assertIn("event: expired", chunk)
+            with self.assertRaises(StopAsyncIteration):
+                await anext(chunks)
+
+    async def test_role_or_password_change_revokes_the_stream(self):
+        user = self.actors["user"]
+
+        def change(**fields):
+            with self.captureOnCommitCallbacks(execute=True):
+                AppUser.objects.filter(pk=user.pk).update(**fields)
+                # update() skips the receivers; invalidate as a save() would
+                user_cache.invalidate(user.pk)
+
+        for fields in ({"role": "admin"}, {"token_version": user.token_version + 1}):
+            with self.subTest(fields=fields):
+                async with self.stream("user") as (_, chunks):
+                    self.assertEqual(await anext(chunks), ": ping\n\n")
+                    await sync_to_async(change)(**fields)
+                    self.assertIn("event: revoked", await anext(chunks))
+                await sync_to_async(change)(role="user", token_version=user.token_version)
+
+    async def test_resume_sends_the_kinds_changed_since_last_event_id(self):
+        user = self.actors["user"]
+        token = AppUserRefreshToken.for_user(user).access_token
+        tokens = await sync_to_async(generations.current)(
+            *(f"{kind}@user:{user.pk}" for kind in events.KINDS)
+        )
+        seen = ".".join([tokens[0], "stale", tokens[2]])
+        response = await AsyncClient().get(
+            "/api/async/events/",
+            headers={"Authorization": f"Bearer {token}", "Last-Event-ID": seen},
+        )
+        self.assertEqual(response.status_code, 200)
+        chunks = aiter(response.streaming_content)
+        try:
+            # The ready event already carries the current tokens
+            self.assertIn(f"id: {'.'.join(tokens)}", (await anext(chunks)).decode())
+            self.assertIn('data: {"kind": "assignment"}', (await anext(chunks)).decode())
+            self.assertEqual(await anext(chunks), b": ping\n\n")
+        finally:
+            await chunks.aclose()
+
+
+class MetricsTests(ApiTestCase):
+    seed = {"users": 4, "credentials": 4, "fanout": 2}
+
+    def sample(self, series):
+        """Current value of one exposed series (0 if not observed yet)."""
+        response = self.client_for("super_admin").get("/api/metrics/")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+        for line in response.content.decode().splitlines():
+            name, _, value = line.rpartition(" ")
+            if name == series:
+                return float(value)
+        return 0
+
+    def test_requests_are_measured_and_exposed_to_super_admins(self):
+        count = 'api_request_duration_seconds_count{method="GET",status="200",view="me"}'
+        queries = 'api_db_queries_per_request_count{method="GET",view="me"}'
+        before = self.sample(count), self.sample(queries)
+        client = self.client_for("user")
+        for _ in range(3):
+            self.assertEqual(client.get("/api/me/").status_code, 200)
+        self.assertEqual((self.sample(count), self.sample(queries)), (before[0] + 3, before[1] + 3))
+
+        self.assertEqual(client.get("/api/metrics/").status_code, 403)
+        self.assertEqual(self.client_for("admin").get("/api/metrics/").status_code, 403)
+        self.assertIn(Client().get("/api/metrics/").status_code, (401, 403))
+        with override_settings(METRICS_PUBLIC=True):
+            self.assertEqual(Client().get("/api/metrics/").status_code, 200)
+
+
+class ExportTests(ApiTestCase):
+    seed = {"users": 6, "credentials": 5, "fanout": 2}
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.odd = Credential.objects.create(
+            website="https://odd.test/?a=1,b=2", email="odd@bench.test", password='se,"cr"\net é'
+        )
+
+    def export(self, actor, path):
+        response = self.client_for(actor).get(path)
+        if response.status_code != 200:
+            return response, None
+        self.assertTrue(response.streaming)
+        return response, b"".join(response.streaming_content).decode()
+
+    def test_user_export_streams_ndjson_and_csv(self):
+        expected = list(
+            AppUser.objects.exclude(role="super_admin")
+            .order_by("id")
+            .values("id", "email", "role", "team")
+        )
+        response, body = self.export("super_admin", "/api/users/export_users/?mode=ndjson")
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        self.assertEqual([json.loads(line) for line in body.splitlines()], expected)
+
+        response, body = self.export("super_admin", "/api/users/export_users/?mode=csv")
+        self.assertEqual(response["Content-Disposition"], 'attachment; filename="users.csv"')
+        rows = list(csv.DictReader(io.StringIO(body)))
+        self.assertEqual(rows, [{k: str(v) for k, v in row.items()} for row in expected])
+        response, _ = self.export("admin", "/api/users/export_users/?mode=csv")
+        self.assertEqual(response.status_code, 403)
+
+    def test_credential_export_has_one_row_per_assignment_with_plaintext(self):
+        _, body = self.export("super_admin", "/api/credentials/export/?mode=csv")
+        rows = list(csv.DictReader(io.StringIO(body)))
+        self.assertEqual(
+            len(rows),
+            Assignment.objects.count()
+            + Credential.objects.filter(assignments__isnull=True).count(),
+        )
+        odd = [row for row in rows if row["id"] == str(self.odd.pk)]
+        self.assertEqual(
+            odd,
+            [
+                {
+                    "id": str(self.odd.pk),
+                    "website": self.odd.website,
+                    "email": "odd@bench.test",
+                    "password": 'se,"cr"\net é',
+                    "user_id": "",
+                    "user_email": "",
+                }
+            ],
+        )
+        _, body = self.export("super_admin", "/api/credentials/export/")
+        lines = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual(len(lines), len(rows))
+        self.assertIn({**odd[0], "user_id": None, "user_email": None, "id": self.odd.pk}, lines)
+        response, _ = self.export("super_admin", "/api/credentials/export/?mode=xml")
+        self.assertEqual(response.status_code, 400)
+
+
+class ImportTests(ApiTestCase):
+    seed = {"users": 4, "credentials": 3, "fanout": 1}
+
+    def setUp(self):
+        super().setUp()
+        self.client = self.client_for("super_admin")
+
+    def test_invalid_rows_are_reported_and_the_rest_imported(self):
+        body = (
+            "email,password,role,team\n"
+            "new1@bench.test,pw-1,user,php\n"
+            "USER1@bench.test,pw-2,user,php\n"
+            "new2@bench.test,pw-3,owner,php\n"
+            "new1@bench.test,pw-4,user,php\n"
+            "not-an-email,pw-5,user,php\n"
+            "new3@bench.test,pw-6,admin,php\n"
+        )
+        response = self.client.post("/api/import/users/", body, content_type="text/csv")
+        self.assertEqual(response.status_code, 207)
+        report = response.json()
+        self.assertEqual((report["created"], report["failed"]), (2, 4))
+        self.assertEqual(
+            [(error["row"], sorted(error["errors"])) for error in report["errors"]],
+            [(3, ["role"]), (5, ["email"]), (2, ["email"]), (4, ["email"])],
+        )
+        encoded = AppUser.objects.get(email="new3@bench.test").password
+        self.assertTrue(hashing.verify_password("pw-6", encoded)[0])
+
+        body = "\n".join(
+            [
+                json.dumps(
+                    {
+                        "user_email": "new1@bench.test",
+                        "website": "https://app0.bench0.test/",
+                        "credential_email": "shared0@bench.test",
+                    }
+                ),
+                "{not json",
+                json.dumps(
+                    {
+                        "user_email": "nobody@bench.test",
+                        "website": "https://app0.bench0.test/",
+                        "credential_email": "shared0@bench.test",
+                    }
+                ),
+            ]
+        )
+        response = self.client.post(
+            "/api/import/assignments/?mode=ndjson", body, content_type="application/x-ndjson"
+        )
+        self.assertEqual(
+            response.json(),
+            {
+                "created": 1,
+                "failed": 2,
+                "errors": [
+                    {"row": 2, "errors": {"row": ["Invalid JSON object"]}},
+                    {"row": 3, "errors": {"user_email": ["User not found"]}},
+                ],
+            },
+        )
+        self.assertTrue(
+            Assignment.objects.filter(
+                user__email="new1@bench.test", credential__email="shared0@bench.test"
+            ).exists()
+        )
+
+    def test_user_passwords_are_hashed_on_the_shared_pool(self):
+        body = "email,password,role,team\nnew4@bench.test,pw-7,user,php\n"
+        with ThreadPoolExecutor(1) as pool, mock.patch(
+            "api.views.shared_pool", return_value=pool
+        ), mock.patch.object(pool, "map", wraps=pool.map) as pool_map:
+            response = self.client.post("/api/import/users/", body, content_type="text/csv")
+        self.assertEqual(response.json()["created"], 1)
+        self.assertEqual(pool_map.call_count, 1)
+
+    def test_email_taken_after_the_check_skips_only_that_row(self):
+        AppUser.objects.create(email="Late@bench.test", password="x", role="user", team="php")
+        body = (
+            "email,password,role,team\n"
+            "late@bench.test,pw-1,user,php\n"
+            "new5@bench.test,pw-2,user,php\n"
+        )
+        # As if the signup committed between the duplicate check and the insert
+        with mock.patch("api.imports._taken", return_value=set()):
+            response = self.client.post("/api/import/users/", body, content_type="text/csv")
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(
+            response.json(),
+            {
+                "created": 1,
+                "failed": 1,
+                "errors": [{"row": 1, "errors": {"email": ["Email already exists"]}}],
+            },
+        )
+        self.assertTrue(AppUser.objects.filter(email="new5@bench.test").exists())
+        encoded = AppUser.objects.get(email__iexact="late@bench.test").password
+        self.assertTrue(hashing.verify_password("x", encoded)[0])
+
+
+@override_settings(
+    PASSWORD_PBKDF2_ITERATIONS=1000,
+    REQUEST_LOG_SAMPLE_RATE=0,
+    AUDIT_LOG=AUDIT_INLINE,
+    CREDENTIAL_ENCRYPTION=TEST_ENCRYPTION,
+    DATABASE_REPLICAS=[REPLICA],
+)
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+    A second SQLite database stands in for a lagging replica: it has the
+    same rows except for one credential's email. Transaction-based: inside
+    a TestCase's transaction every read stays on the primary.
+    """
+
+    databases = {"default", REPLICA}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # The router never migrates replicas; give this one the tables it serves
+        with connections[REPLICA].schema_editor() as editor:
+            editor.create_model(AppUser)
+            editor.create_model(Credential)
+
+    @classmethod
+    def tearDownClass(cls):
+        with connections[REPLICA].schema_editor() as editor:
+            editor.delete_model(Credential)
+            editor.delete_model(AppUser)
+        super().tearDownClass()
+
+    def setUp(self):
+        super().setUp()
+        user_cache.local.clear()
+        user_cache.shared.clear()
+        self.super_admin, self.other = (
+            AppUser.objects.create(email=f"{name}@replica.test", password="x", role="super_admin")
+            for name in ("super", "other")
+        )
+        self.credential = Credential.objects.create(email="fresh@primary.test", password="p")
+        for model in (AppUser, Credential):
+            model.objects.using(REPLICA).bulk_create(model.objects.all())
+        Credential.objects.using(REPLICA).update(email="stale@replica.test")
+
+    def tearDown(self):
+        # flush skips models the router won't migrate here
+        for model in (Credential, AppUser):
+            model.objects.using(REPLICA).all()._raw_delete(REPLICA)
+        super().tearDown()
+
+    def email(self, **kwargs):
+        return Credential.objects.get(pk=self.credential.pk, **kwargs).email
+
+    def test_reads_inside_use_replica_go_to_the_replica(self):
+        self.assertEqual(self.email(), "fresh@primary.test")
+        with use_replica():
+            self.assertEqual(self.email(), "stale@replica.test")
+            with use_replica(False):
+                self.assertEqual(self.email(), "fresh@primary.test")
+            with transaction.atomic():
+                # Reads that may feed a write stay with it on the primary
+                self.assertEqual(self.email(), "fresh@primary.test")
+            Credential.objects.filter(pk=self.credential.pk).update(website="https://w.test")
+        self.assertEqual(Credential.objects.using(REPLICA).get().website, None)
+
+    def test_a_write_pins_the_user_not_the_token_to_the_primary(self):
+        def read(user):
+            # A new token each time: the pin must not depend on the header
+            token = AppUserRefreshToken.for_user(user).access_token
+            client = Client(HTTP_AUTHORIZATION=f"Bearer {token}")
+            return client, client.get(f"/api/credentials/{self.credential.pk}/").json()["email"]
+
+        client, email = read(self.super_admin)
+        self.assertEqual(email, "stale@replica.test")
+        response = client.patch(
+            f"/api/credentials/{self.credential.pk}/",
+            {"website": "https://w.test"},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(read(self.super_admin)[1], "fresh@primary.test")
+        self.assertEqual(read(self.other)[1], "stale@replica.test")
+
+
+def throttle_rates(**rates):
+    return {
+        **settings.REST_FRAMEWORK,
+        "DEFAULT_THROTTLE_RATES": {
+            **settings.REST_FRAMEWORK["DEFAULT_THROTTLE_RATES"], **rates
+        },
+    }
+
+
+@override_settings(REST_FRAMEWORK=throttle_rates(credentials_list="2/min", login_email="2/min"))
+class ThrottleTests(ApiTestCase):
+    seed = {"users": 4, "credentials": 4, "fanout": 2}
+
+    def setUp(self):
+        super().setUp()
+        # Buckets are keyed by user id, and ids repeat across test classes
+        caches["default"].clear()
+        self.addCleanup(caches["default"].clear)
+
+    def test_bucket_refills_at_the_rate(self):
+        cache = caches["default"]
+        self.assertEqual(throttling.take(cache, "bucket", 2, 60, now=0), 0)
+        self.assertEqual(throttling.take(cache, "bucket", 2, 60, now=0), 0)
+        self.assertEqual(throttling.take(cache, "bucket", 2, 60, now=0), 30)
+        self.assertAlmostEqual(throttling.take(cache, "bucket", 2, 60, now=10), 20)
+        self.assertEqual(throttling.take(cache, "bucket", 2, 60, now=30), 0)
+
+    def test_polled_list_answers_429_with_retry_after_per_user(self):
+        client = self.client_for("user")
+        for _ in range(2):
+            self.assertEqual(client.get("/api/credentials/").status_code, 200)
+        response = client.get("/api/credentials/")
+        self.assertEqual(response.status_code, 429)
+        self.assertIn(int(response["Retry-After"]), (29, 30))
+        # Other users have their own bucket; unthrottled actions stay open
+        self.assertEqual(self.client_for("admin").get("/api/credentials/").status_code, 200)
+        pk = self.actors["credential_id"]
+        self.assertEqual(client.get(f"/api/credentials/{pk}/").status_code, 200)
+
+    async def test_async_list_takes_from_the_same_bucket(self):
+        client = self.client_for("user")
+        headers = {"Authorization": client.defaults["HTTP_AUTHORIZATION"]}
+        self.assertEqual((await sync_to_async(client.get)("/api/credentials/")).status_code, 200)
+        aclient = AsyncClient()
+        response = await aclient.get("/api/async/credentials/", headers=headers)
+        self.assertEqual(response.status_code, 200)
+        response = await aclient.get("/api/async/credentials/", headers=headers)
+        self.assertEqual(response.status_code, 429)
+        self.assertIn(int(response["Retry-After"]), (29, 30))
+
+    def test_login_attempts_are_limited_per_account_across_ips(self):
+        data = {"email": self.actors["user"].email.upper(), "password": "wrong"}
+        for ip in ("10.0.0.1", "10.0.0.2"):
+            response = self.client.post("/api/login/", data, REMOTE_ADDR=ip)
+            self.assertNotEqual(response.status_code, 429)
+        response = self.client.post("/api/login/", data, REMOTE_ADDR="10.0.0.3")
+        self.assertEqual(response.status_code, 429)
+        self.assertIn("Retry-After", response)
+
+
+class EncryptionTests(ApiTestCase):
+    def master_keys(self, current, *key_ids):
+        """CREDENTIAL_ENCRYPTION with a keyfile holding ``key_ids``."""
+        keys = {k: base64.b64encode(k.encode().ljust(32, b"#")).decode() for k in key_ids}
+        with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as keyfile:
+            json.dump({"current": current, "keys": keys}, keyfile)
+        self.addCleanup(os.remove, keyfile.name)
+        return {**settings.CREDENTIAL_ENCRYPTION, "KEYFILE": keyfile.name}
+
+    def test_round_trip_uses_a_fresh_data_key_each_time(self):
+        first, second = encryption.encrypt("s3cret"), encryption.encrypt("s3cret")
+        self.assertNotEqual(first[:2], second[:2])
+        self.assertEqual(encryption.decrypt(*first), "s3cret")
+        self.assertEqual(encryption.decrypt_many([first, second]), ["s3cret", "s3cret"])
+
+    def test_decrypt_rows_unwraps_once_per_batch(self):
+        rows = [
+            dict(zip(("password_ciphertext", "data_key", "key_id"), encryption.encrypt(f"p{i}")))
+            for i in range(5)
+        ]
+        with mock.patch.object(
+            encryption, "unwrap_many", wraps=encryption.unwrap_many
+        ) as unwrap_many:
+            decrypted = list(
+                encryption.decrypt_rows(({**row, "id": i} for i, row in enumerate(rows)), 2)
+            )
+        self.assertEqual(unwrap_many.call_count, 3)
+        self.assertEqual(decrypted, [{"id": i, "password": f"p{i}"} for i in range(5)])
+
+    def test_missing_key_is_an_error(self):
+        options = {**settings.CREDENTIAL_ENCRYPTION, "KEYFILE": None, "MASTER_KEY": None}
+        with override_settings(CREDENTIAL_ENCRYPTION=options, DEBUG=True):
+            with self.assertRaises(ImproperlyConfigured):
+                encryption.encrypt("p")
+
+    def test_rotation_rewraps_then_reencrypts(self):
+        with override_settings(CREDENTIAL_ENCRYPTION=self.master_keys("k1", "k1")):
+            for i in range(3):
+                Credential.objects.create(email=f"c{i}@rotate.test", password=f"p{i}")
+        stored = {c.pk: (c.password_ciphertext, c.data_key) for c in Credential.objects.all()}
+
+        def passwords():
+            credentials = list(Credential.objects.order_by("id"))
+            Credential.decrypt_all(credentials)
+            return [c.password for c in credentials]
+
+        with override_settings(CREDENTIAL_ENCRYPTION=self.master_keys("k2", "k1", "k2")):
+            call_command("rotate_credential_keys", chunk_size=2, stdout=io.StringIO())
+            for credential in Credential.objects.all():
+                self.assertEqual(credential.key_id, "k2")
+                ciphertext, data_key = stored[credential.pk]
+                self.assertEqual(credential.password_ciphertext, ciphertext)
+                self.assertNotEqual(credential.data_key, data_key)
+        # k1 can go: every data key is now wrapped under k2
+        with override_settings(CREDENTIAL_ENCRYPTION=self.master_keys("k2", "k2")):
+            self.assertEqual(passwords(), ["p0", "p1", "p2"])
+            call_command("rotate_credential_keys", reencrypt=True, stdout=io.StringIO())
+            for credential in Credential.objects.all():
+                self.assertNotEqual(credential.password_ciphertext, stored[credential.pk][0])
+            self.assertEqual(passwords(), ["p0", "p1", "p2"])
+
+
+@override_settings(CREDENTIAL_ENCRYPTION=TEST_ENCRYPTION)
+class EncryptionMigrationTests(TransactionTestCase):
+    """0009 encrypts existing passwords and puts them back on reverse."""
+
+    before = [("api", "0008_appuser_indexes")]
+    after = [("api", "0009_encrypt_credential_passwords")]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        self.migrate(executor.loader.graph.leaf_nodes("api"))
+        super().tearDown()
+
+    def test_forward_and_reverse(self):
+        apps = self.migrate(self.before)
+        apps.get_model("api", "Credential").objects.bulk_create(
+            apps.get_model("api", "Credential")(email=f"m{i}@migrate.test", password=f"p{i}")
+            for i in range(3)
+        )
+        apps = self.migrate(self.after)
+        rows = apps.get_model("api", "Credential").objects.order_by("id").values_list(
+            "password_ciphertext", "data_key", "key_id"
+        )
+        self.assertNotIn("p0", rows[0][0])
+        self.assertEqual(encryption.decrypt_many(rows), ["p0", "p1", "p2"])
+
+        apps = self.migrate(self.before)
+        self.assertEqual(
+            list(
+                apps.get_model("api", "Credential").objects.order_by("id").values_list(
+                    "password", flat=True
+                )
+            ),
+            ["p0", "p1", "p2"],
+        )
+
+
+@override_settings(RESPONSE_CACHE={"ENABLED": False})
+class SearchTests(ApiTestCase):
+    # Best first: exact host, host prefix, host substring, email only
+    RANKED = ["shop.test", "shop.test.io", "myshop.test", "elsewhere.test"]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.credentials = {
+            domain: Credential.objects.create(
+                website=f"https://{domain}/login",
+                email="x@shop.test" if domain == "elsewhere.test" else f"x@{domain}",
+                password="p",
+            )
+            for domain in reversed(cls.RANKED)
+        }
+        Credential.objects.create(
+            website="https://unrelated.test", email="y@other.test", password="p"
+        )
+        cls.super_admin = AppUser.objects.create(
+            email="super@search.test", password="x", role="super_admin"
+        )
+        cls.user = AppUser.objects.create(email="user@search.test", password="x", role="user")
+        for domain in ("shop.test.io", "elsewhere.test"):
+            Assignment.objects.create(user=cls.user, credential=cls.credentials[domain])
+
+    def domains(self, queryset):
+        return [c.domain for c in queryset]
+
+    def results(self, actor, url):
+        token = AppUserRefreshToken.for_user(actor).access_token
+        response = Client(HTTP_AUTHORIZATION=f"Bearer {token}").get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_ranks_host_matches_above_email_matches(self):
+        for use_index in (True, False):
+            ranked = search_credentials(Credential.objects.all(), "SHOP.test", use_index)
+            self.assertEqual(self.domains(ranked), self.RANKED)
+
+    def test_candidates_are_capped(self):
+        with override_settings(SEARCH_CANDIDATES=2):
+            ranked = search_credentials(Credential.objects.all(), "shop.test")
+            self.assertEqual(len(ranked), 2)
+            # The unindexed path only sees a user's own rows and is not capped
+            self.assertEqual(
+                len(search_credentials(Credential.objects.all(), "shop.test", False)), 4
+            )
+
+    def test_users_only_find_their_credentials(self):
+        page = self.results(self.user, "/api/credentials/search/?q=shop")
+        self.assertEqual([row["domain"] for row in page["results"]], self.RANKED[1::2])
+
+    def test_pages_link_to_the_next_offset(self):
+        page = self.results(self.super_admin, "/api/credentials/search/?q=shop.test&limit=3")
+        self.assertEqual([row["domain"] for row in page["results"]], self.RANKED[:3])
+        self.assertIn("offset=3", page["next"])
+        page = self.results(self.super_admin, page["next"])
+        self.assertEqual([row["domain"] for row in page["results"]], self.RANKED[3:])
+        self.assertIsNone(page["next"])
+
+    @skipUnless(connection.vendor == "sqlite", "FTS5 sync triggers")
+    def test_index_follows_updates_and_deletes_also_after_repair(self):
+        def found(query):
+            return self.domains(search_credentials(Credential.objects.all(), query))
+
+        credential = self.credentials["myshop.test"]
+        credential.email = "renamed@mailbox.test"
+        credential.save()
+        self.assertEqual(found("mailbox"), ["myshop.test"])
+        self.assertEqual(found("x@myshop"), [])
+
+        # A migration that rebuilds api_credential drops the triggers
+        with connection.cursor() as cursor:
+            for name in search._SQLITE_TRIGGERS:
+                cursor.execute(f"DROP TRIGGER {name}")
+        search.repair(connection)
+        Credential.objects.filter(pk=credential.pk).update(email="again@inbox.test")
+        self.assertEqual(found("inbox"), ["myshop.test"])
+        credential.delete()
+        self.assertEqual(found("inbox"), [])
+
+
+@skipUnless(connection.vendor == "sqlite", "asserts on SQLite EXPLAIN QUERY PLAN output")
+class IndexUsageTests(ApiTestCase):
+    seed = {"users": 24, "credentials": 30, "fanout": 5}
+
+    def assertSearches(self, queryset, index):
+        plan = queryset.explain()
+        self.assertNotIn("SCAN", plan)
+        self.assertIn(f"INDEX {index}", plan)
+
+    def test_login_lookup_uses_lower_email_index(self):
+        self.assertSearches(
+            AppUser.objects.filter(email__lower="user1@bench.test"),
+            "appuser_email_lower_unique",
+        )
+        # The lookup belongs to AppUser.email, not to every EmailField
+        with self.assertRaises(FieldError):
+            Credential.objects.filter(email__lower="shared1@bench.test")
+
+    def test_team_and_role_filters_use_indexes(self):
+        self.assertSearches(
+            AppUser.objects.filter(team="php", role="user"), "appuser_team_role_idx"
+        )
+        self.assertSearches(AppUser.objects.filter(team="php"), "appuser_team_role_idx")
+        self.assertSearches(AppUser.objects.filter(role="admin"), "appuser_role_idx")
+        self.assertSearches(
+            Assignment.objects.filter(user__team="php"), "appuser_team_role_idx"
+        )
+
+    def test_search_uses_trigram_index(self):
+        plan = search_credentials(Credential.objects.all(), "app1").explain()
+        self.assertIn("api_credential_search VIRTUAL TABLE", plan)
+        self.assertNotIn("SCAN api_credential\n", plan + "\n")
+
+    def test_audit_queries_use_time_indexes(self):
+        for field, index in (
+            ("actor_id", "audit_actor_time_idx"),
+            ("credential_id", "audit_credential_time_idx"),
+        ):
+            queryset = AuditEvent.objects.filter(**{field: 1}).order_by("-created_at")
+            self.assertSearches(queryset, index)
+            self.assertNotIn("TEMP B-TREE", queryset.explain())
+
+    def test_credentials_for_user_uses_assignment_index(self):
+        # Served by the unique (user, credential) constraint's index
+        self.assertSearches(
+            Credential.objects.filter(assignments__user=self.actors["user"]),
+            "sqlite_autoindex_api_assignment",
+        )
+
+
+@override_settings(RESPONSE_CACHE={"ENABLED": False})
+class FastPathOutputTests(ApiTestCase):
+    """The values() fast path and orjson renderer emit DRF's exact bytes."""
+
+    seed = {"users": 12, "credentials": 20, "fanout": 4}
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # Non-ASCII, quotes, JS line separators, nulls
+        Credential.objects.create(
+            website=None, email="zoë@bench.test", password='p\u2028"q"\u2029 é 😀'
+        )
+        Credential.objects.create(
+            website="https://app3.bench3.test/x", email="u@bench.test", password="\\</script>"
+        )
+
+    def paths(self):
+        user, credential_id = self.actors["user"].pk, self.actors["credential_id"]
+        return {
+            "super_admin": [
+                "/api/credentials/",
+                "/api/credentials/?fields=id,password,website",
+                "/api/credentials/?fields=email",
+                "/api/credentials/?page_size=7",
+                "/api/credentials/match/?host=app3.bench3.test",
+                "/api/credentials/changes/",
+                "/api/users/",
+                "/api/users/?fields=id,email&page_size=5",
+                "/api/users/export_users/",
+                "/api/bootstrap/",
+            ],
+            "admin": [
+                "/api/credentials/",
+                "/api/users/",
+                "/api/bootstrap/",
+                f"/api/assignments/{user}/credentials_for_user/",
+                f"/api/assignments/{credential_id}/users_for_credential/",
+            ],
+            "user": ["/api/credentials/", "/api/users/", "/api/bootstrap/"],
+        }
+
+    def fetch(self, actor, path):
+        response = self.client_for(actor).get(path)
+        self.assertEqual(response.status_code, 200, path)
+        return response.content
+
+    def test_fast_path_matches_drf_serializer_and_renderer(self):
+        rates = {scope: "1000/s" for scope in settings.REST_FRAMEWORK["DEFAULT_THROTTLE_RATES"]}
+        fast = {**settings.REST_FRAMEWORK, "DEFAULT_THROTTLE_RATES": rates}
+        drf = {**fast, "DEFAULT_RENDERER_CLASSES": ("rest_framework.renderers.JSONRenderer",)}
+        for actor, paths in self.paths().items():
+            for path in paths:
+                with self.subTest(actor=actor, path=path):
+                    with override_settings(REST_FRAMEWORK=fast):
+                        content = self.fetch(actor, path)
+                    with override_settings(REST_FRAMEWORK=drf), mock.patch(
+                        "api.fastpath.plan_for", return_value=None
+                    ):
+                        expected = self.fetch(actor, path)
+                    self.assertEqual(content, expected)
+
+
+class AuditLogTests(ApiTestCase):
+    seed = {"users": 12, "credentials": 20, "fanout": 4}
+
+    def setUp(self):
+        super().setUp()
+        audit.writer.drain()
+
+    def test_reads_and_access_changes_are_buffered_then_queryable(self):
+        admin, user = self.actors["admin"], self.actors["user"]
+        credential_id = self.actors["credential_id"]
+        client = self.client_for("admin")
+        client.get("/api/me/")
+        # Recording adds no query to the request
+        with self.assertNumQueries(1):
+            self.assertEqual(client.get("/api/credentials/").status_code, 200)
+        client.post(
+            f"/api/assignments/{credential_id}/remove_user_access/", {"user_id": user.pk}
+        )
+        client.post(f"/api/assignments/{credential_id}/add_user_access/", {"user_id": user.pk})
+        self.assertFalse(AuditEvent.objects.exists())
+
+        audit.writer.flush()
+        self.assertEqual(
+            list(
+                AuditEvent.objects.order_by("id").values_list(
+                    "actor_id", "action", "credential_id", "target_user_id"
+                )
+            ),
+            [
+                (admin.pk, "credential.list", None, None),
+                (admin.pk, "access.revoke", credential_id, user.pk),
+                (admin.pk, "access.grant", credential_id, user.pk),
+            ],
+        )
+        response = self.client_for("super_admin").get(
+            f"/api/audit/?credential={credential_id}&action=access.grant"
+        )
+        self.assertEqual(
+            [event["target_user_id"] for event in response.json()["results"]], [user.pk]
+        )
+        self.assertEqual(self.client_for("admin").get("/api/audit/").status_code, 403)
+
+    def test_multi_credential_reads_record_each_credential(self):
+        user = self.actors["user"]
+        visible = list(
+            UserCredentialAccess.objects.filter(user=user)
+            .order_by("credential_id")
+            .values_list("credential_id", flat=True)
+        )
+        # Sparse fields leave the ids out of the response, not out of the trail
+        response = self.client_for("user").get("/api/credentials/changes/", {"fields": "email"})
+        self.assertNotIn("id", response.json()["upserts"][0])
+        response = self.client_for("super_admin").get("/api/credentials/export/")
+        b"".join(response.streaming_content)
+
+        audit.writer.flush()
+        events = AuditEvent.objects.order_by("id").values_list("action", "credential_id")
+        self.assertEqual(
+            [c for action, c in events if action == "credential.changes"], visible
+        )
+        self.assertEqual(
+            [c for action, c in events if action == "credential.export"],
+            list(Credential.objects.order_by("id").values_list("id", flat=True)),
+        )
+
+    def test_overload_samples_then_drops_reads_but_keeps_changes(self):
+        options = {**AUDIT_INLINE, "MAX_PENDING": 4, "BATCH_SIZE": 4, "BLOCK_TIMEOUT": 0}
+        admin = self.actors["admin"]
+        with override_settings(AUDIT_LOG=options), mock.patch(
+            "api.audit.random.random", return_value=0.05
+        ):
+            # Past SAMPLE_ABOVE (half full) reads are kept at READ_SAMPLE_RATE;
+            # the fifth finds the buffer full and is dropped
+            for _ in range(5):
+                audit.record(admin, "credential.retrieve", credential_id=1)
+            # A change is never dropped: it writes the backlog itself
+            audit.record(admin, "access.revoke", credential_id=1, target_user_id=2)
+        self.assertEqual(len(audit.writer), 0)
+        self.assertEqual(
+            list(AuditEvent.objects.order_by("id").values_list("action", "sample_rate")),
+            [("credential.retrieve", 1.0)] * 3
+            + [("credential.retrieve", 0.1), ("access.revoke", 1.0)],
+        )
+
+
+class UsageCounterTests(ApiTestCase):
+    seed = {"users": 12, "credentials": 40, "fanout": 6}
+
+    def setUp(self):
+        super().setUp()
+        usage.writer.drain()
+        user = self.actors["user"]
+        self.client = self.client_for("user")
+        self.credential_ids = list(
+            UserCredentialAccess.objects.filter(user=user)
+            .order_by("credential_id")
+            .values_list("credential_id", flat=True)
+        )
+
+    def ids(self, path):
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return [row["id"] for row in response.json()], response["ETag"]
+
+    def test_uses_are_flushed_in_fixed_queries_and_order_the_list(self):
+        first, second = self.credential_ids[-1], self.credential_ids[-2]
+        for credential_id in (second, first, first, first, second):
+            response = self.client.post(f"/api/credentials/{credential_id}/used/")
+            self.assertEqual(response.status_code, 202)
+        # Unknown and invisible credentials are not counted
+        hidden = Credential.objects.exclude(id__in=self.credential_ids).values_list("id", flat=True)
+        for credential_id in (10**9, hidden[0]):
+            response = self.client.post(f"/api/credentials/{credential_id}/used/")
+            self.assertEqual(response.status_code, 404)
+        self.assertEqual(len(usage.writer), 5)
+        _, etag = self.ids("/api/credentials/?ordering=most_used")
+
+        # Check the ids still exist, insert missing pairs, add the counts
+        with self.assertNumQueries(3):
+            usage.writer.flush()
+        self.assertEqual(
+            list(
+                CredentialUsage.objects.order_by("-use_count").values_list(
+                    "credential_id", "use_count"
+                )
+            ),
+            [(first, 3), (second, 2)],
+        )
+        ordered, new_etag = self.ids("/api/credentials/?ordering=most_used")
+        self.assertEqual(ordered[:2], [first, second])
+        self.assertEqual(sorted(ordered[2:]), sorted(set(self.credential_ids) - {first, second}))
+        self.assertNotEqual(new_etag, etag)
+        # A second flush adds to the stored counts
+        self.client.post(f"/api/credentials/{second}/used/")
+        self.client.post(f"/api/credentials/{second}/used/")
+        usage.writer.flush()
+        self.assertEqual(self.ids("/api/credentials/?ordering=most_used")[0][:2], [second, first])
+
+    def test_admins_uses_are_counted_and_survive_access_rebuilds(self):
+        admin = self.actors["admin"]
+        client = self.client_for("admin")
+        visible = list(
+            TeamCredentialAccess.objects.filter(team=admin.team)
+            .order_by("credential_id")
+            .values_list("credential_id", flat=True)
+        )
+        for credential_id in (visible[-1], visible[-1], visible[-2]):
+            client.post(f"/api/credentials/{credential_id}/used/")
+        usage.writer.flush()
+        access.rebuild()
+        response = client.get("/api/credentials/?ordering=most_used")
+        self.assertEqual([row["id"] for row in response.json()][:2], [visible[-1], visible[-2]])
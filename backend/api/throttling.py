@@ -0,0 +1,152 @@
+"""
+Token-bucket throttles.
+
+Rates use DRF's ``"<n>/<period>"`` syntax from
+``REST_FRAMEWORK["DEFAULT_THROTTLE_RATES"]`` but mean a bucket of ``n``
+tokens refilled at ``n`` per period: a client can burst up to ``n``
+requests, then gets one more every ``period / n`` seconds. Buckets live in
+the default cache, so with a shared backend (REDIS_URL) all workers see
+the same counts. The read-modify-write is not atomic; a race lets a few
+extra requests through, never blocks a legitimate one.
+"""
+import hashlib
+from time import time
+from types import SimpleNamespace
+
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.settings import api_settings
+from rest_framework.throttling import SimpleRateThrottle
+
+
+def _refill(bucket, capacity, duration, now):
+    tokens, stamp = bucket or (capacity, now)
+    return min(capacity, tokens + (now - stamp) * capacity / duration)
+
+
+def take(cache, key, capacity, duration, now=None):
+    """
+    Take one token from the bucket at ``key``. Returns 0 when allowed,
+    otherwise the seconds until a token is available.
+    """
+    now = time() if now is None else now
+    tokens = _refill(cache.get(key), capacity, duration, now)
+    if tokens < 1:
+        return (1 - tokens) * duration / capacity
+    cache.set(key, (tokens - 1, now), duration)
+    return 0
+
+
+async def atake(cache, key, capacity, duration, now=None):
+    """Async twin of take(), on the cache's async API."""
+    now = time() if now is None else now
+    tokens = _refill(await cache.aget(key), capacity, duration, now)
+    if tokens < 1:
+        return (1 - tokens) * duration / capacity
+    await cache.aset(key, (tokens - 1, now), duration)
+    return 0
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    cache_format = "throttle:%(scope)s:%(ident)s"
+
+    def get_rate(self):
+        # Read the rates per request (not once at import) so overrides apply
+        try:
+            return api_settings.DEFAULT_THROTTLE_RATES[self.scope]
+        except KeyError:
+            raise ImproperlyConfigured(f"No default throttle rate set for '{self.scope}' scope")
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+        self._wait = take(self.cache, self.key, self.num_requests, self.duration)
+        return not self._wait
+
+    async def aallow_request(self, request, view):
+        """allow_request() for the async views."""
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+        self._wait = await atake(self.cache, self.key, self.num_requests, self.duration)
+        return not self._wait
+
+    def wait(self):
+        return self._wait
+
+
+class LoginIPThrottle(TokenBucketThrottle):
+    """Login attempts per client IP."""
+
+    scope = "login_ip"
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {"scope": self.scope, "ident": self.get_ident(request)}
+
+
+class LoginEmailThrottle(TokenBucketThrottle):
+    """Login attempts per target account, whichever IPs they come from."""
+
+    scope = "login_email"
+
+    def get_cache_key(self, request, view):
+        email = request.data.get("email")
+        if not isinstance(email, str) or not email:
+            return None
+        ident = hashlib.sha256(email.strip().lower().encode()).hexdigest()
+        return self.cache_format % {"scope": self.scope, "ident": ident}
+
+
+def client_ident(request, throttle):
+    user = getattr(request, "user", None)
+    if user is not None and getattr(user, "is_authenticated", False):
+        return f"user:{user.pk}"
+    return f"ip:{throttle.get_ident(request)}"
+
+
+class ScopedTokenBucketThrottle(TokenBucketThrottle):
+    """
+    Per-client bucket for the view's ``throttle_scope``: a scope name, or a
+    mapping of viewset action -> scope so only the polled actions are
+    limited. Clients are identified by user id, else IP.
+    """
+
+    def __init__(self):
+        # The scope depends on the view, so the rate is resolved per request
+        pass
+
+    def use_scope(self, view):
+        """Take the view's scope and its rate; False when the view has none."""
+        scope = getattr(view, "throttle_scope", None)
+        if isinstance(scope, dict):
+            scope = scope.get(getattr(view, "action", None))
+        if not scope:
+            return False
+        self.scope = scope
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        return True
+
+    def allow_request(self, request, view):
+        return not self.use_scope(view) or super().allow_request(request, view)
+
+    async def aallow_request(self, request, view):
+        return not self.use_scope(view) or await super().aallow_request(request, view)
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {"scope": self.scope, "ident": client_ident(request, self)}
+
+
+async def athrottle_wait(request, scope):
+    """
+    ScopedTokenBucketThrottle for the async views outside DRF (set
+    ``request.user`` first). Returns 0 when allowed, else the seconds to wait.
+    """
+    throttle = ScopedTokenBucketThrottle()
+    if await throttle.aallow_request(request, SimpleNamespace(throttle_scope=scope)):
+        return 0
+    return throttle.wait()
@@ -0,0 +1,24 @@
+from rest_framework_simplejwt.tokens import RefreshToken
+
+
+class AppUserRefreshToken(RefreshToken):
+    """
+    Refresh token carrying the AppUser's role, team and token version.
+    The claims are copied into every access token minted from it.
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token["role"] = user.role
+        token["team"] = user.team
+        token["ver"] = user.token_version
+        return token
+
+    def access_token_for(self, user):
+        """An access token with the claims taken fresh from ``user``, not this token."""
+        access = self.access_token
+        access["role"] = user.role
+        access["team"] = user.team
+        access["ver"] = user.token_version
+        return access
@@ -10,7 +10,12 @@ from .views import (
     TokenRefreshView,
     CredentialViewSet,
     AssignmentViewSet,
+    AuditEventView,
+    MetricsView,
+    ImportView,
+    BootstrapView,
 )
+from . import async_views
 
 router = DefaultRouter()
 router.register("credentials", CredentialViewSet, basename="credentials")
@@ -27,6 +32,24 @@ urlpatterns = [
         name="forget-password",
     ),
     path("me/", MeView.as_view(), name="me"),
+    path("bootstrap/", BootstrapView.as_view(), name="bootstrap"),
+    path("import/<str:kind>/", ImportView.as_view(), name="import"),
+    path("audit/", AuditEventView.as_view(), name="audit"),
+    path("metrics/", MetricsView.as_view(), name="metrics"),
     path("token/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
+    # 👇 native async variants for ASGI deployments
+    path("async/me/", async_views.me, name="async-me"),
+    path("async/credentials/", async_views.credential_list, name="async-credentials"),
+    path(
+        "async/credentials/match/",
+        async_views.credential_match,
+        name="async-credentials-match",
+    ),
+    path("async/events/", async_views.events_stream, name="async-events"),
+    path(
+        "async/token/refresh/",
+        async_views.token_refresh,
+        name="async-token-refresh",
+    ),
     path("", include(router.urls)),
 ]
@@ -0,0 +1,135 @@
+"""
+Per-user credential usage, for the popup's "most used" ordering.
+
+Each autofill (``POST /api/credentials/<id>/used/``) is only appended to an
+in-memory buffer (api.buffering). Every ``FLUSH_INTERVAL`` seconds the
+buffered uses are summed per (user, credential) and written to
+``CredentialUsage``, for every role: missing pairs are inserted at zero,
+then one UPDATE per batch adds ``use_count + n`` and keeps the latest
+``last_used_at``, so flushes from several workers add up instead of
+overwriting each other. Only uses of credentials visible to the caller
+are accepted; pairs whose user or credential is deleted before the flush
+are skipped.
+
+Counts are best effort: under overload uses are dropped, not waited for.
+"""
+from collections import Counter
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db.models import (
+    Case,
+    CharField,
+    DateTimeField,
+    F,
+    FilteredRelation,
+    Q,
+    Value,
+    When,
+)
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from . import generations
+from .buffering import DEFAULTS, BufferedWriter
+from .models import AppUser, Credential, CredentialUsage
+
+
+def _options():
+    return {
+        **DEFAULTS,
+        "ENABLED": True,
+        "FLUSH_INTERVAL": 5.0,
+        **getattr(settings, "USAGE_COUNTERS", {}),
+    }
+
+
+def _existing(counts):
+    """
+    The pairs in ``counts`` whose user and credential both still exist (one
+    query). Both did when the use was posted; this catches deletions since.
+    """
+    kind = Value("credential", output_field=CharField())
+    found = set(
+        Credential.objects.filter(id__in={c for _, c in counts})
+        .annotate(kind=kind)
+        .values_list("kind", "id")
+        .union(
+            AppUser.objects.filter(id__in={u for u, _ in counts})
+            .annotate(kind=Value("user", output_field=CharField()))
+            .values_list("kind", "id")
+        )
+    )
+    return [(u, c) for u, c in counts if ("user", u) in found and ("credential", c) in found]
+
+
+def _write(uses):
+    counts = Counter()
+    last_used = {}
+    for user_id, credential_id, used_at in uses:
+        pair = (user_id, credential_id)
+        counts[pair] += 1
+        last_used[pair] = max(used_at, last_used.get(pair, used_at))
+    pairs = _existing(counts)
+    if not pairs:
+        return
+    # update_conflicts=True would set use_count to this batch's count rather
+    # than add to it; insert new pairs at zero and let the UPDATE add for all
+    CredentialUsage.objects.bulk_create(
+        [CredentialUsage(user_id=u, credential_id=c) for u, c in pairs],
+        ignore_conflicts=True,
+    )
+    CredentialUsage.objects.filter(
+        reduce(or_, (Q(user_id=u, credential_id=c) for u, c in pairs))
+    ).update(
+        use_count=F("use_count")
+        + Case(
+            *(When(user_id=u, credential_id=c, then=Value(counts[u, c])) for u, c in pairs),
+            default=Value(0),
+        ),
+        last_used_at=Case(
+            *(
+                When(
+                    user_id=u,
+                    credential_id=c,
+                    then=Greatest(
+                        Coalesce("last_used_at", Value(last_used[u, c])), Value(last_used[u, c])
+                    ),
+                )
+                for u, c in pairs
+            ),
+            default=F("last_used_at"),
+            output_field=DateTimeField(),
+        ),
+    )
+    # The users' most-used lists are now stale
+    generations.bump(*{generation_name(u) for u, _ in pairs})
+
+
+writer = BufferedWriter("usage", _write, _options)
+
+
+def record_use(user_id, credential_id):
+    if _options()["ENABLED"]:
+        writer.add((user_id, credential_id, timezone.now()), droppable=True)
+
+
+def generation_name(user_id):
+    return f"usage@user:{user_id}"
+
+
+def most_used_first(queryset, user, *then):
+    """
+    ``queryset`` (from ``visible_credentials(user)``) ordered by the user's
+    use count, then most recent use, then ``then`` and id. The user's own
+    usage rows are LEFT JOINed through the (user, credential) index.
+    """
+    return queryset.alias(
+        own_usage=FilteredRelation("usage_counts", condition=Q(usage_counts__user=user))
+    ).order_by(
+        F("own_usage__use_count").desc(nulls_last=True),
+        F("own_usage__last_used_at").desc(nulls_last=True),
+        *then,
+        "id",
+    )
@@ -1,15 +1,45 @@
+import codecs
 from rest_framework import viewsets, generics, status, serializers
+from rest_framework.views import APIView
+from django.http import HttpResponse
+from django.db.models import F
+from django.db.models.functions import Length
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
-from django.contrib.auth.hashers import check_password, make_password
+from django.contrib.auth.hashers import make_password
 from rest_framework.decorators import action
-from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.serializers import TokenRefreshSerializer
 from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 from rest_framework.permissions import IsAuthenticated
-from .models import AppUser, Credential, Assignment
-from .serializers import AppUserSerializer, CredentialSerializer, AssignmentSerializer
-from .permissions import IsSuperAdmin, IsAdmin, IsUser
+from .models import AppUser, AuditEvent, Credential, Assignment
+from .serializers import (
+    AppUserSerializer,
+    CredentialSerializer,
+    AssignmentSerializer,
+    AuditEventSerializer,
+    BulkAssignmentSerializer,
+    side_loaded_assignments,
+)
+from .permissions import IsSuperAdmin, IsAdmin, IsUser, CanReadMetrics
+from .domains import host_suffixes
+from .access import visible_credentials
+from . import assignments, audit, changes, response_cache, usage
+from .conditional import ConditionalListMixin, etag_matches, scoped_etag
+from .pagination import AuditPagination, KeysetPagination, RankedPagination
+from .search import MIN_QUERY_LENGTH, search_credentials
+from .hashing import HashingBusy, dummy_hash, hash_password, shared_pool, verify_password
+from .tokens import AppUserRefreshToken
+from .authentication import check_token_version, user_cache
+from .activity import touch_last_seen
+from .metrics import render_prometheus
+from .encryption import decrypt_rows
+from .exports import EXPORT_MODES, stream_export
+from .fastpath import FastListMixin, plan_for, serialize
+from .imports import IMPORT_FORMATS, IMPORTERS, run_import
+from .throttling import LoginEmailThrottle, LoginIPThrottle, ScopedTokenBucketThrottle
 
 
 # ---------------- USER VIEWS ----------------
@@ -18,27 +48,51 @@ from .permissions import IsSuperAdmin, IsAdmin, IsUser
 class LoginView(generics.GenericAPIView):
     serializer_class = AppUserSerializer
     permission_classes = [AllowAny]
+    # Checked before the user lookup and the password hash
+    throttle_classes = [LoginIPThrottle, LoginEmailThrottle]
 
     def post(self, request):
         email = request.data.get("email")
         password = request.data.get("password")
         try:
-            user = AppUser.objects.get(email__iexact=email)
-            if check_password(password, user.password):
-                refresh = RefreshToken.for_user(user)
-                return Response(
-                    {
-                        "message": "Login successful",
-                        "role": user.role,
-                        "id": user.id,
-                        "refresh": str(refresh),
-                        "access": str(refresh.access_token),
-                    },
-                    status=200,
-                )
-            return Response({"error": "Invalid password"}, status=400)
+            user = AppUser.objects.get(email__lower=str(email).lower())
         except AppUser.DoesNotExist:
-            return Response({"error": "User not found"}, status=404)
+            user = None
+        try:
+            # Unknown emails still pay for one hash: no timing or message
+            # difference tells an attacker which accounts exist
+            valid, needs_rehash = verify_password(
+                password, user.password if user else dummy_hash()
+            )
+        except HashingBusy:
+            return Response(
+                {"error": "Too many logins in progress, please retry"},
+                status=503,
+                headers={"Retry-After": "1"},
+            )
+        if user is None or not valid:
+            return Response({"error": "Invalid email or password"}, status=400)
+        if needs_rehash:
+            # Same password, new hash: update_fields keeps tokens valid.
+            # When the limiter is full the next login re-hashes instead.
+            try:
+                user.password = hash_password(password)
+            except HashingBusy:
+                pass
+            else:
+                user.save(update_fields=["password"])
+        touch_last_seen(user.id)
+        refresh = AppUserRefreshToken.for_user(user)
+        return Response(
+            {
+                "message": "Login successful",
+                "role": user.role,
+                "id": user.id,
+                "refresh": str(refresh),
+                "access": str(refresh.access_token),
+            },
+            status=200,
+        )
 
 
 class SignupView(generics.CreateAPIView):
@@ -59,14 +113,18 @@ class ForgetPasswordView(generics.UpdateAPIView):
             user = AppUser.objects.get(pk=user_id)
             user.password = make_password(password)
             user.save()
+            audit.record(request.user, "user.password_reset", target_user_id=user.pk)
             return Response({"message": "Password updated successfully"})
         except AppUser.DoesNotExist:
             return Response({"error": "User not found"}, status=404)
 
 
-class AppUserView(viewsets.ModelViewSet):
+class AppUserView(ConditionalListMixin, FastListMixin, viewsets.ModelViewSet):
     serializer_class = AppUserSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+    etag_scopes = ("appuser",)
+    cache_list_responses = True
     http_method_names = ['get', 'post', 'put', 'patch', 'delete']
 
     def get_queryset(self):
@@ -111,8 +169,12 @@ class AppUserView(viewsets.ModelViewSet):
         if request.user.role != "super_admin":
             return Response({"error": "Not authorized"}, status=403)
         users = self.get_queryset().exclude(role="super_admin")
-        serializer = AppUserSerializer(users, many=True)
-        return Response(serializer.data)
+        mode = request.query_params.get("mode")
+        if mode in EXPORT_MODES:
+            return stream_export(
+                users.order_by("id"), ["id", "email", "role", "team"], mode, "users"
+            )
+        return Response(serialize(AppUserSerializer, users))
 
     def update(self, request, *args, **kwargs):
         super().update(request, *args, **kwargs)
@@ -123,6 +185,7 @@ class AppUserDetailView(generics.RetrieveAPIView):
     queryset = AppUser.objects.all()
     serializer_class = AppUserSerializer
     permission_classes = [IsAuthenticated]
+    replica_reads = True
 
     def get_queryset(self):
         user = self.request.user
@@ -137,50 +200,69 @@ class AppUserDetailView(generics.RetrieveAPIView):
 class MeView(generics.RetrieveAPIView):
     serializer_class = AppUserSerializer
     permission_classes = [IsAuthenticated]
+    throttle_classes = [ScopedTokenBucketThrottle]
+    throttle_scope = "me"
+    replica_reads = True
 
     def get_object(self):
         return self.request.user
 
 
 class AppUserTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = AppUserRefreshToken
+
     def validate(self, attrs):
-        from .models import AppUser
         refresh = self.token_class(attrs["refresh"])
-        data = {"access": str(refresh.access_token)}
-        if api_settings.UPDATE_LAST_LOGIN:
-            from django.utils import timezone
-            user_id = refresh.payload.get('user_id')
-            try:
-                user = AppUser.objects.get(id=user_id)
-                user.last_login = timezone.now()
-                user.save()
-            except AppUser.DoesNotExist:
-                raise serializers.ValidationError("User not found")
-        return data
+        try:
+            user = user_cache.get(int(refresh[api_settings.USER_ID_CLAIM]))
+        except (KeyError, TypeError, ValueError, AppUser.DoesNotExist):
+            raise serializers.ValidationError("User not found")
+        check_token_version(refresh, user)
+        # Fresh claims from the (cached) user; no row is written
+        touch_last_seen(user.id)
+        return {"access": str(refresh.access_token_for(user))}
 
 
 class TokenRefreshView(generics.GenericAPIView):
     serializer_class = AppUserTokenRefreshSerializer
     permission_classes = [AllowAny]
+    throttle_classes = [ScopedTokenBucketThrottle]
+    throttle_scope = "token_refresh"
 
     def post(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
-        serializer.is_valid(raise_exception=True)
+        try:
+            serializer.is_valid(raise_exception=True)
+        except TokenError as e:
+            raise InvalidToken(e.args[0])
         return Response(serializer.validated_data, status=status.HTTP_200_OK)
 
 
 # ---------------- CREDENTIAL VIEWS ----------------
 
 
-class CredentialViewSet(viewsets.ModelViewSet):
+class CredentialViewSet(ConditionalListMixin, FastListMixin, viewsets.ModelViewSet):
     queryset = Credential.objects.all()
     serializer_class = CredentialSerializer
     permission_classes = [IsAuthenticated]
-
-    def list(self, request, *args, **kwargs):
-        print("Authorization header:", request.headers.get("Authorization"))
-        print("Request user:", request.user, type(request.user))
-        return super().list(request, *args, **kwargs)
+    pagination_class = KeysetPagination
+    etag_scopes = ("credential", "assignment", "appuser")
+    cache_list_responses = True
+    # Decrypted passwords: process-local response cache only
+    private_responses = True
+    replica_reads = ("list", "retrieve", "match", "search")
+    # The extension polls these; other actions are not throttled
+    throttle_classes = [ScopedTokenBucketThrottle]
+    throttle_scope = {
+        "list": "credentials_list",
+        "match": "credentials_match",
+        "search": "credentials_search",
+        "changes": "credentials_changes",
+        "used": "credentials_used",
+    }
+    # Successful reads go to the audit trail (a 304 reveals nothing new).
+    # match, search, changes and export record each credential they return.
+    audited_reads = ("list", "retrieve")
 
     def get_queryset(self):
         user = self.request.user
@@ -190,70 +272,290 @@ class CredentialViewSet(viewsets.ModelViewSet):
             return Credential.objects.none()
 
         # Only handle AppUser (avoid errors if it's a Django default User)
-        from .models import AppUser
-
         if isinstance(user, AppUser):
-            if user.role == "super_admin":
-                return Credential.objects.all()
-            elif user.role == "admin":
-                return Credential.objects.filter(
-                    assignments__user__team=user.team
-                ).distinct()
-            else:  # normal user
-                return Credential.objects.filter(assignments__user=user)
+            return visible_credentials(user)
 
         # Fallback: if it's a default Django User, return nothing or restrict
         return Credential.objects.none()
 
+    def audit_reads(self, rows):
+        """One read event per credential in ``rows`` (instances or values() dicts)."""
+        audit.record_reads(
+            self.request.user,
+            f"credential.{self.action}",
+            (row["id"] if isinstance(row, dict) else row.pk for row in rows),
+        )
+
+    def serialize_read(self, queryset):
+        """``serialize_list(queryset)`` that audits each credential it returns."""
+        plan = plan_for(self.get_serializer())
+        rows = list(queryset if plan is None else plan.values(queryset))
+        self.audit_reads(rows)
+        if plan is None:
+            return self.get_serializer(rows, many=True).data
+        return plan.rows(rows)
+
+    def orders_by_use(self):
+        return (
+            isinstance(self.request.user, AppUser)
+            and self.request.query_params.get("ordering") == "most_used"
+        )
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.action == "list" and self.orders_by_use():
+            queryset = usage.most_used_first(queryset, self.request.user)
+        return queryset
+
+    def get_list_etag(self, request):
+        if not self.orders_by_use():
+            return super().get_list_etag(request)
+        # The order is the caller's own (not their audience's) and moves with
+        # every usage flush
+        return scoped_etag(
+            f"credentials:list:most_used:{request.user.pk}",
+            request.user,
+            self.etag_scopes,
+            request.query_params,
+            extra_generations=[usage.generation_name(request.user.pk)],
+        )
+
+    def list(self, request, *args, **kwargs):
+        if self.orders_by_use() and self.paginator.get_page_size(request):
+            return Response(
+                {"error": "ordering=most_used cannot be combined with page_size"}, status=400
+            )
+        return super().list(request, *args, **kwargs)
+
+    @action(detail=False, methods=["get"])
+    def match(self, request):
+        # Autofill lookup: only credentials stored under the host or a parent domain
+        suffixes = host_suffixes(request.query_params.get("host"))
+        if not suffixes:
+            return Response({"error": "host is required"}, status=400)
+        credentials = self.get_queryset().filter(domain__in=suffixes)
+        if self.orders_by_use():
+            credentials = usage.most_used_first(
+                credentials, request.user, Length("domain").desc()
+            )
+        else:
+            # Most specific domain first (login.example.com before example.com)
+            credentials = credentials.order_by(Length("domain").desc(), "id")
+        return Response(self.serialize_read(credentials))
+
+    @action(detail=True, methods=["post"])
+    def used(self, request, pk=None):
+        """
+        The caller autofilled credential ``pk``. Counted in memory and
+        written in batches (api.usage); the only query checks that the
+        caller can see the credential.
+        """
+        if not isinstance(request.user, AppUser):
+            return Response({"error": "Not authorized"}, status=403)
+        try:
+            credential_id = int(pk)
+        except ValueError:
+            return Response({"error": "Credential not found"}, status=404)
+        if not visible_credentials(request.user).filter(pk=credential_id).exists():
+            return Response({"error": "Credential not found"}, status=404)
+        usage.record_use(request.user.pk, credential_id)
+        return Response(status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=False, methods=["get"])
+    def search(self, request):
+        query = request.query_params.get("q", "").strip()
+        if len(query) < MIN_QUERY_LENGTH:
+            return Response(
+                {"error": f"q must be at least {MIN_QUERY_LENGTH} characters"}, status=400
+            )
+        # Ranked, best match first; see api.search for the per-backend index
+        credentials = search_credentials(
+            self.get_queryset(), query, use_index=request.user.role != "user"
+        )
+        plan = plan_for(self.get_serializer())
+        if plan is not None:
+            credentials = plan.values(credentials)
+        paginator = RankedPagination()
+        page = paginator.paginate_queryset(credentials, request, self)
+        self.audit_reads(page)
+        data = plan.rows(page) if plan is not None else self.get_serializer(page, many=True).data
+        return paginator.get_paginated_response(data)
+
+    @action(detail=False, methods=["get"])
+    def changes(self, request):
+        if not isinstance(request.user, AppUser):
+            return Response({"error": "Not authorized"}, status=403)
+        since = request.query_params.get("since")
+        if since in (None, ""):
+            # No token yet: full snapshot plus the token to continue from.
+            # Taken first, so changes made while the snapshot is read are re-sent.
+            token = changes.safe_token()
+            return Response(
+                {
+                    "full": True,
+                    "upserts": self.serialize_read(self.get_queryset().order_by("id")),
+                    "removals": [],
+                    "token": str(token),
+                    "has_more": False,
+                }
+            )
+        try:
+            since = int(since)
+        except ValueError:
+            return Response({"error": "Invalid sync token"}, status=400)
+        upserts, removals, token, has_more = changes.changes_since(request.user, since)
+        self.audit_reads(upserts)
+        serializer = self.get_serializer(upserts, many=True)
+        return Response(
+            {
+                "full": False,
+                "upserts": serializer.data,
+                "removals": removals,
+                "token": str(token),
+                "has_more": has_more,
+            }
+        )
+
+    @action(detail=False, methods=["get"])
+    def export(self, request):
+        if request.user.role != "super_admin":
+            return Response({"error": "Not authorized"}, status=403)
+        mode = request.query_params.get("mode", "ndjson")
+        if mode not in EXPORT_MODES:
+            return Response({"error": "mode must be ndjson or csv"}, status=400)
+        # One row per assignment (credentials without any get one row, user fields null)
+        rows = (
+            Credential.objects.annotate(
+                user_id=F("assignments__user_id"), user_email=F("assignments__user__email")
+            )
+            .order_by("id", "user_id")
+            .values("id", "website", "email", *Credential.ENCRYPTED_FIELDS, "user_id", "user_email")
+        )
+        fields = ["id", "website", "email", "password", "user_id", "user_email"]
+
+        def audited(rows):
+            # Rows come grouped by credential; one event each as it goes out
+            last = None
+            for row in decrypt_rows(rows):
+                if row["id"] != last:
+                    last = row["id"]
+                    audit.record_reads(request.user, "credential.export", [last])
+                yield row
+
+        return stream_export(rows, fields, mode, "credentials", transform=audited)
+
     def perform_create(self, serializer):
         if self.request.user.role != "super_admin":
             from rest_framework.exceptions import PermissionDenied
             raise PermissionDenied("Only super admin can create credentials")
-        serializer.save()
+        credential = serializer.save()
+        audit.record(self.request.user, "credential.create", credential_id=credential.pk)
 
     def perform_update(self, serializer):
         if self.request.user.role != "super_admin":
             from rest_framework.exceptions import PermissionDenied
             raise PermissionDenied("Only super admin can update credentials")
-        serializer.save()
+        credential = serializer.save()
+        audit.record(self.request.user, "credential.update", credential_id=credential.pk)
 
     def perform_destroy(self, instance):
         if self.request.user.role != "super_admin":
             from rest_framework.exceptions import PermissionDenied
             raise PermissionDenied("Only super admin can delete credentials")
+        credential_id = instance.pk
         instance.delete()
+        audit.record(self.request.user, "credential.delete", credential_id=credential_id)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if response.status_code == 200 and self.action in self.audited_reads:
+            pk = self.kwargs.get(self.lookup_field)
+            audit.record(
+                request.user,
+                f"credential.{self.action}",
+                credential_id=int(pk) if pk is not None else None,
+            )
+        return response
 
 
 # ---------------- ASSIGNMENT VIEWS ----------------
 
 
-class AssignmentViewSet(viewsets.ModelViewSet):
+class SideLoadedListMixin:
+    """
+    ``?flat=1`` lists assignments as ids plus de-duplicated ``users`` and
+    ``credentials`` maps instead of nesting both in every row.
+    """
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params.get("flat") not in ("1", "true"):
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        context = self.get_serializer_context()
+        if page is not None:
+            return self.get_paginated_response(side_loaded_assignments(page, context))
+        return Response(side_loaded_assignments(queryset, context))
+
+
+class AssignmentViewSet(ConditionalListMixin, SideLoadedListMixin, viewsets.ModelViewSet):
     queryset = Assignment.objects.all()
     serializer_class = AssignmentSerializer
     permission_classes = [IsAuthenticated]  # add this!
+    pagination_class = KeysetPagination
+    etag_scopes = ("assignment", "appuser", "credential")
+    cache_list_responses = True
+    # The side-loaded credentials carry decrypted passwords too
+    private_responses = True
+    replica_reads = ("list", "credentials_for_user", "users_for_credential")
 
     def get_queryset(self):
         user = self.request.user
+        # One JOINed query however many assignments are listed
+        assignments = Assignment.objects.select_related("user", "credential").defer(
+            "user__password", "user__token_version"
+        )
         if user.role == "super_admin":
-            return Assignment.objects.all()
+            return assignments
         elif user.role == "admin":
-            return Assignment.objects.filter(user__team=user.team).distinct()
+            return assignments.filter(user__team=user.team)
         else:  # user
-            return Assignment.objects.filter(user=user)
+            return assignments.filter(user=user)
 
     @action(detail=True, methods=["get"])
     def credentials_for_user(self, request, pk=None):
-        user = AppUser.objects.get(pk=pk)
-        credentials = Credential.objects.filter(assignments__user=user)
-        serializer = CredentialSerializer(credentials, many=True)
-        return Response(serializer.data)
+        credentials = Credential.objects.filter(assignments__user_id=pk)
+        return Response(serialize(CredentialSerializer, credentials))
 
     @action(detail=True, methods=["get"])
     def users_for_credential(self, request, pk=None):
-        credential = Credential.objects.get(pk=pk)
-        users = AppUser.objects.filter(assignments__credential=credential)
-        serializer = AppUserSerializer(users, many=True)
-        return Response(serializer.data)
+        users = AppUser.objects.filter(assignments__credential_id=pk)
+        return Response(serialize(AppUserSerializer, users))
+
+    @action(detail=False, methods=["post"])
+    def bulk(self, request):
+        if request.user.role not in ("super_admin", "admin"):
+            return Response({"error": "Not authorized"}, status=403)
+        serializer = BulkAssignmentSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        users, credential_ids, results = assignments.resolve_targets(
+            request.user, data["user_ids"], data["teams"], data["credential_ids"]
+        )
+        if data["action"] == "grant":
+            results += assignments.bulk_grant(users, credential_ids)
+        else:
+            results += assignments.bulk_revoke(users, credential_ids)
+        audit.record_access(
+            request.user,
+            f"access.{data['action']}",
+            [
+                (result["user_id"], result["credential_id"])
+                for result in results
+                if result["status"] in ("granted", "revoked")
+            ],
+        )
+        return Response({"results": results})
 
     @action(detail=True, methods=["post"])
     def add_user_access(self, request, pk=None):
@@ -263,6 +565,7 @@ class AssignmentViewSet(viewsets.ModelViewSet):
             user = AppUser.objects.get(pk=user_id)
             assignment, created = Assignment.objects.get_or_create(user=user, credential=credential)
             if created:
+                audit.record_access(request.user, "access.grant", [(user.pk, credential.pk)])
                 return Response({"message": "User access added"}, status=201)
             else:
                 return Response({"message": "User already has access"}, status=200)
@@ -278,8 +581,165 @@ class AssignmentViewSet(viewsets.ModelViewSet):
             assignment = Assignment.objects.filter(user=user, credential=credential).first()
             if assignment:
                 assignment.delete()
+                audit.record_access(request.user, "access.revoke", [(user.pk, credential.pk)])
                 return Response({"message": "User access removed"}, status=200)
             else:
                 return Response({"error": "User access not found"}, status=404)
         except AppUser.DoesNotExist:
             return Response({"error": "User not found"}, status=404)
+
+
+# ---------------- BOOTSTRAP ----------------
+
+
+class BootstrapView(APIView):
+    """
+    Everything the popup needs on open, in one round trip: the caller's
+    profile and visible credentials, plus for admins and super_admins the
+    user roster and ``{credential_id: [user_id, ...]}`` assignment map.
+    One query per section, whatever the data size.
+    """
+
+    permission_classes = [IsAuthenticated]
+    replica_reads = True
+    throttle_classes = [ScopedTokenBucketThrottle]
+    throttle_scope = "bootstrap"
+    etag_scopes = ("credential", "assignment", "appuser")
+
+    def get(self, request):
+        user = request.user
+        if not isinstance(user, AppUser):
+            return Response({"error": "Not authorized"}, status=403)
+        # The profile is per user, so unlike the lists the ETag is too
+        etag = scoped_etag(
+            f"bootstrap:{user.pk}", user, self.etag_scopes, request.query_params
+        )
+        if etag_matches(request, etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+        cache = response_cache.enabled(request)
+        # Decrypted passwords: process-local response cache only
+        response = response_cache.get(request, etag, private=True) if cache else None
+        if response is None:
+            response = Response(self.build(user))
+            if cache:
+                response_cache.store(request, self, response, etag, private=True)
+        audit.record(user, "credential.bootstrap")
+        response["ETag"] = etag
+        return response
+
+    def build(self, user):
+        data = {
+            "me": AppUserSerializer(user).data,
+            "credentials": serialize(
+                CredentialSerializer, visible_credentials(user).order_by("id")
+            ),
+        }
+        if user.role not in ("super_admin", "admin"):
+            return data
+
+        users = AppUser.objects.order_by("id")
+        assigned = Assignment.objects.order_by("credential_id", "user_id")
+        if user.role == "admin":
+            users = users.filter(team=user.team, role="user")
+            assigned = assigned.filter(user__team=user.team)
+        assignment_map = {}
+        for credential_id, user_id in assigned.values_list("credential_id", "user_id"):
+            assignment_map.setdefault(credential_id, []).append(user_id)
+        data["users"] = serialize(AppUserSerializer, users)
+        data["assignments"] = assignment_map
+        return data
+
+
+# ---------------- AUDIT ----------------
+
+
+class AuditEventView(generics.ListAPIView):
+    """
+    GET /api/audit/ → audit events, newest first. Filters: ``actor``,
+    ``credential``, ``target_user`` (ids), ``action``, and ``since`` /
+    ``until`` (ISO 8601). Events reach the table within a flush interval.
+    """
+
+    serializer_class = AuditEventSerializer
+    permission_classes = [IsSuperAdmin]
+    pagination_class = AuditPagination
+    id_filters = {
+        "actor": "actor_id",
+        "credential": "credential_id",
+        "target_user": "target_user_id",
+    }
+
+    def list(self, request, *args, **kwargs):
+        params = request.query_params
+        filters = {}
+        for param, field in self.id_filters.items():
+            if param in params:
+                try:
+                    filters[field] = int(params[param])
+                except ValueError:
+                    return Response({"error": f"{param} must be an id"}, status=400)
+        if "action" in params:
+            filters["action"] = params["action"]
+        for param, lookup in (("since", "created_at__gte"), ("until", "created_at__lt")):
+            if param in params:
+                try:
+                    value = parse_datetime(params[param])
+                except ValueError:
+                    value = None
+                if value is None:
+                    return Response({"error": f"{param} must be an ISO 8601 datetime"}, status=400)
+                if timezone.is_naive(value):
+                    value = timezone.make_aware(value)
+                filters[lookup] = value
+        self.filters = filters
+        return super().list(request, *args, **kwargs)
+
+    def get_queryset(self):
+        return AuditEvent.objects.filter(**self.filters)
+
+
+# ---------------- IMPORT ----------------
+
+
+class ImportView(APIView):
+    """
+    POST /api/import/<kind>/ with a multipart ``file`` or a raw CSV / NDJSON
+    body. The format comes from ``?mode=`` or the content type.
+    """
+
+    permission_classes = [IsSuperAdmin]
+
+    def post(self, request, kind):
+        if kind not in IMPORTERS:
+            return Response({"error": f"Unknown import kind: {kind}"}, status=404)
+        upload = request.FILES.get("file") if request.content_type.startswith(
+            "multipart/"
+        ) else None
+        mode = request.query_params.get("mode")
+        if mode is None:
+            name = upload.name if upload else ""
+            is_csv = name.endswith(".csv") or request.content_type.startswith("text/csv")
+            mode = "csv" if is_csv else "ndjson"
+        if mode not in IMPORT_FORMATS:
+            return Response(
+                {"error": f"mode must be one of: {', '.join(IMPORT_FORMATS)}"}, status=400
+            )
+        source = upload if upload is not None else request.stream
+        if source is None:
+            return Response({"error": "Empty request body"}, status=400)
+        lines = codecs.iterdecode(source, "utf-8-sig")
+        # User passwords are hashed on the login pool's workers, if it has any
+        report = run_import(kind, lines, mode, pool=shared_pool())
+        return Response(report, status=200 if not report["failed"] else 207)
+
+
+# ---------------- METRICS ----------------
+
+
+class MetricsView(APIView):
+    permission_classes = [CanReadMetrics]
+
+    def get(self, request):
+        return HttpResponse(
+            render_prometheus(), content_type="text/plain; version=0.0.4; charset=utf-8"
+        )
@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from corsheaders.defaults import default_headers
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -43,6 +46,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "api.middleware.RequestMetricsMiddleware",
+    "api.middleware.ReplicaRoutingMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.security.SecurityMiddleware",
@@ -60,12 +65,34 @@ REST_FRAMEWORK = {
         "rest_framework_simplejwt.authentication.JWTAuthentication",  # default User
     ),
     "DEFAULT_PERMISSION_CLASSES": ("rest_framework.permissions.IsAuthenticated",),
+    # orjson, byte-identical to DRF's JSONRenderer (api.renderers)
+    "DEFAULT_RENDERER_CLASSES": (
+        "api.renderers.ORJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ),
+    # Token buckets (api.throttling): "<burst>/<period>", refilled at that rate
+    "DEFAULT_THROTTLE_RATES": {
+        "login_ip": "20/min",
+        "login_email": "5/min",
+        "token_refresh": "30/min",
+        "me": "60/min",
+        "bootstrap": "60/min",
+        "credentials_list": "60/min",
+        "credentials_match": "120/min",
+        "credentials_search": "120/min",
+        "credentials_changes": "60/min",
+        "credentials_used": "120/min",
+        "events": "30/min",
+    },
 }
 
 
 # DEV ONLY: allow all origins while developing
 CORS_ALLOW_ALL_ORIGINS = True
 # In production, use CORS_ALLOWED_ORIGINS = ["https://yourdomain.com"]
+# Conditional list requests (ETag / If-None-Match)
+CORS_ALLOW_HEADERS = (*default_headers, "if-none-match")
+CORS_EXPOSE_HEADERS = ["ETag"]
 
 ROOT_URLCONF = "backend.urls"
 
@@ -90,11 +117,214 @@ WSGI_APPLICATION = "backend.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+# DB_ENGINE=postgresql switches to PostgreSQL configured from DB_* variables.
+# DB_POOL_MAX_SIZE > 0 enables the psycopg 3 connection pool (needs
+# psycopg[pool]); otherwise connections persist for DB_CONN_MAX_AGE seconds.
+# DB_REPLICA_HOSTS (comma-separated) adds read replicas "replica_0", ... that
+# api.routers.PrimaryReplicaRouter uses for read-only views. DB_SQLITE_REPLICA=1
+# adds a read-only SQLite "replica" over the same file for local testing.
+
+if os.environ.get("DB_ENGINE") == "postgresql":
+    _pool_max_size = int(os.environ.get("DB_POOL_MAX_SIZE", 0))
+    _primary = {
+        "ENGINE": "django.db.backends.postgresql",
+        "NAME": os.environ.get("DB_NAME", "passwords"),
+        "USER": os.environ.get("DB_USER", "postgres"),
+        "PASSWORD": os.environ.get("DB_PASSWORD", ""),
+        "HOST": os.environ.get("DB_HOST", "localhost"),
+        "PORT": os.environ.get("DB_PORT", "5432"),
+        # The pool owns connection lifetime; Django requires CONN_MAX_AGE=0 with it
+        "CONN_MAX_AGE": 0 if _pool_max_size else int(os.environ.get("DB_CONN_MAX_AGE", 60)),
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": (
+            {
+                "pool": {
+                    "min_size": int(os.environ.get("DB_POOL_MIN_SIZE", 2)),
+                    "max_size": _pool_max_size,
+                    "timeout": int(os.environ.get("DB_POOL_TIMEOUT", 10)),
+                }
+            }
+            if _pool_max_size
+            else {}
+        ),
+    }
+    DATABASES = {"default": _primary}
+    # trigram_similar lookups and TrigramSimilarity for api.search
+    INSTALLED_APPS.append("django.contrib.postgres")
+    for _i, _host in enumerate(filter(None, os.environ.get("DB_REPLICA_HOSTS", "").split(","))):
+        DATABASES[f"replica_{_i}"] = {
+            **_primary,
+            "HOST": _host.strip(),
+            "TEST": {"MIRROR": "default"},
+        }
+else:
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": BASE_DIR / "db.sqlite3",
+        }
+    }
+    if os.environ.get("DB_SQLITE_REPLICA") == "1":
+        DATABASES["replica"] = {
+            "ENGINE": "django.db.backends.sqlite3",
+            # Read-only URI: a write routed here fails loudly
+            "NAME": f"file:{BASE_DIR / 'db.sqlite3'}?mode=ro",
+            "TEST": {"MIRROR": "default"},
+        }
+
+DATABASE_ROUTERS = ["api.routers.PrimaryReplicaRouter"]
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != "default"]
+
+# Seconds a client keeps reading from the primary after a write, so it sees
+# its own changes despite replication lag.
+REPLICA_PIN_SECONDS = int(os.environ.get("DB_REPLICA_PIN_SECONDS", 5))
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+# REDIS_URL shares the caches between workers (needs the redis package);
+# without it each process keeps its own local-memory caches.
+_REDIS_URL = os.environ.get("REDIS_URL")
+if _REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": _REDIS_URL,
+        },
+        "responses": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": _REDIS_URL,
+            "KEY_PREFIX": "responses",
+        },
+        # Responses carrying decrypted passwords never leave the process
+        "private_responses": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "private_responses",
+            "OPTIONS": {"MAX_ENTRIES": 5000},
+        },
     }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        },
+        "responses": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "responses",
+            "OPTIONS": {"MAX_ENTRIES": 5000},
+        },
+        "private_responses": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "private_responses",
+            "OPTIONS": {"MAX_ENTRIES": 5000},
+        },
+    }
+
+# Authenticated AppUser cache: process-local LRU in front of the CACHES alias.
+# Point ALIAS at a shared backend (e.g. Redis) when running several workers.
+APPUSER_CACHE = {
+    "ALIAS": "default",
+    "TIMEOUT": 300,
+    "LOCAL_MAXSIZE": 1024,
+}
+
+
+# Change events for /api/async/events/ (api.events). With REDIS_URL every
+# worker's streams see every worker's writes; otherwise only their own.
+EVENTS = {
+    "BROKER": "api.events.RedisBroker" if _REDIS_URL else "api.events.LocalBroker",
+    "REDIS_URL": _REDIS_URL,
+    "CHANNEL": "api:events",
+    "HEARTBEAT": 15,
+}
+
+# Rendered list responses, keyed per audience (api.response_cache)
+RESPONSE_CACHE = {
+    "ENABLED": os.environ.get("RESPONSE_CACHE_ENABLED", "1") == "1",
+    "ALIAS": "responses",
+    # Credential lists and bootstrap hold decrypted passwords: keep them in a
+    # process-local cache, never in the shared (Redis) one
+    "PRIVATE_ALIAS": "private_responses",
+    "TIMEOUT": 300,
+}
+
+
+# Request metrics (/api/metrics/) and structured request logging
+METRICS_PUBLIC = False
+METRICS_N_PLUS_ONE_THRESHOLD = 10
+REQUEST_LOG_SAMPLE_RATE = 0.1
+REQUEST_LOG_SLOW_MS = 500
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "api.requests": {"handlers": ["console"], "level": "INFO", "propagate": False},
+    },
+}
+
+# Minimum seconds between UserActivity.last_seen writes for one user
+LAST_SEEN_INTERVAL = 300
+
+# Audit trail (api.audit): events are buffered in memory and bulk-inserted by
+# a background thread every FLUSH_INTERVAL seconds or BATCH_SIZE events. Past
+# SAMPLE_ABOVE of MAX_PENDING, only READ_SAMPLE_RATE of reads are kept.
+AUDIT_LOG = {
+    "ENABLED": os.environ.get("AUDIT_LOG_ENABLED", "1") == "1",
+    "FLUSH_INTERVAL": float(os.environ.get("AUDIT_FLUSH_INTERVAL", 1.0)),
+    "BATCH_SIZE": 500,
+    "MAX_PENDING": int(os.environ.get("AUDIT_MAX_PENDING", 20000)),
+    "BLOCK_TIMEOUT": 2.0,
+    "SAMPLE_ABOVE": 0.5,
+    "READ_SAMPLE_RATE": 0.1,
+}
+
+# Credential usage counters (api.usage) for ?ordering=most_used: autofills are
+# summed in memory and written as one UPDATE per batch every FLUSH_INTERVAL s.
+USAGE_COUNTERS = {
+    "ENABLED": os.environ.get("USAGE_COUNTERS_ENABLED", "1") == "1",
+    "FLUSH_INTERVAL": float(os.environ.get("USAGE_FLUSH_INTERVAL", 5.0)),
+    "BATCH_SIZE": 500,
+    "MAX_PENDING": 50000,
+}
+
+
+# Password hashing
+# https://docs.djangoproject.com/en/5.2/topics/auth/passwords/
+# PASSWORD_HASHER picks the hasher for new hashes (argon2 needs argon2-cffi);
+# the others stay listed so existing hashes verify and get upgraded on login.
+
+_PASSWORD_HASHER_CHOICES = {
+    "pbkdf2": "api.hashing.ConfigurablePBKDF2PasswordHasher",
+    "argon2": "django.contrib.auth.hashers.Argon2PasswordHasher",
+    "scrypt": "django.contrib.auth.hashers.ScryptPasswordHasher",
+}
+_preferred_hasher = _PASSWORD_HASHER_CHOICES[os.environ.get("PASSWORD_HASHER", "pbkdf2")]
+PASSWORD_HASHERS = [_preferred_hasher] + [
+    h for h in _PASSWORD_HASHER_CHOICES.values() if h != _preferred_hasher
+]
+PASSWORD_PBKDF2_ITERATIONS = int(os.environ.get("PASSWORD_PBKDF2_ITERATIONS", 1_000_000))
+
+# Login verification pool: WORKERS=0 hashes inline in the request thread.
+PASSWORD_HASHING = {
+    "WORKERS": int(os.environ.get("PASSWORD_HASH_WORKERS", 0)),
+    "MAX_CONCURRENT": int(os.environ.get("PASSWORD_HASH_MAX_CONCURRENT", 8)),
+    "ACQUIRE_TIMEOUT": 5,
+}
+
+# Credential.password envelope encryption (api/encryption.py). Use a
+# keyfile to hold old master keys during rotate_credential_keys. A key is
+# always required; tests bring their own.
+CREDENTIAL_ENCRYPTION = {
+    "KEYFILE": os.environ.get("CREDENTIAL_KEYFILE"),
+    "MASTER_KEY": os.environ.get("CREDENTIAL_MASTER_KEY"),
+    "MASTER_KEY_ID": os.environ.get("CREDENTIAL_MASTER_KEY_ID", "k1"),
+    "CACHE_SIZE": int(os.environ.get("CREDENTIAL_KEY_CACHE_SIZE", 4096)),
+    "CACHE_TTL": 300,
 }
 
 